@@ -1,44 +1,46 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import atexit
+from flask import Flask, render_template, make_response, request, redirect, url_for, session, flash, send_from_directory, g, has_app_context
+import db
+import cache
+import external
+from title_index import SyncedTitleIndex
+from counters import ViewCounter, CommentBatcher, VIEW_COUNT_MODE
+from ratelimit import TokenBucketLimiter
+import stats
+import similar
+import trending
+import metrics
+import media
+import imaging
+import assets
+from resumable import ResumableUploads, UploadError
+from pagination import encode_cursor, decode_cursor
+from fulltext import SEARCH_VECTOR_PARAMS_SQL
+from ingredients import normalize_ingredient, index_recipe_ingredients, pantry_matches_sql, pantry_params
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from youtubesearchpython import VideosSearch
 import time
-import json
-from urllib.request import urlopen, Request
-from urllib.parse import quote
+import hashlib
+from datetime import datetime
 import cloudinary
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
 
 load_dotenv()
 
 # Cloudinary is automatically configured via the CLOUDINARY_URL environment variable
 cloudinary.config(secure=True)
 
-def upload_to_cloudinary(file, resource_type="auto"):
-    if not file:
-        return None
-    try:
-        upload_result = cloudinary.uploader.upload(file, resource_type=resource_type)
-        return upload_result['secure_url']
-    except Exception as e:
-        print(f"Cloudinary upload error: {e}")
-        return None
-
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "your_secret_key")
 
-# Cache for suggestions to improve speed
-SUGGESTION_CACHE = {}
+# Cache for suggestions to improve speed (bounded LRU per worker, shared tier if CACHE_URL is set)
 CACHE_TIMEOUT = 300 # 5 minutes
+suggestion_cache = cache.make_cache('suggestions', max_entries=int(os.getenv("SUGGESTION_CACHE_SIZE", 5000)), ttl=CACHE_TIMEOUT)
 app.config['UPLOAD_FOLDER'] = 'static/uploads/videos'
 app.config['PROFILE_FOLDER'] = 'static/uploads/profiles'
 app.config['THUMBNAIL_FOLDER'] = 'static/uploads/thumbnails'
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max upload size
+app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB per request; chunked uploads allow RESUMABLE_MAX_SIZE per file
 
 # Ensure upload directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -56,59 +58,324 @@ def allowed_image(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
+PHOTO_TYPE_ERROR = 'Profile photo must be a PNG, JPG, GIF or WebP image.'
+
+db.init_app(app)
+# First before_request hook, so the queries of the ones below are counted
+metrics.init_app(app)
+
+# Fingerprinted, precompressed static files (python assets.py build)
+asset_pipeline = assets.AssetPipeline(app)
+
+@app.template_global()
+def image_sources(value, folder):
+    # src/srcset for a thumbnail or profile photo (see imaging.py)
+    return imaging.image_sources(value, folder, lambda name: url_for('static', filename=f'uploads/{folder}/{name}'))
+
+app.add_template_global(imaging.video_poster, 'video_poster')
+
+# Chunked video uploads; assembled files land in the media spool
+resumable_uploads = ResumableUploads(os.path.join(media.MEDIA_SPOOL_DIR, 'resumable'), media.MEDIA_SPOOL_DIR)
+
+def take_video_upload():
+    # Spooled path of the submitted video, from a finished chunked upload or a
+    # plain multipart file. Returns (path, error message).
+    upload_id = request.form.get('video_upload_id')
+    if upload_id:
+        try:
+            path, filename, _ = resumable_uploads.complete(upload_id, session['user_id'])
+        except UploadError as e:
+            return None, str(e)
+        if not allowed_file(filename):
+            media.discard(path)
+            return None, 'Allowed file types are mp4, avi, mov, wmv'
+        return path, None
+
+    file = request.files.get('video')
+    if not file or file.filename == '':
+        return None, 'No selected file'
+    if not allowed_file(file.filename):
+        return None, 'Allowed file types are mp4, avi, mov, wmv'
+    return media.spool(file), None
+
 def get_db_connection():
-    return psycopg2.connect(
-        os.getenv("DATABASE_URL"),
-        cursor_factory=RealDictCursor
+    # Checked out from the per-process pool; conn.close() returns it.
+    # Anything still checked out is returned when the request ends.
+    # Its cursors report query counts and times to metrics.
+    conn = metrics.instrument(db.get_pool().getconn())
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
+    return conn
+
+# Who a session belongs to (role, username, photo, auth_version), cached per
+# worker and in the shared tier when CACHE_URL is set. session['role'] and
+# friends are refreshed from it on every request, so role changes apply
+# without a users lookup per request. Each user's key carries a generation of
+# its own, which role changes, deletions and profile updates bump, so every
+# worker reloads that user at once and nobody else's entry is touched. Bumping
+# users.auth_version signs out every session issued before the bump.
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 30))
+IDENTITY_FIELDS = ('username', 'role', 'profile_photo')
+identity_cache = cache.make_cache('identity', max_entries=int(os.getenv("IDENTITY_CACHE_SIZE", 10000)), ttl=IDENTITY_CACHE_TTL)
+
+def identity_generation(user_id):
+    return cache.make_generation(f"identity-{user_id}")
+
+def identity_key(user_id):
+    return f"{identity_generation(user_id).current()}:{user_id}"
+
+def load_identity(user_id):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, username, role, profile_photo, auth_version FROM users WHERE id=%s", (user_id,))
+            user = cursor.fetchone()
+    finally:
+        conn.close()
+    return dict(user) if user else None
+
+def get_identity(user_id):
+    return identity_cache.get_or_compute(identity_key(user_id), lambda: load_identity(user_id), should_cache=lambda user: user is not None)
+
+def invalidate_identity(user_id):
+    # Drops this user's entry here and in the shared tier; the bump makes the
+    # other workers miss on their next request for this user
+    identity_cache.delete(identity_key(user_id))
+    identity_generation(user_id).bump()
+
+def start_session(user):
+    session['user_id'] = user['id']
+    session['auth_version'] = user['auth_version']
+    for field in IDENTITY_FIELDS:
+        session[field] = user[field]
+    identity_cache.set(identity_key(user['id']), {'id': user['id'], 'auth_version': user['auth_version'],
+                                         **{field: user[field] for field in IDENTITY_FIELDS}})
+
+@app.before_request
+def refresh_identity():
+    if 'user_id' not in session or request.endpoint == 'static':
+        return
+    user = get_identity(session['user_id'])
+    if user is None or user['auth_version'] != session.get('auth_version', 0):
+        session.clear()   # deleted, or signed out everywhere
+        return
+    for field in IDENTITY_FIELDS:
+        # Only touch the session when something changed, so the cookie isn't re-sent
+        if session.get(field) != user[field]:
+            session[field] = user[field]
+
+def fetch_title_rows():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            # Recipes whose first video is still uploading have no page to link to yet
+            cursor.execute("SELECT id, title, views, like_count FROM recipes WHERE video_filename IS NOT NULL")
+            return [(r['id'], r['title'], r['views'], r['like_count']) for r in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def index_ready_title(recipe_id):
+    # A new recipe joins the title index once its video has landed
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT title FROM recipes WHERE id=%s AND video_filename IS NOT NULL", (recipe_id,))
+            recipe = cursor.fetchone()
+    finally:
+        conn.close()
+    if recipe:
+        title_index.update(recipe_id, recipe['title'])
+
+# Local title autocomplete, ranked by popularity; loaded by warm_up() when a worker
+# starts and resynced from the DB periodically, or soon after the titles
+# generation is bumped (python media.py does that when a video lands)
+title_generation = cache.make_generation('titles')
+title_index = SyncedTitleIndex(fetch_title_rows, generation=title_generation)
+
+# "More like this" lists (see similar.py), cached per recipe. Saved and edited
+# recipes are rescored in the background; lists they changed are dropped here
+# and expire within SIMILAR_CACHE_TTL seconds in other workers.
+SIMILAR_CACHE_TTL = int(os.getenv("SIMILAR_CACHE_TTL", 300))
+similar_cache = cache.make_cache('similar', max_entries=int(os.getenv("SIMILAR_CACHE_SIZE", 10000)), ttl=SIMILAR_CACHE_TTL)
+
+def similar_changed(recipe_ids):
+    for recipe_id in recipe_ids:
+        similar_cache.delete(str(recipe_id))
+
+similar_updater = similar.SimilarityUpdater(get_db_connection, on_change=similar_changed)
+
+def attach_user_liked(cursor, recipes):
+    # One lookup of the viewer's likes for every recipe on the page
+    for r in recipes:
+        r['user_liked'] = 0
+    user_id = session.get('user_id')
+    if not user_id or not recipes:
+        return recipes
+    cursor.execute(
+        "SELECT recipe_id FROM recipe_likes WHERE user_id = %s AND recipe_id = ANY(%s)",
+        (user_id, [r['id'] for r in recipes])
     )
+    liked = {row['recipe_id'] for row in cursor.fetchall()}
+    for r in recipes:
+        r['user_liked'] = 1 if r['id'] in liked else 0
+    return recipes
+
+# Keyset pagination: each sort mode orders by (sort key, id) so a page is fetched with
+# a row comparison against the last row seen, backed by the indexes in db_setup.py.
+# Trending is the exception: scores move with every view and like, so a cursor on
+# them would skip or repeat cards between pages. It is one longer page instead.
+PAGE_SIZE = 12
+TRENDING_PAGE_SIZE = int(os.getenv("TRENDING_PAGE_SIZE", 48))
+SORT_ORDERS = {
+    'newest': ('recipes.created_at', 'DESC'),
+    'oldest': ('recipes.created_at', 'ASC'),
+    'shortest': ('recipes.cooking_time', 'ASC'),
+    'longest': ('recipes.cooking_time', 'DESC'),
+    # Time-decayed activity score, see trending.py
+    'trending': ('recipes.trending', 'DESC'),
+}
+# What recipe cards and the dashboard render. Feed rows are cached, so large
+# columns nobody shows (search_vector, the trending score) stay out of them.
+RECIPE_CARD_COLUMNS = """
+    recipes.id, recipes.user_id, recipes.title, recipes.description, recipes.ingredients,
+    recipes.instructions, recipes.category, recipes.cooking_time, recipes.video_filename,
+    recipes.thumbnail, recipes.media_status, recipes.views, recipes.like_count,
+    recipes.comment_count, recipes.created_at
+"""
+# Search relevance; float8 so the rank survives the round trip through a cursor exactly
+RANK_SQL = "ts_rank(recipes.search_vector, websearch_to_tsquery('english', %s))::float8"
+
+def recipe_sort_value(sort_by, value):
+    if sort_by == 'relevance':
+        return float(value)
+    if SORT_ORDERS[sort_by][0] == 'recipes.created_at':
+        return datetime.fromisoformat(value)
+    return int(value)
+
+def fetch_recipe_page(cursor, conditions, params, sort_by, after=None, limit=PAGE_SIZE, query=None):
+    if sort_by == 'relevance' and query:
+        sort_sql, direction, sort_params = RANK_SQL, 'DESC', [query]
+    else:
+        if sort_by not in SORT_ORDERS:
+            sort_by = 'newest'
+        (sort_sql, direction), sort_params = SORT_ORDERS[sort_by], []
+    if sort_by == 'trending':
+        if after:
+            return [], None   # a trending page has nothing after it
+        limit = TRENDING_PAGE_SIZE
+    conditions = list(conditions)
+    params = sort_params + list(params)
+
+    position = decode_cursor(after, sort_by, recipe_sort_value)
+    if position:
+        op = '<' if direction == 'DESC' else '>'
+        conditions.append(f"({sort_sql}, recipes.id) {op} (%s, %s)")
+        params.extend(sort_params + list(position))
+
+    sql = f"""
+        SELECT {RECIPE_CARD_COLUMNS}, users.username, {sort_sql} AS sort_key
+        FROM recipes 
+        JOIN users ON recipes.user_id = users.id
+    """
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY sort_key {direction}, recipes.id {direction} LIMIT %s"
+    params.append(limit + 1)
+
+    cursor.execute(sql, tuple(params))
+    recipes = cursor.fetchall()
+
+    next_cursor = None
+    if len(recipes) > limit:
+        recipes = recipes[:limit]
+        if sort_by != 'trending':
+            last = recipes[-1]
+            next_cursor = encode_cursor(sort_by, last['sort_key'], last['id'])
+    return recipes, next_cursor
+
+# Feed caches. Keys carry the feed generation, which upload/edit/delete/like bump,
+# so invalidation is a single counter increment. Feed rows stay in-process (they
+# hold datetimes); rendered anonymous pages may also use the shared tier.
+FEED_CACHE_TTL = int(os.getenv("FEED_CACHE_TTL", 60))
+feed_generation = cache.make_generation('feed')
+feed_rows_cache = cache.make_cache('feed_rows', max_entries=1000, ttl=FEED_CACHE_TTL, shared=False)
+page_cache = cache.make_cache('pages', max_entries=500, ttl=FEED_CACHE_TTL)
+
+def invalidate_feed():
+    feed_generation.bump()
+
+def load_recipe_feed(category, sort_by, query='', after=None):
+    # Search results are query-specific and not cached
+    key = None if query else (feed_generation.current(), category, sort_by, after or '')
+    cached = feed_rows_cache.get(key) if key else None
+    if cached:
+        rows, next_cursor = cached
+        recipes = [dict(r) for r in rows]
+        if 'user_id' not in session:
+            return attach_user_liked(None, recipes), next_cursor
 
-@app.route('/')
-def index():
-    category = request.args.get('category', 'All')
-    sort_by = request.args.get('sort', 'newest')
-    
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            # Base query with view and like counts
-            query = """
-                SELECT recipes.*, users.username, 
-                (SELECT COUNT(*) FROM recipe_likes WHERE recipe_id = recipes.id) as like_count,
-                (SELECT COUNT(*) FROM recipe_likes WHERE recipe_id = recipes.id AND user_id = %s) as user_liked
-                FROM recipes 
-                JOIN users ON recipes.user_id = users.id
-            """
-            params = [session.get('user_id', 0)]
-            
-            if category and category != 'All':
-                query += " WHERE category=%s"
-                params.append(category)
-            
-            # Ranking/Sorting
-            if sort_by == 'oldest':
-                query += " ORDER BY created_at ASC"
-            elif sort_by == 'shortest':
-                query += " ORDER BY cooking_time ASC"
-            elif sort_by == 'longest':
-                query += " ORDER BY cooking_time DESC"
-            else:
-                query += " ORDER BY created_at DESC"
-                
-            cursor.execute(query, tuple(params))
-            recipes = cursor.fetchall()
+            if not cached:
+                # Recipes whose first video is still uploading stay out of the feed
+                conditions, params = ["recipes.video_filename IS NOT NULL"], []
+                if query:
+                    # Full-text match on the GIN-indexed search vector
+                    conditions.append("recipes.search_vector @@ websearch_to_tsquery('english', %s)")
+                    params.append(query)
+                if category and category != 'All':
+                    conditions.append("category = %s")
+                    params.append(category)
+                recipes, next_cursor = fetch_recipe_page(cursor, conditions, params, sort_by, after, query=query)
+                if key:
+                    feed_rows_cache.set(key, ([dict(r) for r in recipes], next_cursor))
+            # Only the viewer's liked state is per-user
+            return attach_user_liked(cursor, recipes), next_cursor
     finally:
         conn.close()
+
+def youtube_for_page(query, limit):
+    # In async mode the page never waits: whatever is cached is rendered and the
+    # template fetches the rest from /api/youtube. Inline mode waits up to the budget.
+    budget = 0 if external.YOUTUBE_MODE == 'async' else external.YOUTUBE_BUDGET
+    results = external.youtube.get(query, limit, budget=budget)
+    pending = None if results else {'q': query, 'limit': limit}
+    return results, pending
+
+def cached_page_response(entry):
+    # Conditional response: a matching If-None-Match gets a bodiless 304
+    response = make_response(entry['html'])
+    response.set_etag(entry['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/')
+def index():
+    category = request.args.get('category', 'All')
+    sort_by = request.args.get('sort', 'newest')
+    cursor_token = request.args.get('cursor')
+
+    # Anonymous fast path: serve the rendered page without touching the DB
+    page_key = None
+    if 'user_id' not in session and not session.get('_flashes'):
+        page_key = (feed_generation.current(), category, sort_by, cursor_token or '')
+        entry = page_cache.get(page_key)
+        if entry:
+            return cached_page_response(entry)
+    
+    recipes, next_cursor = load_recipe_feed(category, sort_by, after=cursor_token)
         
-    # Fetch YouTube videos
-    youtube_recipes = []
-    try:
-        search_query = (category if category and category != 'All' else "popular") + " recipe"
-        videosSearch = VideosSearch(search_query, limit = 8)
-        youtube_recipes = videosSearch.result().get('result', [])
-    except Exception as e:
-        print(f"YouTube search error: {e}")
+    # YouTube videos (cached, never blocks past the budget)
+    search_query = (category if category and category != 'All' else "popular") + " recipe"
+    youtube_recipes, youtube_pending = youtube_for_page(search_query, 8)
             
-    return render_template('index.html', recipes=recipes, youtube_recipes=youtube_recipes, active_category=category, sort_by=sort_by)
+    html = render_template('index.html', recipes=recipes, youtube_recipes=youtube_recipes, youtube_pending=youtube_pending, active_category=category, sort_by=sort_by, next_cursor=next_cursor)
+    if page_key is None:
+        return html
+    entry = {'html': html, 'etag': hashlib.sha1(html.encode()).hexdigest()}
+    page_cache.set(page_key, entry)
+    return cached_page_response(entry)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -123,11 +390,14 @@ def register():
         
         hashed_pw = generate_password_hash(password)
         
-        profile_photo = None
-        if 'profile_photo' in request.files:
-            file = request.files['profile_photo']
-            if file and file.filename != '':
-                profile_photo = upload_to_cloudinary(file, resource_type="image")
+        photo_path = None
+        photo = request.files.get('profile_photo')
+        if photo and photo.filename:
+            # Local uploads are served as-is, so only image types may be stored
+            if not allowed_image(photo.filename):
+                flash(PHOTO_TYPE_ERROR, 'danger')
+                return redirect(request.url)
+            photo_path = media.spool(photo)
         
         conn = get_db_connection()
         try:
@@ -137,16 +407,23 @@ def register():
                     flash('Username already exists!', 'danger')
                 else:
                     cursor.execute(
-                        "INSERT INTO users (username, password, full_name, email, gender, age, phone_number, profile_photo, role) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'user')",
-                        (username, hashed_pw, full_name, email, gender, age or None, phone_number, profile_photo)
+                        "INSERT INTO users (username, password, full_name, email, gender, age, phone_number, profile_photo, role) VALUES (%s, %s, %s, %s, %s, %s, %s, NULL, 'user') RETURNING id",
+                        (username, hashed_pw, full_name, email, gender, age or None, phone_number)
                     )
+                    user_id = cursor.fetchone()['id']
                     conn.commit()
+                    # Released before submitting, as in upload_recipe
+                    conn.close()
+                    if photo_path:
+                        media_pipeline.submit('user', user_id, 'profile_photo', photo_path, 'image')
+                        photo_path = None
                     flash('Registration successful! Please login.', 'success')
                     return redirect(url_for('login'))
         except Exception as e:
             flash(f"Error: {str(e)}", 'danger')
         finally:
             conn.close()
+            media.discard(photo_path)
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -158,14 +435,14 @@ def login():
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM users WHERE username=%s", (username,))
+                cursor.execute(
+                    "SELECT id, username, password, role, profile_photo, auth_version FROM users WHERE username=%s",
+                    (username,)
+                )
                 user = cursor.fetchone()
                 
                 if user and check_password_hash(user['password'], password):
-                    session['user_id'] = user['id']
-                    session['username'] = user['username']
-                    session['role'] = user['role']
-                    session['profile_photo'] = user.get('profile_photo')
+                    start_session(user)
                     flash('Logged in successfully!', 'success')
                     return redirect(url_for('dashboard' if user['role'] == 'admin' else 'index'))
                 else:
@@ -191,44 +468,88 @@ def upload_recipe():
         instructions = request.form['instructions']
         description = request.form.get('description', '')
         
-        if 'video' not in request.files:
-            flash('No video file part', 'danger')
+        # Files go to the local spool; the media pipeline uploads them after we reply
+        video_path, error = take_video_upload()
+        if error:
+            flash(error, 'danger')
             return redirect(request.url)
             
-        file = request.files['video']
+        # Handle thumbnail upload (optional)
+        thumb_path = None
+        if 'thumbnail' in request.files:
+            thumb_file = request.files['thumbnail']
+            if thumb_file and thumb_file.filename != '' and allowed_image(thumb_file.filename):
+                thumb_path = media.spool(thumb_file)
         
-        if file.filename == '':
-            flash('No selected file', 'danger')
-            return redirect(request.url)
-            
-        if file and allowed_file(file.filename):
-            filename = upload_to_cloudinary(file, resource_type="video")
-            
-            # Handle thumbnail upload (optional)
-            thumbnail_filename = None
-            if 'thumbnail' in request.files:
-                thumb_file = request.files['thumbnail']
-                if thumb_file and thumb_file.filename != '' and allowed_image(thumb_file.filename):
-                    thumbnail_filename = upload_to_cloudinary(thumb_file, resource_type="image")
-            
-            conn = get_db_connection()
-            try:
-                category = request.form.get('category', 'Other')
-                cooking_time = request.form.get('cooking_time', 0)
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "INSERT INTO recipes (title, description, ingredients, instructions, video_filename, thumbnail, category, cooking_time, user_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                        (title, description, ingredients, instructions, filename, thumbnail_filename, category, cooking_time, session['user_id'])
-                    )
-                    conn.commit()
-                flash('Recipe uploaded successfully!', 'success')
-                return redirect(url_for('index'))
-            finally:
-                conn.close()
-        else:
-            flash('Allowed file types are mp4, avi, mov, wmv', 'danger')
+        conn = get_db_connection()
+        try:
+            category = request.form.get('category', 'Other')
+            cooking_time = request.form.get('cooking_time', 0)
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO recipes (title, description, ingredients, instructions, category, cooking_time, user_id, media_status, search_vector) VALUES (%s, %s, %s, %s, %s, %s, %s, 'processing', " + SEARCH_VECTOR_PARAMS_SQL + ") RETURNING id",
+                    (title, description, ingredients, instructions, category, cooking_time, session['user_id'],
+                     title, description, ingredients, category)
+                )
+                recipe_id = cursor.fetchone()['id']
+                index_recipe_ingredients(cursor, recipe_id, ingredients)
+                conn.commit()
+            # Inline uploads check out their own connection; don't hold two
+            conn.close()
+            uploads = [('video_filename', video_path, 'video')]
+            if thumb_path:
+                uploads.append(('thumbnail', thumb_path, 'image'))
+            media_pipeline.submit_many('recipe', recipe_id, uploads)
+            video_path = thumb_path = None
+            similar_updater.submit(recipe_id)
+            invalidate_feed()
+            flash('Recipe uploaded! Your video is processing and will appear in the feed shortly.', 'success')
+            return redirect(url_for('dashboard'))
+        finally:
+            conn.close()
+            media.discard(video_path)
+            media.discard(thumb_path)
             
-    return render_template('upload_recipe.html')
+    return render_template('upload_recipe.html', max_video_mb=resumable_uploads.max_size // (1024 * 1024),
+                           chunk_size=resumable_uploads.chunk_size)
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    # Starts a chunked upload: {"filename", "size", optional "sha256"} -> upload id and chunk layout
+    if 'user_id' not in session:
+        return {"error": "Authentication required"}, 401
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename', '')))
+    if not allowed_file(filename):
+        return {"error": "Allowed file types are mp4, avi, mov, wmv"}, 400
+    try:
+        return resumable_uploads.create(session['user_id'], filename, data.get('size'), data.get('sha256')), 201
+    except UploadError as e:
+        return {"error": str(e)}, e.status
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'DELETE'])
+def upload_status(upload_id):
+    # Which chunks the server has; a resuming client sends only the missing ones
+    if 'user_id' not in session:
+        return {"error": "Authentication required"}, 401
+    try:
+        if request.method == 'DELETE':
+            resumable_uploads.abort(upload_id, session['user_id'])
+            return {"status": "deleted"}
+        return resumable_uploads.status(upload_id, session['user_id'])
+    except UploadError as e:
+        return {"error": str(e)}, e.status
+
+@app.route('/api/uploads/<upload_id>/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    # Raw chunk body, streamed to disk; X-Chunk-SHA256 is checked when present
+    if 'user_id' not in session:
+        return {"error": "Authentication required"}, 401
+    try:
+        return resumable_uploads.write_chunk(upload_id, session['user_id'], index, request.stream,
+                                             request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return {"error": str(e)}, e.status
 
 @app.route('/edit/<int:id>', methods=['GET', 'POST'])
 def edit_recipe(id):
@@ -256,28 +577,38 @@ def edit_recipe(id):
                 instructions = request.form['instructions']
                 description = request.form.get('description', '')
                 
-                # Update video if new one is uploaded
-                new_video_filename = recipe['video_filename']
-                if 'video' in request.files:
-                    file = request.files['video']
-                    if file and file.filename != '' and allowed_file(file.filename):
-                        new_video_filename = upload_to_cloudinary(file, resource_type="video")
-
-                # Update thumbnail if new one is uploaded
-                new_thumbnail = recipe.get('thumbnail')
+                # New video or thumbnail: spool it; the current one stays until the upload lands
+                uploads = []
+                if request.form.get('video_upload_id') or getattr(request.files.get('video'), 'filename', ''):
+                    video_path, error = take_video_upload()
+                    if error:
+                        flash(error, 'danger')
+                        return redirect(request.url)
+                    uploads.append(('video_filename', video_path, 'video'))
                 if 'thumbnail' in request.files:
                     thumb_file = request.files['thumbnail']
                     if thumb_file and thumb_file.filename != '' and allowed_image(thumb_file.filename):
-                        new_thumbnail = upload_to_cloudinary(thumb_file, resource_type="image")
+                        uploads.append(('thumbnail', media.spool(thumb_file), 'image'))
 
                 category = request.form.get('category', recipe['category'])
                 cooking_time = request.form.get('cooking_time', recipe['cooking_time'])
                 
                 cursor.execute(
-                    "UPDATE recipes SET title=%s, description=%s, ingredients=%s, instructions=%s, video_filename=%s, thumbnail=%s, category=%s, cooking_time=%s WHERE id=%s",
-                    (title, description, ingredients, instructions, new_video_filename, new_thumbnail, category, cooking_time, id)
+                    "UPDATE recipes SET title=%s, description=%s, ingredients=%s, instructions=%s, category=%s, cooking_time=%s, media_status=%s, search_vector=" + SEARCH_VECTOR_PARAMS_SQL + " WHERE id=%s",
+                    (title, description, ingredients, instructions, category, cooking_time,
+                     'processing' if uploads else recipe['media_status'],
+                     title, description, ingredients, category, id)
                 )
+                index_recipe_ingredients(cursor, id, ingredients)
                 conn.commit()
+                # Released before submitting, as in upload_recipe
+                conn.close()
+                if uploads:
+                    media_pipeline.submit_many('recipe', id, uploads)
+                if recipe['video_filename']:
+                    title_index.update(id, title)
+                similar_updater.submit(id)
+                invalidate_feed()
                 flash('Recipe updated successfully!', 'success')
                 return redirect(url_for('dashboard'))
     finally:
@@ -285,6 +616,8 @@ def edit_recipe(id):
             
     return render_template('edit_recipe.html', recipe=recipe)
 
+ADMIN_RECIPE_PAGE_SIZE = 50
+
 @app.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
@@ -293,46 +626,34 @@ def dashboard():
     conn = get_db_connection()
     analytics_data = {'labels': [], 'views': [], 'likes': []}
     admin_stats = {}
+    next_cursor = None
     
     try:
         with conn.cursor() as cursor:
             if session['role'] == 'admin':
-                # Admin sees all recipes
-                cursor.execute("""
-                    SELECT recipes.*, users.username, 
-                    (SELECT COUNT(*) FROM recipe_likes WHERE recipe_id = recipes.id) as like_count
-                    FROM recipes 
-                    JOIN users ON recipes.user_id = users.id 
-                    ORDER BY views DESC LIMIT 10
-                """)
-                top_recipes = cursor.fetchall()
+                # Aggregates come from the materialized stats views
+                totals, user_trend, top_recipes = stats.load_admin_stats(cursor)
                 for r in top_recipes:
                     analytics_data['labels'].append(r['title'][:15] + '...')
                     analytics_data['views'].append(r['views'])
                     analytics_data['likes'].append(r['like_count'])
                 
-                # Full list for the management table
-                cursor.execute("SELECT recipes.*, users.username FROM recipes JOIN users ON recipes.user_id = users.id ORDER BY created_at DESC")
-                recipes = cursor.fetchall()
+                # Management table, newest first, one keyset page at a time
+                recipes, next_cursor = fetch_recipe_page(cursor, [], [], 'newest', request.args.get('cursor'), limit=ADMIN_RECIPE_PAGE_SIZE)
 
-                # Admin-specific stats
-                cursor.execute("SELECT COUNT(*) as count FROM users")
-                admin_stats['total_users'] = cursor.fetchone()['count']
-                cursor.execute("SELECT COUNT(*) as count FROM recipes")
-                admin_stats['total_recipes'] = cursor.fetchone()['count']
-                
-                # Fetch recent user signups for a mini-trend (last 7 days)
-                cursor.execute("SELECT DATE(created_at) as date, COUNT(*) as count FROM users GROUP BY DATE(created_at) ORDER BY date DESC LIMIT 7")
-                user_trend = cursor.fetchall()
+                admin_stats['total_users'] = totals['total_users']
+                admin_stats['total_recipes'] = totals['total_recipes']
+                admin_stats['as_of'] = totals['refreshed_at'].strftime('%b %d, %H:%M') if totals['refreshed_at'] else None
                 admin_stats['user_trend'] = {
                     'labels': [str(t['date']) for t in reversed(user_trend)],
                     'counts': [t['count'] for t in reversed(user_trend)]
                 }
+                if stats.is_stale(totals['refreshed_at']):
+                    stats.refresh_in_background(get_db_connection)
             else:
                 # User sees only their recipes
-                cursor.execute("""
-                    SELECT recipes.*, 
-                    (SELECT COUNT(*) FROM recipe_likes WHERE recipe_id = recipes.id) as like_count 
+                cursor.execute(f"""
+                    SELECT {RECIPE_CARD_COLUMNS}
                     FROM recipes 
                     WHERE user_id=%s 
                     ORDER BY created_at DESC
@@ -349,7 +670,8 @@ def dashboard():
     return render_template('dashboard.html', 
                           recipes=recipes, 
                           analytics=analytics_data, 
-                          admin_stats=admin_stats)
+                          admin_stats=admin_stats,
+                          next_cursor=next_cursor)
 
 @app.route('/delete/<int:id>')
 def delete_recipe(id):
@@ -366,12 +688,15 @@ def delete_recipe(id):
             if recipe:
                 if session['role'] == 'admin' or recipe['user_id'] == session['user_id']:
                     # Delete file
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], recipe['video_filename'])
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                    if recipe['video_filename']:
+                        file_path = os.path.join(app.config['UPLOAD_FOLDER'], recipe['video_filename'])
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
                         
                     cursor.execute("DELETE FROM recipes WHERE id=%s", (id,))
                     conn.commit()
+                    title_index.remove(id)
+                    invalidate_feed()
                     flash('Recipe deleted successfully.', 'success')
                 else:
                     flash('Permission denied.', 'danger')
@@ -390,128 +715,323 @@ def search():
     
     local_recipes = []
     youtube_recipes = []
+    youtube_pending = None
+    next_cursor = None
     
     if query:
+        local_recipes, next_cursor = load_recipe_feed(category, sort_by, query, request.args.get('cursor'))
+            
+        # YouTube search
+        yt_query = f"{query} {category if category != 'All' else ''} recipe"
+        youtube_recipes, youtube_pending = youtube_for_page(yt_query, 10)
+            
+    return render_template('index.html', recipes=local_recipes, youtube_recipes=youtube_recipes, youtube_pending=youtube_pending, query=query, active_category=category, sort_by=sort_by, next_cursor=next_cursor)
+
+@app.route('/api/recipes')
+def api_recipes():
+    # Next page of the home feed or search results for infinite scroll
+    query = request.args.get('q', '').strip()
+    category = request.args.get('category', 'All')
+    sort_by = request.args.get('sort', 'relevance' if query else 'newest')
+    
+    recipes, next_cursor = load_recipe_feed(category, sort_by, query, request.args.get('cursor'))
+    html = render_template('_recipe_cards.html', recipes=recipes)
+    return {"html": html, "next_cursor": next_cursor, "count": len(recipes)}
+
+@app.route('/api/similar/<int:recipe_id>')
+def similar_recipes(recipe_id):
+    # Precomputed neighbours; empty until `python similar.py` has run once
+    limit = min(max(request.args.get('limit', 6, type=int), 1), similar.TOP_K)
+
+    def compute():
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                # Search in local records with stats
-                sql = """
-                    SELECT recipes.*, users.username, 
-                    (SELECT COUNT(*) FROM recipe_likes WHERE recipe_id = recipes.id) as like_count,
-                    (SELECT COUNT(*) FROM recipe_likes WHERE recipe_id = recipes.id AND user_id = %s) as user_liked
-                    FROM recipes 
-                    JOIN users ON recipes.user_id = users.id 
-                    WHERE (title LIKE %s OR description LIKE %s)
-                """
-                params = [session.get('user_id', 0), f"%{query}%", f"%{query}%"]
-                
-                if category != 'All':
-                    sql += " AND category = %s"
-                    params.append(category)
-                    
-                if sort_by == 'oldest':
-                    sql += " ORDER BY created_at ASC"
-                elif sort_by == 'shortest':
-                    sql += " ORDER BY cooking_time ASC"
-                elif sort_by == 'longest':
-                    sql += " ORDER BY cooking_time DESC"
-                else:
-                    sql += " ORDER BY created_at DESC"
-                    
-                cursor.execute(sql, tuple(params))
-                local_recipes = cursor.fetchall()
+                return similar.load_similar(cursor, recipe_id)
         finally:
             conn.close()
-            
-        # YouTube search
-        try:
-            yt_query = f"{query} {category if category != 'All' else ''} recipe"
-            videosSearch = VideosSearch(yt_query, limit = 10)
-            youtube_recipes = videosSearch.result().get('result', [])
-        except Exception as e:
-            print(f"YouTube search error: {e}")
-            
-    return render_template('index.html', recipes=local_recipes, youtube_recipes=youtube_recipes, query=query, active_category=category, sort_by=sort_by)
+
+    return {"recipes": similar_cache.get_or_compute(str(recipe_id), compute)[:limit]}
+
+PANTRY_RESULT_LIMIT = 20
+PANTRY_MAX_INGREDIENTS = 50
+# Bounded candidate set ranked from the inverted index, then recipe details joined
+# for the top matches only
+PANTRY_SQL = f"""
+    WITH matches AS ({pantry_matches_sql()})
+    SELECT recipes.id, recipes.title, recipes.thumbnail, recipes.video_filename, recipes.category,
+           recipes.cooking_time, recipes.like_count, users.username,
+           matches.matched, matches.total
+    FROM matches
+    JOIN recipes ON recipes.id = matches.recipe_id
+    JOIN users ON recipes.user_id = users.id
+    ORDER BY matches.matched::float / matches.total DESC, matches.matched DESC, recipes.id DESC
+"""
+
+@app.route('/api/youtube')
+def api_youtube():
+    # Fills in the YouTube section after the page has rendered
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 10)
+    if not query:
+        return {"html": "", "count": 0}
+    videos = external.youtube.get(query, limit, budget=external.YOUTUBE_ASYNC_BUDGET)
+    return {"html": render_template('_youtube_cards.html', youtube_recipes=videos), "count": len(videos)}
+
+@app.route('/api/pantry', methods=['GET', 'POST'])
+def pantry_search():
+    # "What can I cook": rank recipes by the fraction of their ingredients the user has
+    if request.method == 'POST' and request.is_json:
+        items = (request.get_json(silent=True) or {}).get('ingredients', [])
+    else:
+        items = request.values.getlist('ingredients') or request.values.get('q', '').split(',')
+    if isinstance(items, str):
+        items = items.split(',')
+
+    terms = []
+    for item in items[:PANTRY_MAX_INGREDIENTS]:
+        term = normalize_ingredient(str(item))
+        if term and term not in terms:
+            terms.append(term)
+    if not terms:
+        return {"ingredients": [], "recipes": []}
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(PANTRY_SQL, pantry_params(terms, PANTRY_RESULT_LIMIT))
+            results = cursor.fetchall()
+    finally:
+        conn.close()
+
+    for r in results:
+        r['coverage'] = round(r['matched'] / r['total'], 3) if r['total'] else 0
+    return {"ingredients": terms, "recipes": results}
+
+like_limiter = TokenBucketLimiter()
+
+# One round trip: remove the like if present, otherwise add it, and move the
+# denormalized counter and trending score by the difference. A concurrent duplicate
+# insert hits ON CONFLICT and leaves the like in place, so `liked` is "nothing was
+# removed". An unlike takes back the points the like earned when it was made.
+TOGGLE_LIKE_SQL = f"""
+    WITH removed AS (
+        DELETE FROM recipe_likes WHERE recipe_id = %(recipe_id)s AND user_id = %(user_id)s
+        RETURNING created_at
+    ), added AS (
+        INSERT INTO recipe_likes (recipe_id, user_id)
+        SELECT %(recipe_id)s, %(user_id)s
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+          AND EXISTS (SELECT 1 FROM recipes WHERE id = %(recipe_id)s)
+        ON CONFLICT (recipe_id, user_id) DO NOTHING
+        RETURNING 1
+    ), counted AS (
+        UPDATE recipes
+        SET like_count = GREATEST(like_count + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0),
+            trending = CASE
+                WHEN EXISTS (SELECT 1 FROM added) THEN {trending.add_sql(trending.points_sql('like'))}
+                WHEN EXISTS (SELECT 1 FROM removed) THEN {trending.remove_sql(trending.points_sql('like', at="COALESCE((SELECT created_at FROM removed), LOCALTIMESTAMP)"))}
+                ELSE trending
+            END
+        WHERE id = %(recipe_id)s
+        RETURNING like_count
+    )
+    SELECT NOT EXISTS (SELECT 1 FROM removed) AS liked, (SELECT like_count FROM counted) AS count
+"""
 
 @app.route('/like/<int:recipe_id>', methods=['POST'])
 def toggle_like(recipe_id):
     if 'user_id' not in session:
         return {"error": "Authentication required"}, 401
+
+    # Absorb rapid repeat clicks; answer with the last state we returned
+    key = (session['user_id'], recipe_id)
+    allowed, last = like_limiter.allow(key)
+    if not allowed:
+        return dict(last or {}, throttled=True), 429
         
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM recipe_likes WHERE recipe_id=%s AND user_id=%s", (recipe_id, session['user_id']))
-            like = cursor.fetchone()
-            
-            if like:
-                cursor.execute("DELETE FROM recipe_likes WHERE id=%s", (like['id'],))
-                liked = False
-            else:
-                cursor.execute("INSERT INTO recipe_likes (recipe_id, user_id) VALUES (%s, %s)", (recipe_id, session['user_id']))
-                liked = True
-            
-            cursor.execute("SELECT COUNT(*) as count FROM recipe_likes WHERE recipe_id=%s", (recipe_id,))
-            count = cursor.fetchone()['count']
+            cursor.execute(TOGGLE_LIKE_SQL, {'recipe_id': recipe_id, 'user_id': session['user_id']})
+            row = cursor.fetchone()
             conn.commit()
-            return {"liked": liked, "count": count}
+            if row['count'] is None:
+                return {"error": "Recipe not found"}, 404
+            result = {"liked": row['liked'], "count": row['count']}
+            like_limiter.remember(key, result)
+            invalidate_feed()
+            return result
+    finally:
+        conn.close()
+
+@app.route('/media/status/<int:recipe_id>')
+def media_status(recipe_id):
+    if 'user_id' not in session:
+        return {"error": "Authentication required"}, 401
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT user_id, media_status, video_filename, thumbnail FROM recipes WHERE id=%s", (recipe_id,))
+            recipe = cursor.fetchone()
     finally:
         conn.close()
+    if not recipe:
+        return {"error": "Recipe not found"}, 404
+    if session['role'] != 'admin' and recipe['user_id'] != session['user_id']:
+        return {"error": "Permission denied"}, 403
+
+    status = media_pipeline.status('recipe', recipe_id)
+    return {
+        "state": recipe['media_status'],
+        "video": recipe['video_filename'],
+        "thumbnail": recipe['thumbnail'],
+        "jobs": status['jobs'],
+    }
+
+# Batched views are flushed every few seconds and on graceful worker shutdown
+view_counter = ViewCounter(get_db_connection)
+atexit.register(view_counter.shutdown)
+
+# Spooled media uploads, finished by background workers (see media.py)
+def media_changed(kind, target_id):
+    # A background upload landed: feed cards show both recipe media and author photos
+    if kind == 'user':
+        invalidate_identity(target_id)
+    else:
+        index_ready_title(target_id)
+        title_generation.bump()
+    invalidate_feed()
+
+media_pipeline = media.MediaPipeline(get_db_connection, on_change=media_changed)
+
+VIEW_SQL = f"UPDATE recipes SET views = views + 1, trending = {trending.add_sql(trending.points_sql('view'))} WHERE id=%s"
 
 @app.route('/view/<int:recipe_id>', methods=['POST'])
 def increment_view(recipe_id):
+    if VIEW_COUNT_MODE == 'batched':
+        view_counter.record(recipe_id)
+        return {"status": "success"}
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("UPDATE recipes SET views = views + 1 WHERE id=%s", (recipe_id,))
+            cursor.execute(VIEW_SQL, (recipe_id,))
             conn.commit()
             return {"status": "success"}
     finally:
         conn.close()
 
+COMMENT_PAGE_SIZE = int(os.getenv("COMMENT_PAGE_SIZE", 20))
+# First page of each recipe's thread. Keys carry the comments generation, which
+# every written batch of posts bumps, so every worker drops its cached threads,
+# as with the feed.
+comment_generation = cache.make_generation('comments')
+comment_cache = cache.make_cache('comments', max_entries=2000, ttl=int(os.getenv("COMMENT_CACHE_TTL", 30)))
+
+def comment_cache_key(recipe_id):
+    return f"{comment_generation.current()}:{recipe_id}"
+
+COMMENT_COLUMNS = """
+    comments.id, comments.recipe_id, comments.user_id, comments.comment,
+    comments.created_at AS sort_key, to_char(comments.created_at, 'Mon DD, HH24:MI') AS created_at
+"""
+
+# Posts are group-committed by CommentBatcher: one statement inserts a whole batch,
+# moves each recipe's counter and trending score once, and returns the rendered
+# rows. Comments on recipes that no longer exist are dropped.
+POST_COMMENTS_SQL = f"""
+    WITH batch (recipe_id, user_id, comment) AS (VALUES %s),
+    inserted AS (
+        INSERT INTO comments (recipe_id, user_id, comment)
+        SELECT batch.recipe_id, batch.user_id, batch.comment FROM batch
+        WHERE EXISTS (SELECT 1 FROM recipes WHERE id = batch.recipe_id)
+        RETURNING *
+    ), counted AS (
+        UPDATE recipes SET comment_count = comment_count + added.n,
+            trending = {trending.add_sql(trending.points_sql('comment', count='added.n'), 'recipes.trending')}
+        FROM (SELECT recipe_id, COUNT(*) AS n FROM inserted GROUP BY recipe_id) added
+        WHERE recipes.id = added.recipe_id
+    )
+    SELECT {COMMENT_COLUMNS}, users.username, users.profile_photo
+    FROM inserted AS comments
+    JOIN users ON comments.user_id = users.id
+"""
+
+def comments_changed():
+    comment_generation.bump()
+    invalidate_feed()
+
+comment_writer = CommentBatcher(get_db_connection, POST_COMMENTS_SQL, on_write=comments_changed)
+
+def fetch_comment_page(cursor, recipe_id, after=None, limit=COMMENT_PAGE_SIZE):
+    # Newest first, one keyset page at a time along idx_comments_recipe_created
+    params = [recipe_id]
+    sql = f"""
+        SELECT {COMMENT_COLUMNS}, users.username, users.profile_photo
+        FROM comments 
+        JOIN users ON comments.user_id = users.id 
+        WHERE comments.recipe_id = %s
+    """
+    position = decode_cursor(after, 'comments', lambda sort_by, value: datetime.fromisoformat(value))
+    if position:
+        sql += " AND (comments.created_at, comments.id) < (%s, %s)"
+        params.extend(position)
+    sql += " ORDER BY comments.created_at DESC, comments.id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    cursor.execute(sql, tuple(params))
+    comments = cursor.fetchall()
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor('comments', comments[-1]['sort_key'], comments[-1]['id'])
+    for c in comments:
+        del c['sort_key']
+    return comments, next_cursor
+
 @app.route('/comments/<int:recipe_id>')
 def get_comments(recipe_id):
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT comments.*, users.username, users.profile_photo 
-                FROM comments 
-                JOIN users ON comments.user_id = users.id 
-                WHERE recipe_id = %s 
-                ORDER BY created_at DESC
-            """, (recipe_id,))
-            comments = cursor.fetchall()
-            # Convert datetime to string for JSON serialization
-            for c in comments:
-                c['created_at'] = c['created_at'].strftime('%b %d, %H:%M')
-            return {"comments": comments}
-    finally:
-        conn.close()
+    after = request.args.get('cursor')
+
+    def compute():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                comments, next_cursor = fetch_comment_page(cursor, recipe_id, after)
+                return {"comments": [dict(c) for c in comments], "next_cursor": next_cursor}
+        finally:
+            conn.close()
+
+    if after:
+        return compute()
+    return comment_cache.get_or_compute(comment_cache_key(recipe_id), compute)
 
 @app.route('/comment/post', methods=['POST'])
 def post_comment():
     if 'user_id' not in session:
         return {"error": "Authentication required"}, 401
     
-    recipe_id = request.form.get('recipe_id')
-    comment_text = request.form.get('comment')
+    recipe_id = request.form.get('recipe_id', type=int)
+    comment_text = (request.form.get('comment') or '').strip()
     
     if not comment_text:
         return {"error": "Comment cannot be empty"}, 400
+    if recipe_id is None:
+        return {"error": "Recipe not found"}, 404
         
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO comments (recipe_id, user_id, comment) VALUES (%s, %s, %s)",
-                (recipe_id, session['user_id'], comment_text)
-            )
-            conn.commit()
-            return {"status": "success"}
-    finally:
-        conn.close()
+        comment = comment_writer.post(recipe_id, session['user_id'], comment_text)
+    except TimeoutError:
+        # Still queued and will be stored; a retry would post it twice
+        return {"status": "pending"}, 202
+    if not comment:
+        return {"error": "Recipe not found"}, 404
+    comment = dict(comment)
+    del comment['sort_key']
+    return {"status": "success", "comment": comment}
 
 @app.route('/profile')
 def profile():
@@ -521,7 +1041,10 @@ def profile():
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE id=%s", (session['user_id'],))
+            cursor.execute(
+                "SELECT id, username, role, full_name, email, gender, age, phone_number, profile_photo FROM users WHERE id=%s",
+                (session['user_id'],)
+            )
             user = cursor.fetchone()
     finally:
         conn.close()
@@ -538,29 +1061,28 @@ def update_profile():
     phone_number = request.form.get('phone_number')
     age = request.form.get('age')
     
-    profile_photo = None
-    if 'profile_photo' in request.files:
-        file = request.files['profile_photo']
-        if file and file.filename != '':
-            profile_photo = upload_to_cloudinary(file, resource_type="image")
+    photo_path = None
+    photo = request.files.get('profile_photo')
+    if photo and photo.filename:
+        if not allowed_image(photo.filename):
+            flash(PHOTO_TYPE_ERROR, 'danger')
+            return redirect(url_for('profile'))
+        photo_path = media.spool(photo)
 
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            if profile_photo:
-                cursor.execute(
-                    "UPDATE users SET full_name=%s, email=%s, gender=%s, phone_number=%s, age=%s, profile_photo=%s WHERE id=%s",
-                    (full_name, email, gender, phone_number, age, profile_photo, session['user_id'])
-                )
-            else:
-                cursor.execute(
-                    "UPDATE users SET full_name=%s, email=%s, gender=%s, phone_number=%s, age=%s WHERE id=%s",
-                    (full_name, email, gender, phone_number, age, session['user_id'])
-                )
+            cursor.execute(
+                "UPDATE users SET full_name=%s, email=%s, gender=%s, phone_number=%s, age=%s WHERE id=%s",
+                (full_name, email, gender, phone_number, age, session['user_id'])
+            )
             conn.commit()
-            if profile_photo:
-                session['profile_photo'] = profile_photo
-        flash('Profile updated successfully!', 'success')
+        # Released before submitting, as in upload_recipe
+        conn.close()
+        invalidate_identity(session['user_id'])
+        if photo_path:
+            media_pipeline.submit('user', session['user_id'], 'profile_photo', photo_path, 'image')
+        flash('Profile updated successfully!' if not photo_path else 'Profile updated! Your new photo will appear shortly.', 'success')
     except Exception as e:
         flash(f"Error updating profile: {str(e)}", 'danger')
     finally:
@@ -588,8 +1110,14 @@ def change_password():
             
             if user and check_password_hash(user['password'], current_password):
                 hashed_pw = generate_password_hash(new_password)
-                cursor.execute("UPDATE users SET password=%s WHERE id=%s", (hashed_pw, session['user_id']))
+                # New auth_version: other sessions of this user are signed out, this one is kept
+                cursor.execute(
+                    "UPDATE users SET password=%s, auth_version = auth_version + 1 WHERE id=%s RETURNING auth_version",
+                    (hashed_pw, session['user_id'])
+                )
+                session['auth_version'] = cursor.fetchone()['auth_version']
                 conn.commit()
+                invalidate_identity(session['user_id'])
                 flash('Password updated successfully!', 'success')
             else:
                 flash('Incorrect current password!', 'danger')
@@ -599,20 +1127,98 @@ def change_password():
         conn.close()
     return redirect(url_for('profile'))
 
+ADMIN_USER_PAGE_SIZE = 50
+ADMIN_USER_COLUMNS = "id, username, email, role, created_at"
+USER_SORT_ORDERS = {
+    'newest': ('created_at', 'DESC'),
+    'oldest': ('created_at', 'ASC'),
+    'username': ('username', 'ASC'),
+}
+
+def user_sort_value(sort_by, value):
+    return datetime.fromisoformat(value) if USER_SORT_ORDERS[sort_by][0] == 'created_at' else str(value)
+
+def fetch_user_page(cursor, query='', sort_by='newest', after=None, limit=ADMIN_USER_PAGE_SIZE):
+    # One keyset page of the user directory; search is a prefix match on
+    # username or email so it can use the lower(...) text_pattern_ops indexes
+    if sort_by not in USER_SORT_ORDERS:
+        sort_by = 'newest'
+    sort_col, direction = USER_SORT_ORDERS[sort_by]
+    conditions, params = [], []
+
+    if query:
+        pattern = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append("(lower(username) LIKE %s OR lower(email) LIKE %s)")
+        params.extend([pattern, pattern])
+
+    position = decode_cursor(after, sort_by, user_sort_value)
+    if position:
+        op = '<' if direction == 'DESC' else '>'
+        conditions.append(f"({sort_col}, id) {op} (%s, %s)")
+        params.extend(position)
+
+    sql = f"SELECT {ADMIN_USER_COLUMNS} FROM users"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {sort_col} {direction}, id {direction} LIMIT %s"
+    params.append(limit + 1)
+
+    cursor.execute(sql, tuple(params))
+    users = cursor.fetchall()
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        last = users[-1]
+        next_cursor = encode_cursor(sort_by, last[sort_col], last['id'])
+    return users, next_cursor
+
 @app.route('/admin/users')
 def admin_users():
     if 'user_id' not in session or session['role'] != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('index'))
-        
+
+    query = request.args.get('q', '').strip()
+    sort_by = request.args.get('sort', 'newest')
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            users, next_cursor = fetch_user_page(cursor, query, sort_by, request.args.get('cursor'))
+            # Header figures: totals from the stats view, admins via a partial index
+            cursor.execute("SELECT total_users FROM mv_admin_totals")
+            row = cursor.fetchone()
+            cursor.execute("SELECT COUNT(*) AS count FROM users WHERE role = 'admin'")
+            admin_count = cursor.fetchone()['count']
+            cursor.execute("SELECT COALESCE(SUM(count), 0) AS count FROM mv_daily_signups WHERE date > CURRENT_DATE - 7")
+            recent_count = cursor.fetchone()['count']
+    finally:
+        conn.close()
+    user_stats = {
+        'total': row['total_users'] if row else 0,
+        'admins': admin_count,
+        'recent': recent_count,
+    }
+    return render_template('admin_users.html', users=users, next_cursor=next_cursor,
+                           user_stats=user_stats, query=query, sort_by=sort_by)
+
+@app.route('/api/admin/users')
+def api_admin_users():
+    if 'user_id' not in session or session['role'] != 'admin':
+        return {"error": "Unauthorized"}, 403
+
+    query = request.args.get('q', '').strip()
+    sort_by = request.args.get('sort', 'newest')
+    limit = min(max(request.args.get('limit', ADMIN_USER_PAGE_SIZE, type=int), 1), 200)
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
-            users = cursor.fetchall()
+            users, next_cursor = fetch_user_page(cursor, query, sort_by, request.args.get('cursor'), limit)
     finally:
         conn.close()
-    return render_template('admin_users.html', users=users)
+    html = render_template('_admin_user_rows.html', users=users)
+    rows = [dict(u, created_at=u['created_at'].isoformat() if u['created_at'] else None) for u in users]
+    return {"users": rows, "html": html, "next_cursor": next_cursor, "count": len(users)}
 
 @app.route('/admin/user_details/<int:user_id>')
 def admin_user_details(user_id):
@@ -622,27 +1228,24 @@ def admin_user_details(user_id):
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE id=%s", (user_id,))
+            # Profile and activity counts in one round trip; each count is an
+            # index-only lookup on the table's user_id index
+            cursor.execute("""
+                SELECT u.id, u.username, u.full_name, u.email, u.gender, u.age,
+                       u.phone_number, u.profile_photo, u.role, u.created_at,
+                       (SELECT COUNT(*) FROM recipes WHERE user_id = u.id) AS recipe_count,
+                       (SELECT COUNT(*) FROM comments WHERE user_id = u.id) AS comment_count,
+                       (SELECT COUNT(*) FROM recipe_likes WHERE user_id = u.id) AS like_count
+                FROM users u
+                WHERE u.id = %s
+            """, (user_id,))
             user = cursor.fetchone()
             if not user:
                 return {"error": "User not found"}, 404
             
-            # Count user's recipes
-            cursor.execute("SELECT COUNT(*) as count FROM recipes WHERE user_id=%s", (user_id,))
-            recipe_count = cursor.fetchone()['count']
-            
-            # Count user's comments
-            cursor.execute("SELECT COUNT(*) as count FROM comments WHERE user_id=%s", (user_id,))
-            comment_count = cursor.fetchone()['count']
-            
-            # Count user's likes
-            cursor.execute("SELECT COUNT(*) as count FROM recipe_likes WHERE user_id=%s", (user_id,))
-            like_count = cursor.fetchone()['count']
-            
             user_data = {
                 "id": user['id'],
                 "username": user['username'],
-                "password": user['password'],
                 "full_name": user.get('full_name') or '',
                 "email": user.get('email') or '',
                 "gender": user.get('gender') or '',
@@ -651,9 +1254,9 @@ def admin_user_details(user_id):
                 "profile_photo": user.get('profile_photo') or '',
                 "role": user['role'],
                 "created_at": user['created_at'].strftime('%B %d, %Y at %I:%M %p') if user.get('created_at') else '',
-                "recipe_count": recipe_count,
-                "comment_count": comment_count,
-                "like_count": like_count
+                "recipe_count": user['recipe_count'],
+                "comment_count": user['comment_count'],
+                "like_count": user['like_count']
             }
             return user_data
     finally:
@@ -678,6 +1281,7 @@ def toggle_role(user_id):
                 new_role = 'admin' if user['role'] == 'user' else 'user'
                 cursor.execute("UPDATE users SET role=%s WHERE id=%s", (new_role, user_id))
                 conn.commit()
+                invalidate_identity(user_id)
                 flash('User role updated!', 'success')
     finally:
         conn.close()
@@ -695,8 +1299,24 @@ def delete_user(user_id):
                 flash('You cannot delete yourself!', 'danger')
                 return redirect(url_for('admin_users'))
                 
+            # Take the user's likes and comments off the recipe counters and
+            # trending scores before the cascade removes the rows
+            trending.remove_user(cursor, user_id)
+            cursor.execute("""
+                UPDATE recipes SET like_count = GREATEST(like_count - l.n, 0)
+                FROM (SELECT recipe_id, COUNT(*) AS n FROM recipe_likes WHERE user_id = %s GROUP BY recipe_id) l
+                WHERE recipes.id = l.recipe_id
+            """, (user_id,))
+            cursor.execute("""
+                UPDATE recipes SET comment_count = GREATEST(comment_count - c.n, 0)
+                FROM (SELECT recipe_id, COUNT(*) AS n FROM comments WHERE user_id = %s GROUP BY recipe_id) c
+                WHERE recipes.id = c.recipe_id
+            """, (user_id,))
             cursor.execute("DELETE FROM users WHERE id=%s", (user_id,))
             conn.commit()
+            invalidate_identity(user_id)
+            comment_generation.bump()
+            invalidate_feed()
             flash('User deleted successfully.', 'success')
     finally:
         conn.close()
@@ -718,8 +1338,16 @@ def admin_reset_password(user_id):
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("UPDATE users SET password=%s WHERE id=%s", (hashed_password, user_id))
+            # Signs the user out everywhere
+            cursor.execute(
+                "UPDATE users SET password=%s, auth_version = auth_version + 1 WHERE id=%s RETURNING auth_version",
+                (hashed_password, user_id)
+            )
+            user = cursor.fetchone()
             conn.commit()
+            invalidate_identity(user_id)
+            if user and user_id == session['user_id']:
+                session['auth_version'] = user['auth_version']
             flash('Password reset successfully!', 'success')
     except Exception as e:
         print(f"Error resetting password: {e}")
@@ -729,54 +1357,99 @@ def admin_reset_password(user_id):
         
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/pool_stats')
+def admin_pool_stats():
+    if 'user_id' not in session or session['role'] != 'admin':
+        return {"error": "Unauthorized"}, 403
+    return db.pool_stats()
+
+SUGGEST_DEADLINE = float(os.getenv("SUGGEST_DEADLINE", 0.15))  # overall budget for one /suggestions call
+
 @app.route('/suggestions')
 def suggestions():
     query = request.args.get('q', '').lower().strip()
     if not query:
         return {"suggestions": []}
     
-    # Check cache first
-    now = time.time()
-    if query in SUGGESTION_CACHE:
-        cached_data, timestamp = SUGGESTION_CACHE[query]
-        if now - timestamp < CACHE_TIMEOUT:
-            return {"suggestions": cached_data}
-    
+    # Cached per prefix; concurrent misses on the same prefix share one lookup.
+    # Partial answers (remote source missed the deadline) are not cached.
+    final_suggestions, complete = suggestion_cache.get_or_compute(
+        query, lambda: lookup_suggestions(query), should_cache=lambda result: result[1]
+    )
+    return {"suggestions": final_suggestions}
+
+def lookup_suggestions(query):
+    # Returns (suggestions, complete). Local and remote sources run concurrently
+    # under one deadline; a late remote answer lands in external.suggest's cache
+    # and is picked up by the next keystroke.
+    deadline = time.time() + SUGGEST_DEADLINE
+    external.suggest.get(query, 4, budget=0)  # start (or reuse) the remote fetch
+
     suggestions_list = []
     
-    # 1. Get local suggestions (fastest)
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT DISTINCT title FROM recipes WHERE title ILIKE %s LIMIT 3",
-                (f'%{query}%',)
-            )
-            suggestions_list.extend([row['title'] for row in cursor.fetchall()])
-    except:
-        pass
-    finally:
-        conn.close()
+    # 1. Get local suggestions (fastest, in-memory prefix index)
+    if title_index.ensure_loaded():
+        suggestions_list.extend(title_index.search(query, 3))
+    else:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT DISTINCT title FROM recipes WHERE title ILIKE %s LIMIT 3",
+                    (f'%{query}%',)
+                )
+                suggestions_list.extend([row['title'] for row in cursor.fetchall()])
+        except:
+            pass
+        finally:
+            conn.close()
         
-    # 2. Get YouTube suggestions (External - cached)
-    try:
-        url = f"https://suggestqueries.google.com/complete/search?client=firefox&ds=yt&q={quote(query)}"
-        req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        # Set a short timeout for the network request
-        with urlopen(req, timeout=1.5) as response:
-            data = json.loads(response.read().decode())
-            if len(data) > 1:
-                for s in data[1][:4]:
-                    if s not in suggestions_list:
-                        suggestions_list.append(s)
-    except:
-        pass
+    # 2. Get YouTube suggestions (External - pooled client, cached, deadline-bounded)
+    remote = external.suggest.get(query, 4, budget=max(deadline - time.time(), 0), default=None)
+    for s in remote or []:
+        if s not in suggestions_list:
+            suggestions_list.append(s)
     
-    # Save to cache before returning
-    final_suggestions = suggestions_list[:7]
-    SUGGESTION_CACHE[query] = (final_suggestions, now)
-        
-    return {"suggestions": final_suggestions}
+    return suggestions_list[:7], remote is not None
+
+@app.route('/admin/cache_stats')
+def admin_cache_stats():
+    if 'user_id' not in session or session['role'] != 'admin':
+        return {"error": "Unauthorized"}, 403
+    stats = cache.cache_stats()
+    for name in ('youtube', 'suggest'):
+        # Fresh and stale hits, timeouts and errors on top of the cache's own numbers
+        stats[name].update({f"external_{k}": v for k, v in getattr(external, name).stats.items()})
+    return stats
+
+def collect_metrics():
+    # Gauges and counters kept by the caches (the external results' included)
+    # and the pool, read whenever this worker's metrics snapshot is taken
+    caches = cache.cache_stats()
+    pool = db.pool_stats()
+    yield ('cache_hits_total', 'counter', 'Cache hits by cache', {(('cache', n),): c['hits'] for n, c in caches.items()})
+    yield ('cache_misses_total', 'counter', 'Cache misses by cache', {(('cache', n),): c['misses'] for n, c in caches.items()})
+    yield ('cache_entries', 'gauge', 'Entries held by each cache', {(('cache', n),): c.get('size') for n, c in caches.items()})
+    yield ('db_pool_connections', 'gauge', 'Pooled DB connections by state',
+           {(('state', 'in_use'),): pool['in_use'], (('state', 'idle'),): pool['idle']})
+    yield ('db_pool_waits_total', 'counter', 'Checkouts that had to wait for a connection', {(): pool['waits']})
+    yield ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection', {(): pool['wait_time']})
+
+metrics.registry.add_collector(collect_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus scrape of every worker on this host, for METRICS_ALLOW addresses only
+    if not metrics.METRICS_ENABLED or request.remote_addr not in metrics.METRICS_ALLOW:
+        return "Not Found", 404
+    return metrics.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def warm_up():
+    # Per-process state that should be ready before the first request; gunicorn
+    # calls this from post_worker_init
+    title_index.start()
 
 if __name__ == '__main__':
+    metrics.clear_directory()
+    warm_up()
     app.run(debug=True)
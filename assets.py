@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import gzip
+import hashlib
+import mimetypes
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup
+from werkzeug.security import safe_join
+
+# Static asset pipeline. `python assets.py build` copies everything under
+# static/ (except uploads) into static/dist/ with a content hash in the name,
+# minifies CSS, writes .gz/.br siblings for text files and a manifest.json
+# mapping original paths to fingerprinted ones. At runtime url_for('static',
+# filename='css/style.css') resolves through the manifest, fingerprinted files
+# are served with a one-year immutable Cache-Control (precompressed when the
+# client accepts it), and without a manifest everything falls back to the
+# plain files. Without brotli installed only .gz files are written.
+
+STATIC_DIR = 'static'
+DIST = 'dist'
+MANIFEST_PATH = os.path.join(STATIC_DIR, DIST, 'manifest.json')
+SKIP_DIRS = {'uploads', DIST}
+COMPRESS_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.html'}
+COMPRESS_MIN_SIZE = 1024
+HASH_LENGTH = 10
+
+ASSET_PIPELINE = os.getenv("ASSET_PIPELINE", "on")      # 'off' serves the unhashed files
+ASSET_MAX_AGE = 365 * 24 * 3600
+UPLOAD_MAX_AGE = int(os.getenv("UPLOAD_MAX_AGE", 7 * 24 * 3600))
+
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+
+_warned = set()
+
+
+def _warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        print(message)
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        _warn_once('brotli', "brotli is not installed; writing gzip copies only")
+        return None
+    return brotli
+
+
+def minify_css(text):
+    # Strings are kept as they are; comments go and whitespace collapses around
+    # punctuation everywhere else
+    out = []
+    last = 0
+    for match in CSS_TOKENS.finditer(text):
+        out.append(_squeeze_css(text[last:match.start()]))
+        if match.group(1):
+            out.append(match.group(1))
+        last = match.end()
+    out.append(_squeeze_css(text[last:]))
+    return ''.join(out).strip()
+
+
+def _squeeze_css(chunk):
+    chunk = re.sub(r'\s+', ' ', chunk)
+    chunk = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+    chunk = re.sub(r':\s+', ':', chunk)
+    return chunk.replace(';}', '}')
+
+
+def fingerprint(rel_path, data):
+    stem, ext = os.path.splitext(rel_path)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f"{DIST}/{stem}.{digest}{ext}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _sources(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def build(static_dir=STATIC_DIR):
+    """Fingerprint, minify and precompress static assets. Returns the manifest.
+    Older fingerprinted files are left in place so pages rendered before a
+    deploy keep working."""
+    brotli = _brotli()
+    manifest = {}
+    for rel, path in sorted(_sources(static_dir)):
+        with open(path, 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(rel)[1].lower()
+        if ext == '.css':
+            data = minify_css(data.decode('utf-8')).encode('utf-8')
+
+        hashed = fingerprint(rel, data)
+        target = os.path.join(static_dir, hashed)
+        manifest[rel] = hashed
+        if os.path.exists(target):
+            continue
+        _write(target, data)
+        if ext in COMPRESS_EXTENSIONS and len(data) >= COMPRESS_MIN_SIZE:
+            _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(data, quality=11))
+
+    _write(os.path.join(static_dir, DIST, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Asset manifest error: {e}")
+        return {}
+
+
+class AssetPipeline:
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        if ASSET_PIPELINE != 'off':
+            self.manifest = load_manifest(os.path.join(app.static_folder, DIST, 'manifest.json'))
+        app.url_defaults(self._rewrite)
+        app.view_functions['static'] = self.serve
+
+    def _rewrite(self, endpoint, values):
+        if endpoint == 'static':
+            hashed = self.manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+    def serve(self, filename):
+        if not filename.startswith(DIST + '/'):
+            max_age = UPLOAD_MAX_AGE if filename.startswith('uploads/') else None
+            return send_from_directory(self.static_folder, filename, max_age=max_age)
+
+        response = None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            path = safe_join(self.static_folder, filename + suffix)
+            if request.accept_encodings[encoding] and path and os.path.isfile(path):
+                response = send_from_directory(self.static_folder, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(self.static_folder, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+if __name__ == "__main__":
+    manifest = build()
+    print(f"Built {len(manifest)} assets into {os.path.join(STATIC_DIR, DIST)}")
@@ -0,0 +1,172 @@
+"""Load test a comment thread with 100k comments.
+
+Runs the real /comments and /comment/post routes through Flask's test client
+against the database in DATABASE_URL (run db_setup.py on a scratch database
+first). Seeds one recipe with --comments rows, then measures the cached first
+page, a cursor walk into the thread, concurrent readers and concurrent posters,
+and checks that recipes.comment_count still equals the rows. Removes its data
+afterwards.
+
+    python benchmarks/comments_load_test.py --comments 100000 --threads 16 --requests 2000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as recipe_app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summary(label, samples):
+    print(f"  {label:<22}: p50 {statistics.median(samples):.2f}ms  p95 {percentile(samples, 95):.2f}ms  "
+          f"max {max(samples):.2f}ms  ({len(samples)} requests)")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def seed(comments, authors):
+    conn = recipe_app.get_db_connection()
+    with conn.cursor() as cursor:
+        tag = f"commentload_{int(time.time())}"
+        cursor.execute(
+            "INSERT INTO users (username, password) SELECT %s || g, 'x' FROM generate_series(1, %s) g RETURNING id",
+            (tag + "_", authors)
+        )
+        user_ids = [r['id'] for r in cursor.fetchall()]
+        cursor.execute("INSERT INTO recipes (title, user_id) VALUES (%s, %s) RETURNING id", (tag, user_ids[0]))
+        recipe_id = cursor.fetchone()['id']
+        # One timestamp per three comments, so the id tiebreak in the cursor matters
+        cursor.execute("""
+            INSERT INTO comments (recipe_id, user_id, comment, created_at)
+            SELECT %s, (%s::int[])[1 + g %% %s], 'comment ' || g,
+                   NOW() - ((g / 3) * INTERVAL '1 second')
+            FROM generate_series(1, %s) g
+        """, (recipe_id, user_ids, len(user_ids), comments))
+        cursor.execute("UPDATE recipes SET comment_count = %s WHERE id = %s", (comments, recipe_id))
+        cursor.execute("ANALYZE comments")
+        conn.commit()
+    conn.close()
+    return recipe_id, user_ids
+
+
+def run(comments, threads, total, depth, posts):
+    started = time.perf_counter()
+    recipe_id, user_ids = seed(comments, authors=200)
+    print(f"seeded {comments:,} comments in {time.perf_counter() - started:.1f}s")
+
+    client = recipe_app.app.test_client()
+    url = f'/comments/{recipe_id}'
+    try:
+        recipe_app.comment_cache.delete(recipe_app.comment_cache_key(recipe_id))
+        _, cold = timed(lambda: client.get(url))
+        warm = [timed(lambda: client.get(url))[1] for _ in range(200)]
+        print(f"first page: cold {cold:.2f}ms")
+        summary("first page (cached)", warm)
+
+        # Walk into the thread page by page; each page is one index range scan
+        pages, cursor, seen = [], None, []
+        for _ in range(depth):
+            data, elapsed = timed(lambda: client.get(url, query_string={'cursor': cursor} if cursor else None).get_json())
+            pages.append(elapsed)
+            seen.extend(c['id'] for c in data['comments'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        summary(f"cursor walk ({len(pages)} pages)", pages)
+        print(f"  comments seen        : {len(seen)} (no duplicates: {len(seen) == len(set(seen))})")
+
+        # Concurrent readers mixing the cached first page and deeper pages
+        latencies, lock = [], threading.Lock()
+        deep_cursor = cursor
+
+        def reader(n):
+            c = recipe_app.app.test_client()
+            for _ in range(n):
+                params = {'cursor': deep_cursor} if deep_cursor and random.random() < 0.2 else None
+                _, elapsed = timed(lambda: c.get(url, query_string=params))
+                with lock:
+                    latencies.append(elapsed)
+
+        wall_start = time.perf_counter()
+        pool = [threading.Thread(target=reader, args=(total // threads,)) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        wall = time.perf_counter() - wall_start
+        summary(f"{threads} readers", latencies)
+        print(f"  reader throughput    : {len(latencies) / wall:,.0f} req/s")
+
+        # Concurrent posters; every post must land in both the table and the counter
+        post_latencies, errors = [], []
+
+        def poster(uid):
+            c = recipe_app.app.test_client()
+            with c.session_transaction() as sess:
+                sess['user_id'] = uid
+                sess['role'] = 'user'
+            for i in range(posts):
+                response, elapsed = timed(lambda: c.post('/comment/post', data={'recipe_id': recipe_id, 'comment': f'load {uid} {i}'}))
+                with lock:
+                    post_latencies.append(elapsed)
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+
+        pool = [threading.Thread(target=poster, args=(user_ids[i % len(user_ids)],)) for i in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        summary(f"{threads} posters", post_latencies)
+        batches = recipe_app.comment_writer.stats
+        print(f"  post batches          : {batches['batches']} for {batches['posts']} posts, largest {batches['largest_batch']}")
+
+        first = client.get(url).get_json()
+        print(f"  first page after posts shows a new comment: {first['comments'][0]['comment'].startswith('load ')}")
+
+        conn = recipe_app.get_db_connection()
+        try:
+            with conn.cursor() as db_cursor:
+                db_cursor.execute("SELECT comment_count FROM recipes WHERE id = %s", (recipe_id,))
+                stored = db_cursor.fetchone()['comment_count']
+                db_cursor.execute("SELECT COUNT(*) AS count FROM comments WHERE recipe_id = %s", (recipe_id,))
+                actual = db_cursor.fetchone()['count']
+        finally:
+            conn.close()
+        print(f"  comment_count column : {stored}   rows: {actual}   non-200 posts: {len(errors)}")
+        ok = stored == actual == comments + threads * posts and not errors
+        print("  OK" if ok else "  MISMATCH")
+        return ok
+    finally:
+        conn = recipe_app.get_db_connection()
+        try:
+            with conn.cursor() as db_cursor:
+                db_cursor.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+                conn.commit()
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000, help='reads across all reader threads')
+    parser.add_argument('--depth', type=int, default=200, help='pages to walk with the cursor')
+    parser.add_argument('--posts', type=int, default=20, help='comments per poster thread')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.comments, args.threads, args.requests, args.depth, args.posts) else 1)
@@ -0,0 +1,205 @@
+"""Throughput of the gunicorn worker classes against a slow external dependency.
+
+Starts a stub server that answers after --latency seconds (500 ms by default),
+points the app's YouTube source at it, and runs the real app under gunicorn
+with gunicorn.conf.py once per worker class. Each run fires --requests
+/api/youtube calls with distinct queries (so every one is a cache miss and
+waits on the stub) from --concurrency client threads. gevent is skipped when
+it is not installed. Needs no database.
+
+    python benchmarks/concurrency_benchmark.py --workers 2 --concurrency 200 --requests 2000
+"""
+import os
+import sys
+import time
+import json
+import socket
+import argparse
+import threading
+import statistics
+import subprocess
+import http.client
+import urllib.parse
+import urllib.request
+import importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubProvider:
+    """Stands in for VideosSearch: one HTTP round trip to the stub server."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def search(self, query, limit):
+        with urllib.request.urlopen(f"{self.url}?{urllib.parse.urlencode({'q': query})}", timeout=30) as response:
+            response.read()
+        return []
+
+
+if os.getenv("CONCURRENCY_BENCH_STUB"):
+    # Loaded by gunicorn inside a benchmark run: the real app, YouTube stubbed
+    sys.path.insert(0, ROOT)
+    import app as recipe_app
+    import external
+    external.youtube.provider = StubProvider(os.environ["CONCURRENCY_BENCH_STUB"])
+    application = recipe_app.app
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def load(port, total, concurrency, tag):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                break
+            start = time.perf_counter()
+            try:
+                conn.request('GET', f'/api/youtube?q={tag}+{n}&limit=4')
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+        conn.close()
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def run_mode(worker_class, args, stub_url):
+    port = free_port()
+    env = dict(os.environ,
+               CONCURRENCY_BENCH_STUB=stub_url,
+               DATABASE_URL=os.getenv('DATABASE_URL', 'postgresql://unused'),
+               GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads),
+               YOUTUBE_WORKERS=str(args.threads),
+               YOUTUBE_ASYNC_BUDGET='30')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', '--chdir', os.path.join(ROOT, 'benchmarks'),
+         '--log-level', 'warning', 'concurrency_benchmark:application'],
+        cwd=ROOT, env=env
+    )
+    try:
+        if not wait_for(port):
+            print(f"{worker_class}: gunicorn did not start")
+            return None
+        total = args.requests if worker_class != 'sync' else min(args.requests, args.sync_requests)
+        latencies, errors, wall = load(port, total, args.concurrency, worker_class)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    result = {
+        'worker_class': worker_class,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': round(len(latencies) / wall, 1),
+        'p50_ms': round(statistics.median(latencies), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 1) if latencies else None,
+    }
+    print(f"  {worker_class:<8} {result['throughput']:>8,.1f} req/s   p50 {result['p50_ms']}ms  "
+          f"p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  errors {result['errors']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.5, help='stub response time in seconds')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn processes in every mode')
+    parser.add_argument('--threads', type=int, default=100, help='GUNICORN_THREADS for gthread')
+    parser.add_argument('--concurrency', type=int, default=200, help='client threads')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sync-requests', type=int, default=100, help='cap for the sync run, which is slow')
+    parser.add_argument('--modes', default='sync,gthread,gevent')
+    parser.add_argument('--json', help='write the results here')
+    args = parser.parse_args()
+
+    SlowHandler.latency = args.latency
+    stub = StubServer(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}/search"
+
+    print(f"stub latency {args.latency * 1000:.0f}ms, {args.workers} workers, {args.concurrency} concurrent clients")
+    results = []
+    for mode in args.modes.split(','):
+        if mode == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print("  gevent   skipped (pip install gevent psycogreen)")
+            continue
+        result = run_mode(mode, args, stub_url)
+        if result:
+            results.append(result)
+    stub.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Benchmark the hot endpoints against a seeded database.
+
+Drives /, /search, /suggestions, /like, /view and /comments through Flask's
+test client from --threads threads, one endpoint at a time, against the
+database in DATABASE_URL (fill it with benchmarks/seed_data.py first). YouTube
+and Google suggest are replaced by in-process stubs that answer after
+--external-latency seconds, so runs never touch the network. Ids and users are
+drawn from the seeded rows with the same skew as the data: popular recipes get
+most of the traffic. /like toggles real rows.
+
+Prints p50/p95/p99 latency and throughput per endpoint and writes them, with
+the commit they were measured on, to benchmarks/results/<commit>.json (or
+--save). --baseline compares against an earlier file and exits non-zero when an
+endpoint got more than --threshold slower.
+
+    python benchmarks/harness.py --requests 2000 --threads 8
+    python benchmarks/harness.py --baseline benchmarks/results/3bad093.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+ENDPOINTS = ['home', 'search', 'suggestions', 'like', 'view', 'comments']
+SEARCH_TERMS = ['chicken', 'paneer curry', 'spicy', 'chocolate cake', 'lentil soup', 'quick noodle',
+                'garlic', 'biryani', 'healthy bowl', 'prawn', 'masala', 'oats smoothie']
+CATEGORIES = ['All', 'All', 'All', 'Dinner', 'Lunch', 'Snacks', 'Breakfast', 'Healthy']
+SORTS = ['newest', 'newest', 'newest', 'trending', 'oldest', 'shortest', 'longest']
+
+
+class StubYouTube:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def search(self, query, limit):
+        time.sleep(self.latency)
+        return [{'id': f'stub{i}', 'title': f'{query} video {i}', 'thumbnails': [{'url': ''}]} for i in range(limit)]
+
+
+class StubSuggest:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def search(self, query, limit):
+        time.sleep(self.latency)
+        return [f"{query} recipe", f"{query} easy", f"{query} at home", f"{query} quick"][:limit]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def skewed(items, skew=2.0):
+    # items are ordered most popular first
+    return items[int(random.random() ** skew * len(items))]
+
+
+def current_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_targets(recipe_app):
+    conn = recipe_app.get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM recipes ORDER BY views DESC, id LIMIT 50000")
+            recipe_ids = [r['id'] for r in cursor.fetchall()]
+            cursor.execute("""
+                SELECT id, username, role, profile_photo, auth_version FROM users
+                WHERE username ~ '^seed_[0-9]+$' ORDER BY id LIMIT 20000
+            """)
+            users = [dict(r) for r in cursor.fetchall()]
+    finally:
+        conn.close()
+    return recipe_ids, users
+
+
+def make_requests(recipe_ids):
+    """endpoint -> function(client) issuing one request."""
+    def home(client):
+        return client.get('/', query_string={'category': random.choice(CATEGORIES), 'sort': random.choice(SORTS)})
+
+    def search(client):
+        return client.get('/search', query_string={'q': random.choice(SEARCH_TERMS)})
+
+    def suggestions(client):
+        term = random.choice(SEARCH_TERMS)
+        return client.get('/suggestions', query_string={'q': term[:random.randint(2, len(term))]})
+
+    def like(client):
+        return client.post(f'/like/{skewed(recipe_ids)}')
+
+    def view(client):
+        return client.post(f'/view/{skewed(recipe_ids)}')
+
+    def comments(client):
+        return client.get(f'/comments/{skewed(recipe_ids, 3.0)}')
+
+    return {'home': home, 'search': search, 'suggestions': suggestions,
+            'like': like, 'view': view, 'comments': comments}
+
+
+def login(client, user):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user['id']
+        sess['auth_version'] = user['auth_version']
+        for field in ('username', 'role', 'profile_photo'):
+            sess[field] = user[field]
+
+
+def run_endpoint(recipe_app, name, request_fn, users, total, threads, warmup):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    per_thread = max(1, total // threads)
+
+    def worker():
+        client = recipe_app.app.test_client()
+        if name == 'like' and users:
+            login(client, random.choice(users))
+        for _ in range(warmup):
+            request_fn(client)
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            response = request_fn(client)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - started
+    errors = sum(n for status, n in statuses.items() if status >= 500)
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / wall, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'errors': errors,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def compare(results, baseline, threshold):
+    print(f"\nagainst {baseline['commit']} ({baseline['timestamp']}):")
+    regressed = []
+    for name, current in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        p50 = current['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0
+        p95 = current['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+        rate = current['throughput'] / before['throughput'] - 1 if before['throughput'] else 0
+        flag = ''
+        if p95 > threshold or rate < -threshold:
+            regressed.append(name)
+            flag = '  REGRESSION'
+        print(f"  {name:<12} p50 {p50:+7.1%}  p95 {p95:+7.1%}  throughput {rate:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help='per endpoint')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per thread first')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--external-latency', type=float, default=0.2, help='stub YouTube/suggest latency in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help=f'results file (default {os.path.relpath(RESULTS_DIR, ROOT)}/<commit>.json)')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging')
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        sys.exit("Error: DATABASE_URL not set")
+    random.seed(args.seed)
+
+    import app as recipe_app
+    import external
+    external.youtube.provider = StubYouTube(args.external_latency)
+    external.suggest.provider = StubSuggest(args.external_latency)
+
+    recipe_ids, users = load_targets(recipe_app)
+    if not recipe_ids:
+        sys.exit("No recipes found; run benchmarks/seed_data.py first")
+    requests = make_requests(recipe_ids)
+
+    print(f"{len(recipe_ids):,} recipes, {len(users):,} seeded users, {args.threads} threads, "
+          f"{args.requests} requests per endpoint, stub latency {args.external_latency * 1000:.0f}ms")
+    results = {}
+    for name in args.endpoints.split(','):
+        result = results[name] = run_endpoint(recipe_app, name, requests[name], users,
+                                              args.requests, args.threads, args.warmup)
+        print(f"  {name:<12} {result['throughput']:>8,.1f} req/s   p50 {result['p50_ms']:>8.2f}ms  "
+              f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  statuses {result['statuses']}")
+    recipe_app.view_counter.flush()
+
+    commit = current_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'args': vars(args),
+        'results': results,
+    }
+    path = args.save or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {os.path.relpath(path)}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
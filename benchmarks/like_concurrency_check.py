@@ -0,0 +1,98 @@
+"""Hammer one recipe's like toggle from many threads and verify the final count.
+
+Runs the real /like/<id> route through Flask's test client against the database
+in DATABASE_URL (run db_setup.py on a scratch database first). Creates its own
+users and recipe and removes them afterwards.
+
+    python benchmarks/like_concurrency_check.py --users 50 --toggles 7 --threads 16
+"""
+import os
+import sys
+import argparse
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as recipe_app
+from ratelimit import TokenBucketLimiter
+
+
+def run(users, toggles, threads):
+    # Let every click through; this checks the SQL, not the limiter
+    recipe_app.like_limiter = TokenBucketLimiter(capacity=10 ** 9, rate=10 ** 9)
+
+    conn = recipe_app.get_db_connection()
+    with conn.cursor() as cursor:
+        tag = f"likecheck_{int(time.time())}"
+        cursor.execute(
+            "INSERT INTO users (username, password) SELECT %s || g, 'x' FROM generate_series(1, %s) g RETURNING id",
+            (tag + "_", users)
+        )
+        user_ids = [r['id'] for r in cursor.fetchall()]
+        cursor.execute(
+            "INSERT INTO recipes (title, user_id) VALUES (%s, %s) RETURNING id",
+            (tag, user_ids[0])
+        )
+        recipe_id = cursor.fetchone()['id']
+        conn.commit()
+    conn.close()
+
+    # Every user toggles `toggles` times, several users per thread, plus each
+    # user's clicks are split across two threads to provoke double-click races
+    jobs = [(uid, toggles // 2) for uid in user_ids] + [(uid, toggles - toggles // 2) for uid in user_ids]
+    errors = []
+
+    def worker(chunk):
+        clients = {}
+        for uid, n in chunk:
+            client = clients.get(uid)
+            if client is None:
+                client = clients[uid] = recipe_app.app.test_client()
+                with client.session_transaction() as sess:
+                    sess['user_id'] = uid
+                    sess['role'] = 'user'
+            for _ in range(n):
+                response = client.post(f'/like/{recipe_id}')
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(jobs[i::threads],)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    conn = recipe_app.get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT like_count FROM recipes WHERE id = %s", (recipe_id,))
+            stored = cursor.fetchone()['like_count']
+            cursor.execute("SELECT COUNT(*) AS count FROM recipe_likes WHERE recipe_id = %s", (recipe_id,))
+            actual = cursor.fetchone()['count']
+            cursor.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+            conn.commit()
+    finally:
+        conn.close()
+
+    # Two simultaneous clicks by one user may both land as "like" (the second hits
+    # ON CONFLICT), so the serial parity is a reference, not a requirement. The
+    # counter must always equal the rows.
+    serial = users if toggles % 2 else 0
+    print(f"{users * toggles} toggles from {threads} threads in {elapsed:.2f}s")
+    print(f"  like_count column: {stored}   rows in recipe_likes: {actual}   serial expectation: {serial}")
+    print(f"  non-200 responses: {len(errors)}")
+    ok = stored == actual and 0 <= stored <= users and not errors
+    print("  OK" if ok else "  MISMATCH")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--toggles', type=int, default=7, help='clicks per user')
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.users, args.toggles, args.threads) else 1)
@@ -0,0 +1,141 @@
+"""Compare /api/pantry latency: merging whole posting lists versus the bounded candidate set.
+
+Builds a throwaway postings table at each size, with the same ingredient lines
+and skew as benchmarks/seed_data.py (so salt and oil turn up in most recipes),
+and the indexes db_setup.py creates. Then times the old query, which aggregates
+every posting of every pantry term, against ingredients.pantry_matches_sql.
+The bounded query is approximate, so its top results are also checked against
+the exact ranking: how many of the exact top ids it returned, and the summed
+coverage of its results over the exact sum. Point DATABASE_URL at a scratch
+database:
+
+    python benchmarks/pantry_benchmark.py --sizes 200000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingredients import parse_ingredients, ingredient_terms, pantry_matches_sql, pantry_params, PANTRY_CANDIDATES
+from seed_data import INGREDIENTS, INGREDIENT_SKEW
+
+load_dotenv()
+
+TABLE = "bench_pantry_postings"
+LIMIT = 20
+PANTRIES = [
+    ['salt', 'oil', 'onion'],
+    ['garlic', 'tomato', 'rice', 'chicken'],
+    ['saffron'],
+    ['egg', 'milk', 'flour', 'sugar', 'butter', 'baking powder', 'vanilla extract'],
+    ['salt', 'oil', 'onion', 'garlic', 'tomato', 'ginger', 'turmeric powder', 'red chilli powder',
+     'green chilli', 'cumin seed', 'garam masala', 'coriander leaf', 'paneer', 'yogurt', 'cream'],
+]
+
+EXACT_SQL = f"""
+    SELECT recipe_id, COUNT(DISTINCT position) AS matched, MAX(ingredient_count) AS total
+    FROM {TABLE}
+    WHERE term = ANY(%(terms)s)
+    GROUP BY recipe_id
+    ORDER BY COUNT(DISTINCT position)::float / MAX(ingredient_count) DESC, COUNT(DISTINCT position) DESC, recipe_id DESC
+    LIMIT %(limit)s
+"""
+
+
+def build_table(cursor, size):
+    phrases, terms = [], []
+    for idx, line in enumerate(INGREDIENTS, 1):
+        phrase = parse_ingredients(line)[0]
+        phrases.append((idx, phrase))
+        terms.extend((idx, term) for term in ingredient_terms(phrase))
+
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+            term VARCHAR(100) NOT NULL,
+            recipe_id INT NOT NULL,
+            position INT NOT NULL,
+            ingredient_count INT NOT NULL,
+            PRIMARY KEY (term, recipe_id, position) INCLUDE (ingredient_count)
+        )
+    """)
+    cursor.execute("CREATE TEMP TABLE bench_vocab (idx INT PRIMARY KEY, phrase TEXT)")
+    cursor.execute("CREATE TEMP TABLE bench_vocab_terms (idx INT, term TEXT)")
+    cursor.executemany("INSERT INTO bench_vocab VALUES (%s, %s)", phrases)
+    cursor.executemany("INSERT INTO bench_vocab_terms VALUES (%s, %s)", terms)
+    # 4-12 distinct ingredient lines per recipe, as seed_data.py picks them
+    cursor.execute(f"""
+        INSERT INTO {TABLE} (term, recipe_id, position, ingredient_count)
+        SELECT t.term, p.recipe_id, p.position, p.n
+        FROM (SELECT s.recipe_id, s.idx,
+                     (row_number() OVER (PARTITION BY s.recipe_id ORDER BY v.phrase) - 1)::int AS position,
+                     COUNT(*) OVER (PARTITION BY s.recipe_id)::int AS n
+              FROM (SELECT DISTINCT g AS recipe_id, 1 + floor(power(random(), %(skew)s) * %(vocab)s)::int AS idx
+                    FROM generate_series(1, %(size)s) g, LATERAL generate_series(1, 4 + (g %% 9)) k) s
+              JOIN bench_vocab v ON v.idx = s.idx) p
+        JOIN bench_vocab_terms t ON t.idx = p.idx
+        ON CONFLICT DO NOTHING
+    """, {'skew': INGREDIENT_SKEW, 'vocab': len(phrases), 'size': size})
+    cursor.execute("DROP TABLE bench_vocab, bench_vocab_terms")
+    cursor.execute(f"CREATE INDEX ON {TABLE} (term, ingredient_count, recipe_id DESC)")
+    cursor.execute(f"CREATE INDEX ON {TABLE} (recipe_id, term) INCLUDE (position, ingredient_count)")
+    # Index-only scans need the visibility map
+    cursor.execute(f"VACUUM ANALYZE {TABLE}")
+    cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+    return cursor.fetchone()[0]
+
+
+def time_query(cursor, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples), rows
+
+
+def run(sizes, repeat, budgets):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    conn.autocommit = True
+    cursor = conn.cursor()
+    bounded_sql = pantry_matches_sql(TABLE, ready_only=False)
+    try:
+        for size in sizes:
+            print(f"\nBuilding postings for {size:,} synthetic recipes...")
+            started = time.time()
+            postings = build_table(cursor, size)
+            print(f"  {postings:,} postings, built in {time.time() - started:.1f}s")
+            print(f"  {'pantry':<34}{'budget':>8}{'exact p50':>12}{'exact max':>12}{'bounded p50':>13}{'bounded max':>13}{'top ids':>9}{'coverage':>10}")
+            for pantry in PANTRIES:
+                terms = [parse_ingredients(item)[0] for item in pantry]
+                label = ','.join(terms) if len(terms) <= 4 else f"{len(terms)} items"
+                exact_p50, exact_max, exact = time_query(cursor, EXACT_SQL, {'terms': terms, 'limit': LIMIT}, repeat)
+                exact_total = sum(m / n for _, m, n in exact)
+                for budget in budgets:
+                    params = pantry_params(terms, LIMIT, budget)
+                    bounded_p50, bounded_max, bounded = time_query(cursor, bounded_sql, params, repeat)
+                    found = len({r[0] for r in exact} & {r[0] for r in bounded})
+                    ratio = sum(m / n for _, m, n in bounded) / exact_total if exact_total else 1.0
+                    print(f"  {label:<34}{budget:>8}{exact_p50:>10.2f}ms{exact_max:>10.2f}ms{bounded_p50:>11.2f}ms"
+                          f"{bounded_max:>11.2f}ms{found:>6}/{len(exact):<2}{ratio:>10.3f}")
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200000, 1000000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budgets', type=int, nargs='+', default=[PANTRY_CANDIDATES],
+                        help='PANTRY_CANDIDATES values to try: postings shared between the pantry terms')
+    args = parser.parse_args()
+    if not os.getenv("DATABASE_URL"):
+        print("Error: DATABASE_URL not found in .env")
+    else:
+        run(args.sizes, args.repeat, args.budgets)
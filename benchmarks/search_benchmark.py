@@ -0,0 +1,112 @@
+"""Compare /search latency: LIKE '%q%' versus the tsvector + GIN full-text path.
+
+Builds a throwaway table of synthetic recipes at each size, then times the two
+WHERE clauses the app has used. Point DATABASE_URL at a scratch database:
+
+    python benchmarks/search_benchmark.py --sizes 10000 100000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fulltext import search_vector_sql
+
+load_dotenv()
+
+TABLE = "bench_search_recipes"
+QUERIES = ["chicken", "paneer butter", "chocolate cake", "spicy noodles", "quinoa"]
+
+WORDS = [
+    'chicken', 'paneer', 'butter', 'garlic', 'onion', 'tomato', 'rice', 'noodles', 'spicy',
+    'sweet', 'chocolate', 'cake', 'lemon', 'ginger', 'curry', 'salad', 'soup', 'quinoa',
+    'mushroom', 'spinach', 'cheese', 'egg', 'bread', 'honey', 'mint', 'basil', 'pepper',
+]
+CATEGORIES = ['Breakfast', 'Lunch', 'Dinner', 'Instant', 'Bakery', 'Snacks', 'Healthy']
+
+
+def build_table(cursor, size):
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(100),
+            description TEXT,
+            ingredients TEXT,
+            category VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            search_vector tsvector
+        )
+    """)
+    # Random word salads drawn from a small vocabulary, generated server side
+    cursor.execute(f"""
+        INSERT INTO {TABLE} (title, description, ingredients, category, created_at)
+        SELECT
+            (SELECT string_agg(w, ' ') FROM (SELECT w FROM unnest(%(words)s::text[]) w ORDER BY random() + g * 0 LIMIT 3) t),
+            (SELECT string_agg(w, ' ') FROM (SELECT w FROM unnest(%(words)s::text[]) w ORDER BY random() + g * 0 LIMIT 12) t),
+            (SELECT string_agg(w, ', ') FROM (SELECT w FROM unnest(%(words)s::text[]) w ORDER BY random() + g * 0 LIMIT 8) t),
+            (%(categories)s::text[])[1 + (g %% 7)],
+            NOW() - (g || ' minutes')::interval
+        FROM generate_series(1, %(size)s) g
+    """, {'words': WORDS, 'categories': CATEGORIES, 'size': size})
+    cursor.execute(
+        f"UPDATE {TABLE} SET search_vector = "
+        + search_vector_sql('title', 'description', 'ingredients', 'category')
+    )
+    cursor.execute(f"CREATE INDEX ON {TABLE} USING GIN (search_vector)")
+    cursor.execute(f"CREATE INDEX ON {TABLE} (created_at, id)")
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def time_query(cursor, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def run(sizes, repeat):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    conn.autocommit = True
+    cursor = conn.cursor()
+    like_sql = f"""
+        SELECT id FROM {TABLE} WHERE (title LIKE %s OR description LIKE %s)
+        ORDER BY created_at DESC, id DESC LIMIT 13
+    """
+    fts_sql = f"""
+        SELECT id, ts_rank(search_vector, websearch_to_tsquery('english', %s)) AS rank
+        FROM {TABLE} WHERE search_vector @@ websearch_to_tsquery('english', %s)
+        ORDER BY rank DESC, id DESC LIMIT 13
+    """
+    try:
+        for size in sizes:
+            print(f"\nBuilding {size:,} synthetic recipes...")
+            started = time.time()
+            build_table(cursor, size)
+            print(f"  built in {time.time() - started:.1f}s")
+            print(f"  {'query':<18}{'LIKE p50':>12}{'LIKE max':>12}{'FTS p50':>12}{'FTS max':>12}")
+            for q in QUERIES:
+                like_p50, like_max = time_query(cursor, like_sql, (f"%{q}%", f"%{q}%"), repeat)
+                fts_p50, fts_max = time_query(cursor, fts_sql, (q, q), repeat)
+                print(f"  {q:<18}{like_p50:>10.2f}ms{like_max:>10.2f}ms{fts_p50:>10.2f}ms{fts_max:>10.2f}ms")
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    if not os.getenv("DATABASE_URL"):
+        print("Error: DATABASE_URL not found in .env")
+    else:
+        run(args.sizes, args.repeat)
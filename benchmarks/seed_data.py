@@ -0,0 +1,287 @@
+"""Fill the database with synthetic users, recipes, likes and comments.
+
+Everything is generated server side with generate_series, so millions of rows
+take minutes, not hours. Distributions are skewed the way real traffic is: a
+few prolific authors, a long tail of views, likes and comments concentrated on
+popular recipes, common ingredients far more common than rare ones, and
+more recent activity than old. The same --seed gives the same data.
+
+Seeded users are named seed_<n> with password "password" and are the only rows
+--reset removes. Run db_setup.py first. The ingredient index, search vectors
+the like/comment counters and trending scores are filled in directly, and the stats views are
+refreshed at the end.
+
+    python benchmarks/seed_data.py --scale medium
+    python benchmarks/seed_data.py --users 50000 --recipes 1000000 --likes 5000000 --comments 2000000
+    python benchmarks/seed_data.py --reset
+"""
+import os
+import sys
+import time
+import argparse
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from dotenv import load_dotenv
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fulltext import search_vector_sql
+from ingredients import parse_ingredients, ingredient_terms
+import stats
+import trending
+
+load_dotenv()
+
+SEED_PASSWORD = 'password'
+SCALES = {
+    # users, recipes, likes, comments
+    'tiny': (200, 1000, 5000, 5000),
+    'small': (2000, 20000, 100000, 50000),
+    'medium': (20000, 200000, 1000000, 500000),
+    'large': (100000, 1000000, 5000000, 3000000),
+}
+
+# Higher exponents concentrate picks on the first (most popular) rows
+AUTHOR_SKEW = 3.0
+INGREDIENT_SKEW = 2.0
+LIKE_SKEW = 2.5
+COMMENT_SKEW = 3.0
+HISTORY_DAYS = 730
+
+CATEGORIES = ['Dinner', 'Lunch', 'Snacks', 'Breakfast', 'Healthy', 'Instant', 'Bakery', 'Special']
+ADJECTIVES = ['Spicy', 'Creamy', 'Quick', 'Classic', 'Crispy', 'Homestyle', 'Smoky', 'Tangy', 'Easy',
+              'Garlic', 'Lemon', 'Masala', 'Herbed', 'Cheesy', 'Sweet', 'Roasted', 'One-Pot', 'Healthy']
+MAINS = ['Chicken', 'Paneer', 'Mushroom', 'Chickpea', 'Egg', 'Potato', 'Spinach', 'Prawn', 'Lentil',
+         'Tofu', 'Mutton', 'Cauliflower', 'Fish', 'Rice', 'Noodle', 'Chocolate', 'Banana', 'Oats']
+DISHES = ['Curry', 'Biryani', 'Salad', 'Soup', 'Wrap', 'Stir Fry', 'Pasta', 'Tikka', 'Pulao',
+          'Sandwich', 'Cake', 'Pancakes', 'Bowl', 'Fry', 'Stew', 'Omelette', 'Smoothie', 'Kebab']
+# Ordered roughly by how often they turn up in recipes
+INGREDIENTS = [
+    '1 tsp salt', '2 tbsp oil', '1 large onion, chopped', '3 cloves garlic', '2 tomatoes',
+    '1 inch ginger', '1 tsp turmeric powder', '1 tsp red chilli powder', '2 green chillies',
+    '1 tsp cumin seeds', '2 tbsp butter', '1 tsp garam masala', 'fresh coriander leaves',
+    '1 cup rice', '2 eggs', '1 cup milk', '1 tbsp lemon juice', '1 tsp black pepper', '2 potatoes',
+    '200 g paneer', '500 g chicken', '1 cup yogurt', '1 cup flour', '2 tbsp sugar', '1 tsp mustard seeds',
+    'curry leaves', '1 cup cream', '1 tsp coriander powder', '1 capsicum', '1 carrot', '1 cup peas',
+    '2 cups spinach', '1 cup chickpeas', '1 cup lentils', '200 g mushrooms', '1 tsp baking powder',
+    '1 cup cheese', '1 tbsp soy sauce', '1 tbsp honey', '1 cup oats', '2 bananas', '100 g chocolate',
+    '1 tsp vanilla extract', '1 cup cashews', '250 g prawns', '500 g mutton', '1 cauliflower',
+    '200 g tofu', '1 cup noodles', '1 cup pasta', '1 cup coconut milk', '1 tsp fennel seeds',
+    '4 cardamom pods', '2 bay leaves', '1 cinnamon stick', '1 tsp ajwain', 'a pinch of asafoetida',
+    '1 tbsp ghee', '1 cucumber', '1 lettuce', '1 avocado', '1 tbsp olive oil', '1 tsp oregano',
+    '1 tsp basil', '1 cup breadcrumbs', '1 cup corn', '1 beetroot', '1 cup quinoa', '2 tbsp peanuts',
+    '1 tbsp sesame seeds', '1 tsp saffron', '1 cup broccoli', '1 zucchini', '1 eggplant',
+    '1 cup mint leaves', '1 tbsp tamarind', '1 tbsp jaggery', '1 cup semolina', '1 cup besan',
+]
+INSTRUCTIONS = ("Prep the ingredients.\nHeat the pan and cook the aromatics until fragrant.\n"
+                "Add the main ingredients and simmer until done.\nAdjust seasoning and serve hot.")
+COMMENTS = ['Made this tonight, loved it!', 'Too spicy for my kids but great otherwise.',
+            'Can I use ghee instead of oil?', 'Perfect for a weeknight.', 'Added extra garlic, so good.',
+            'How long does it keep in the fridge?', 'My family asks for this every week.',
+            'Came out a bit dry, will try less time.', 'Best version I have tried.', 'Thanks for sharing!']
+
+
+def connect():
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"), cursor_factory=RealDictCursor)
+    with conn.cursor() as cursor:
+        # Single-process plans keep random() deterministic after setseed()
+        cursor.execute("SET max_parallel_workers_per_gather = 0")
+    return conn
+
+
+def step(label, cursor, sql, params=None):
+    started = time.perf_counter()
+    cursor.execute(sql, params)
+    print(f"  {label:<34} {cursor.rowcount if cursor.rowcount >= 0 else '':>10}  {time.perf_counter() - started:7.1f}s")
+
+
+def load_vocabulary(cursor):
+    # Each ingredient line with its normalized phrase and index terms, so the
+    # inverted index can be filled with a join instead of per-recipe Python
+    cursor.execute("CREATE TEMP TABLE seed_vocab (idx INT PRIMARY KEY, line TEXT, phrase TEXT)")
+    cursor.execute("CREATE TEMP TABLE seed_vocab_terms (idx INT, term TEXT)")
+    vocab, terms, seen = [], [], set()
+    for line in INGREDIENTS:
+        phrases = parse_ingredients(line)
+        if len(phrases) != 1 or phrases[0] in seen:
+            continue
+        seen.add(phrases[0])
+        vocab.append((len(vocab) + 1, line, phrases[0]))
+        terms.extend((len(vocab), term) for term in ingredient_terms(phrases[0]))
+    execute_values(cursor, "INSERT INTO seed_vocab VALUES %s", vocab)
+    execute_values(cursor, "INSERT INTO seed_vocab_terms VALUES %s", terms)
+    return len(vocab)
+
+
+def seed(users, recipes, likes, comments, seed_value):
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT setseed(%s)", (seed_value,))
+            cursor.execute("SELECT COALESCE(MAX(substring(username from 6)::int), 0) AS n FROM users WHERE username ~ '^seed_[0-9]+$'")
+            offset = cursor.fetchone()['n']
+            vocab_size = load_vocabulary(cursor)
+            params = {
+                'users': users, 'recipes': recipes, 'likes': likes, 'comments': comments, 'offset': offset,
+                'password': generate_password_hash(SEED_PASSWORD), 'days': HISTORY_DAYS, 'vocab': vocab_size,
+                'categories': CATEGORIES, 'adjectives': ADJECTIVES, 'mains': MAINS, 'dishes': DISHES,
+                'comment_texts': COMMENTS, 'instructions': INSTRUCTIONS,
+                'author_skew': AUTHOR_SKEW, 'ingredient_skew': INGREDIENT_SKEW,
+                'like_skew': LIKE_SKEW, 'comment_skew': COMMENT_SKEW,
+            }
+            print(f"seeding {users:,} users, {recipes:,} recipes, {likes:,} likes, {comments:,} comments")
+
+            # Signups ramp up towards the present
+            step("users", cursor, """
+                INSERT INTO users (username, password, full_name, email, role, created_at)
+                SELECT 'seed_' || (%(offset)s + g), %(password)s, 'Seed User ' || (%(offset)s + g),
+                       'seed_' || (%(offset)s + g) || '@example.com', 'user',
+                       NOW() - (power(random(), 2) * %(days)s) * INTERVAL '1 day'
+                FROM generate_series(1, %(users)s) g
+            """, params)
+            cursor.execute("""
+                CREATE TEMP TABLE seed_users AS
+                SELECT id, created_at, row_number() OVER (ORDER BY id) AS rn FROM users
+                WHERE CASE WHEN username ~ '^seed_[0-9]+$' THEN substring(username from 6)::int END > %(offset)s
+            """, params)
+            cursor.execute("CREATE UNIQUE INDEX ON seed_users (rn)")
+
+            # A few authors write most recipes; views follow a heavy tail
+            step("recipes", cursor, """
+                INSERT INTO recipes (title, description, instructions, category, cooking_time, views,
+                                     video_filename, user_id, created_at)
+                SELECT r.title, 'A ' || lower(r.title) || ' worth making again.', %(instructions)s,
+                       r.category, r.cooking_time, r.views, 'seed.mp4', u.id,
+                       u.created_at + random() * (NOW() - u.created_at)
+                FROM (
+                    SELECT g,
+                           (%(adjectives)s::text[])[1 + floor(random() * cardinality(%(adjectives)s::text[]))::int] || ' ' ||
+                           (%(mains)s::text[])[1 + floor(random() * cardinality(%(mains)s::text[]))::int] || ' ' ||
+                           (%(dishes)s::text[])[1 + floor(random() * cardinality(%(dishes)s::text[]))::int] AS title,
+                           (%(categories)s::text[])[1 + floor(power(random(), 1.5) * cardinality(%(categories)s::text[]))::int] AS category,
+                           greatest(5, round(exp(2.3 + random() * 2.2)))::int AS cooking_time,
+                           floor(exp(power(random(), 2) * 11))::int AS views,
+                           1 + floor(power(random(), %(author_skew)s) * %(users)s)::int AS author
+                    FROM generate_series(1, %(recipes)s) g
+                ) r
+                JOIN seed_users u ON u.rn = r.author
+            """, params)
+            cursor.execute("""
+                CREATE TEMP TABLE seed_recipes AS
+                SELECT r.id, r.created_at, row_number() OVER (ORDER BY r.views DESC, r.id) AS rn
+                FROM recipes r JOIN seed_users u ON u.id = r.user_id
+            """)
+            cursor.execute("CREATE UNIQUE INDEX ON seed_recipes (rn)")
+
+            # 4-12 distinct ingredient lines per recipe, common ones picked far more often
+            step("recipe ingredient picks", cursor, """
+                CREATE TEMP TABLE seed_picks AS
+                SELECT DISTINCT r.id AS recipe_id, 1 + floor(power(random(), %(ingredient_skew)s) * %(vocab)s)::int AS idx
+                FROM seed_recipes r, LATERAL generate_series(1, 4 + (r.id %% 9)) k
+            """, params)
+            step("recipe ingredients", cursor, """
+                UPDATE recipes SET ingredients = p.text, ingredient_count = p.n
+                FROM (SELECT s.recipe_id, string_agg(v.line, E'\\n' ORDER BY s.idx) AS text, COUNT(*) AS n
+                      FROM seed_picks s JOIN seed_vocab v ON v.idx = s.idx GROUP BY s.recipe_id) p
+                WHERE recipes.id = p.recipe_id
+            """)
+            # Same postings index_recipe_ingredients would write: position is the
+            # phrase's place in the recipe's sorted phrase list
+            step("ingredient index", cursor, """
+                INSERT INTO recipe_ingredients (term, recipe_id, position, ingredient_count)
+                SELECT t.term, p.recipe_id, p.position, p.n
+                FROM (SELECT s.recipe_id, s.idx,
+                             (row_number() OVER (PARTITION BY s.recipe_id ORDER BY v.phrase) - 1)::int AS position,
+                             COUNT(*) OVER (PARTITION BY s.recipe_id)::int AS n
+                      FROM seed_picks s JOIN seed_vocab v ON v.idx = s.idx) p
+                JOIN seed_vocab_terms t ON t.idx = p.idx
+                ON CONFLICT DO NOTHING
+            """)
+            step("search vectors", cursor,
+                 "UPDATE recipes SET search_vector = "
+                 + search_vector_sql('title', 'description', 'ingredients', 'category')
+                 + " WHERE id IN (SELECT id FROM seed_recipes)")
+
+            # Likes and comments land mostly on the most viewed recipes, after they were posted
+            step("likes", cursor, """
+                INSERT INTO recipe_likes (recipe_id, user_id, created_at)
+                SELECT r.id, u.id, r.created_at + random() * (NOW() - r.created_at)
+                FROM (SELECT 1 + floor(power(random(), %(like_skew)s) * (SELECT COUNT(*) FROM seed_recipes))::int AS rrn,
+                             1 + floor(random() * %(users)s)::int AS urn
+                      FROM generate_series(1, %(likes)s)) pick
+                JOIN seed_recipes r ON r.rn = pick.rrn
+                JOIN seed_users u ON u.rn = pick.urn
+                ON CONFLICT (recipe_id, user_id) DO NOTHING
+            """, params)
+            step("comments", cursor, """
+                INSERT INTO comments (recipe_id, user_id, comment, created_at)
+                SELECT r.id, u.id, pick.text, r.created_at + random() * (NOW() - r.created_at)
+                FROM (SELECT 1 + floor(power(random(), %(comment_skew)s) * (SELECT COUNT(*) FROM seed_recipes))::int AS rrn,
+                             1 + floor(power(random(), 1.5) * %(users)s)::int AS urn,
+                             (%(comment_texts)s::text[])[1 + floor(random() * cardinality(%(comment_texts)s::text[]))::int] AS text
+                      FROM generate_series(1, %(comments)s)) pick
+                JOIN seed_recipes r ON r.rn = pick.rrn
+                JOIN seed_users u ON u.rn = pick.urn
+            """, params)
+
+            step("like counts", cursor, """
+                UPDATE recipes SET like_count = c.n
+                FROM (SELECT recipe_id, COUNT(*) AS n FROM recipe_likes
+                      WHERE recipe_id IN (SELECT id FROM seed_recipes) GROUP BY recipe_id) c
+                WHERE recipes.id = c.recipe_id
+            """)
+            step("comment counts", cursor, """
+                UPDATE recipes SET comment_count = c.n
+                FROM (SELECT recipe_id, COUNT(*) AS n FROM comments
+                      WHERE recipe_id IN (SELECT id FROM seed_recipes) GROUP BY recipe_id) c
+                WHERE recipes.id = c.recipe_id
+            """)
+            started = time.perf_counter()
+            updated = trending.recompute(cursor)
+            print(f"  {'trending scores':<34} {updated:>10}  {time.perf_counter() - started:7.1f}s")
+            conn.commit()
+
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for table in ('users', 'recipes', 'recipe_likes', 'comments', 'recipe_ingredients'):
+                step(f"analyze {table}", cursor, f"ANALYZE {table}")
+        conn.autocommit = False
+        stats.refresh_stats(conn)
+        print("stats views refreshed")
+    finally:
+        conn.close()
+
+
+def reset():
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            step("seeded users (cascades)", cursor, "DELETE FROM users WHERE username ~ '^seed_[0-9]+$'")
+            conn.commit()
+        stats.refresh_stats(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--recipes', type=int)
+    parser.add_argument('--likes', type=int)
+    parser.add_argument('--comments', type=int)
+    parser.add_argument('--seed', type=float, default=0.42, help='setseed() value in [-1, 1]')
+    parser.add_argument('--reset', action='store_true', help='remove all seeded rows and exit')
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        sys.exit("Error: DATABASE_URL not found in .env")
+    if args.reset:
+        reset()
+    else:
+        defaults = SCALES[args.scale]
+        counts = [given if given is not None else default
+                  for given, default in zip((args.users, args.recipes, args.likes, args.comments), defaults)]
+        started = time.perf_counter()
+        seed(*counts, args.seed)
+        print(f"done in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,170 @@
+"""Build time and memory of the similar recipes index at 100k and 1M recipes.
+
+Generates synthetic recipes in memory (titles and ingredient lists drawn from a
+skewed vocabulary of a few thousand ingredients), then times similar.py's batch
+build: vectorizing, the blocked neighbour search and the total. Each scale runs
+in its own process, so the peak RSS reported is that build's alone. The
+candidate search is approximate (SIMILAR_MAX_POSTINGS, SIMILAR_QUERY_TERMS), so
+a sample of rows is checked against exact brute-force neighbours: recall@k, and
+the summed similarity of the neighbours found over the best possible, which is
+the fairer number when many recipes tie. Also times an incremental rescore of
+one recipe against CANDIDATE_LIMIT candidates. Needs numpy and scipy, but no
+database.
+
+    python benchmarks/similar_benchmark.py --sizes 100000,1000000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ['Dinner', 'Lunch', 'Snacks', 'Breakfast', 'Healthy', 'Instant', 'Bakery', 'Special']
+BASES = ['onion', 'garlic', 'tomato', 'ginger', 'chicken', 'paneer', 'rice', 'potato', 'spinach', 'egg',
+         'lentil', 'chickpea', 'mushroom', 'prawn', 'mutton', 'tofu', 'cauliflower', 'carrot', 'pea', 'corn',
+         'cabbage', 'beetroot', 'pumpkin', 'okra', 'eggplant', 'zucchini', 'broccoli', 'noodle', 'pasta', 'oat',
+         'flour', 'semolina', 'yogurt', 'milk', 'cream', 'cheese', 'butter', 'ghee', 'coconut', 'cashew',
+         'almond', 'peanut', 'sesame', 'chocolate', 'banana', 'apple', 'mango', 'lemon', 'orange', 'honey']
+MODIFIERS = ['', '', '', 'red', 'green', 'black', 'white', 'baby', 'sweet', 'smoked', 'dried', 'roasted',
+             'toasted', 'spring', 'wild', 'brown', 'yellow', 'purple', 'cherry', 'king', 'sun dried', 'pickled',
+             'frozen', 'tinned', 'organic', 'desi', 'basmati', 'jasmine', 'arborio', 'kashmiri', 'country',
+             'heirloom', 'garden', 'split', 'whole wheat', 'low fat', 'unsalted', 'salted', 'plain', 'greek',
+             'button', 'shiitake', 'oyster', 'tiger', 'free range', 'atlantic', 'bird eye', 'thai', 'italian', 'mexican']
+SPICES = ['salt', 'oil', 'turmeric', 'cumin', 'coriander', 'garam masala', 'chilli powder', 'black pepper',
+          'mustard seed', 'curry leaf', 'bay leaf', 'cardamom', 'cinnamon', 'clove', 'fennel', 'saffron',
+          'asafoetida', 'fenugreek', 'nutmeg', 'paprika', 'oregano', 'basil', 'thyme', 'rosemary', 'mint']
+ADJECTIVES = ['Spicy', 'Creamy', 'Classic', 'Crispy', 'Homestyle', 'Smoky', 'Tangy', 'Garlic', 'Lemon',
+              'Masala', 'Herbed', 'Cheesy', 'Sweet', 'Roasted', 'One-Pot', 'Healthy', 'Grandma', 'Street']
+DISHES = ['Curry', 'Biryani', 'Salad', 'Soup', 'Wrap', 'Stir Fry', 'Pasta', 'Tikka', 'Pulao', 'Sandwich',
+          'Cake', 'Pancakes', 'Bowl', 'Fry', 'Stew', 'Omelette', 'Smoothie', 'Kebab', 'Dal', 'Paratha',
+          'Dosa', 'Idli', 'Korma', 'Vindaloo', 'Halwa', 'Kheer', 'Pakora', 'Samosa', 'Chaat', 'Risotto']
+
+
+def zipf_pick(items, skew):
+    return items[int(random.random() ** skew * len(items))]
+
+
+def synthetic_rows(count, seed=7):
+    random.seed(seed)
+    ingredients = [f"{m} {b}".strip() for b in BASES for m in MODIFIERS]
+    random.shuffle(ingredients)
+    for i in range(count):
+        main = zipf_pick(BASES, 1.5)
+        title = f"{random.choice(ADJECTIVES)} {main.title()} {zipf_pick(DISHES, 1.5)}"
+        lines = [f"1 cup {zipf_pick(ingredients, 3.0)}" for _ in range(random.randint(3, 8))]
+        lines += [f"1 tsp {zipf_pick(SPICES, 2.0)}" for _ in range(random.randint(2, 6))]
+        lines.append(f"200 g {main}")
+        yield (i + 1, title, '\n'.join(lines), zipf_pick(CATEGORIES, 1.5), random.randint(5, 150))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_size(size, args):
+    import numpy as np
+    import similar
+
+    result = {'recipes': size}
+    started = time.perf_counter()
+    rows = list(synthetic_rows(size))
+    result['generate_s'] = round(time.perf_counter() - started, 1)
+    baseline_rss = peak_rss_mb()
+
+    started = time.perf_counter()
+    ids, X, vocabulary, df = similar.vectorize(rows)
+    result['vectorize_s'] = round(time.perf_counter() - started, 1)
+    result['terms'] = len(vocabulary)
+    result['nonzeros'] = int(X.nnz)
+    result['pruned_terms'] = int((df > args.max_postings).sum())
+
+    random.seed(11)
+    sample = sorted(random.sample(range(size), min(args.recall_sample, size)))
+    wanted = set(sample)
+    found = {}
+    started = time.perf_counter()
+    for start, neighbour_rows, scores in similar.neighbours(X, args.top_k, args.max_postings, args.query_terms):
+        for i in range(len(neighbour_rows)):
+            if start + i in wanted:
+                keep = neighbour_rows[i] >= 0
+                found[start + i] = (set(neighbour_rows[i][keep].tolist()), float(scores[i][keep].sum()))
+    result['neighbours_s'] = round(time.perf_counter() - started, 1)
+    result['build_s'] = round(result['vectorize_s'] + result['neighbours_s'], 1)
+    result['peak_rss_mb'] = round(peak_rss_mb(), 0)
+    result['build_rss_mb'] = round(peak_rss_mb() - baseline_rss, 0)
+
+    # Exact neighbours of the sampled rows by brute force
+    exact = (X[sample] @ X.T).toarray()
+    exact[np.arange(len(sample)), sample] = -1
+    hits, found_total, exact_total = 0, 0.0, 0.0
+    for row, scores in zip(sample, exact):
+        best = np.argsort(-scores)[:args.top_k]
+        neighbours, total = found.get(row, (set(), 0.0))
+        hits += len(set(best.tolist()) & neighbours)
+        found_total += total
+        exact_total += float(scores[best].sum())
+    result['recall_at_k'] = round(hits / (len(sample) * args.top_k), 3)
+    # Recipes often tie (same title words and ingredients), so also compare how
+    # similar the neighbours found are with the best possible
+    result['score_ratio'] = round(found_total / exact_total, 3) if exact_total else 1.0
+
+    # One incremental rescore: a recipe against CANDIDATE_LIMIT candidates, in plain Python
+    dfs = {term: int(df[col]) for term, col in vocabulary.items()}
+    target = similar.features(*rows[0][1:])
+    candidates = rows[1:similar.CANDIDATE_LIMIT + 1]
+    started = time.perf_counter()
+    vector = similar.weigh(target, dfs, size)
+    for row in candidates:
+        similar.cosine(vector, similar.weigh(similar.features(*row[1:]), dfs, size))
+    result['incremental_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--max-postings', type=int, default=int(os.getenv("SIMILAR_MAX_POSTINGS", 2000)))
+    parser.add_argument('--query-terms', type=int, default=int(os.getenv("SIMILAR_QUERY_TERMS", 6)))
+    parser.add_argument('--recall-sample', type=int, default=200)
+    parser.add_argument('--json', help='write the results here')
+    parser.add_argument('--one', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        print(json.dumps(run_size(args.one, args)))
+        return
+
+    print(f"top {args.top_k}, SIMILAR_MAX_POSTINGS {args.max_postings}, SIMILAR_QUERY_TERMS {args.query_terms}")
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        # A fresh process per size, so peak memory is this build's own
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--one', str(size), '--top-k', str(args.top_k),
+             '--max-postings', str(args.max_postings), '--query-terms', str(args.query_terms), '--recall-sample', str(args.recall_sample)],
+            capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            print(f"  {size:>9,}: failed\n{out.stderr}")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"  {size:>9,} recipes  build {result['build_s']:>7.1f}s (vectorize {result['vectorize_s']}s, "
+              f"neighbours {result['neighbours_s']}s)  peak RSS {result['peak_rss_mb']:,.0f} MB "
+              f"(+{result['build_rss_mb']:,.0f} MB)  recall@{args.top_k} {result['recall_at_k']}  "
+              f"score ratio {result['score_ratio']}  incremental {result['incremental_ms']}ms  terms {result['terms']:,}  pruned {result['pruned_terms']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
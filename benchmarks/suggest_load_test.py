@@ -0,0 +1,106 @@
+"""Load test /suggestions against a local stub of the Google suggest endpoint.
+
+Starts a stub suggest server with configurable latency, points the app's
+remote suggestion source at it, and hammers /suggestions from many threads
+with random prefixes. Needs no database: the title index is filled in memory.
+
+    python benchmarks/suggest_load_test.py --latency 0.4 --threads 32 --requests 2000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ['chicken', 'paneer', 'chocolate', 'cake', 'biryani', 'pasta', 'noodles', 'soup',
+         'salad', 'curry', 'dal', 'masala', 'pancake', 'omelette', 'smoothie', 'brownie']
+
+
+class StubSuggestHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        q = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        body = json.dumps([q, [f"{q} recipe", f"{q} easy", f"{q} at home", f"{q} quick"]]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(latency, threads, total, prefixes):
+    StubSuggestHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubSuggestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['SUGGEST_URL'] = f"http://127.0.0.1:{server.server_address[1]}/complete/search"
+    os.environ.setdefault('DATABASE_URL', 'postgresql://unused')
+
+    import app
+    import external
+    external.suggest.provider = external.GoogleSuggestProvider(url=os.environ['SUGGEST_URL'])
+    app.title_index._pid = os.getpid()  # keep the resync thread off; load synthetic titles instead
+    app.title_index.load([
+        (i, f"{random.choice(WORDS)} {random.choice(WORDS)} {i}", random.randint(0, 5000), random.randint(0, 200))
+        for i in range(20000)
+    ])
+
+    queries = [random.choice(WORDS)[:random.randint(2, 6)] + str(random.randint(0, prefixes)) for _ in range(total)]
+    latencies, complete = [], []
+    lock = threading.Lock()
+
+    def worker(chunk):
+        client = app.app.test_client()
+        for q in chunk:
+            start = time.perf_counter()
+            data = client.get('/suggestions', query_string={'q': q}).get_json()
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                complete.append(any(s.endswith(' recipe') for s in data['suggestions']))
+
+    chunks = [queries[i::threads] for i in range(threads)]
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"stub latency ~{latency * 1000:.0f}ms, deadline {app.SUGGEST_DEADLINE * 1000:.0f}ms, "
+          f"{threads} threads, {total} requests over {prefixes + 1} prefix variants")
+    print(f"  throughput : {total / wall:,.0f} req/s")
+    print(f"  latency    : p50 {statistics.median(latencies):.1f}ms  p95 {percentile(latencies, 95):.1f}ms  "
+          f"p99 {percentile(latencies, 99):.1f}ms  max {max(latencies):.1f}ms")
+    print(f"  with remote suggestions: {sum(complete) / len(complete):.0%}")
+    print(f"  suggest stats: {external.suggest.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.4, help='mean stub latency in seconds')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--prefixes', type=int, default=20, help='numeric suffix range, controls cache reuse')
+    args = parser.parse_args()
+    run(args.latency, args.threads, args.requests, args.prefixes)
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Pluggable caches: a size-bounded LRU/TTL tier in every worker process, optionally
+# backed by a shared tier (any Redis-compatible client) so workers see each other's
+# entries. get_or_compute() coalesces concurrent misses on the same key.
+# Generations invalidate whole caches at once. They cross workers even without the
+# shared tier, but only on one host: several hosts need CACHE_URL, or they serve
+# stale entries from their local tier until the TTL runs out.
+
+CACHE_URL = os.getenv("CACHE_URL")  # e.g. redis://localhost:6379/0, unset = per-process only
+# Without CACHE_URL, invalidation generations are shared by the workers of one host
+# through small files here; set it to '' to keep them per process
+GENERATION_DIR = os.getenv("CACHE_GENERATION_DIR", tempfile.gettempdir())
+
+_MISSING = object()
+
+
+class LocalCache:
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.stats['misses'] += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache:
+    """Shared tier over a Redis-compatible client (get/set with ex=/delete)."""
+
+    def __init__(self, client, namespace, ttl=300):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Shared cache error: {e}")
+            return default
+        if raw is None:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set(self._key(key), json.dumps(value, default=str), ex=int(self.ttl if ttl is None else ttl))
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Shared cache error: {e}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Shared cache error: {e}")
+
+
+class Cache:
+    def __init__(self, name, max_entries=1024, ttl=300, shared=None):
+        self.name = name
+        self.local = LocalCache(max_entries, ttl)
+        self.shared = shared
+        self.ttl = ttl
+        self._inflight = {}   # key -> {'done': Event, 'value': result} for the request doing the lookup
+        self._inflight_lock = threading.Lock()
+        self.coalesced = 0
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key, _MISSING)
+            if value is not _MISSING:
+                self.local.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        # Only the local tier; shared entries expire on their own
+        self.local.clear()
+
+    def get_or_compute(self, key, compute, ttl=None, wait=5.0, should_cache=None):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = {'done': threading.Event(), 'value': _MISSING}
+
+        if not leader:
+            # Someone else is already computing this key; share their answer
+            self.coalesced += 1
+            call['done'].wait(wait)
+            if call['value'] is not _MISSING:
+                return call['value']
+            return compute()
+
+        try:
+            value = call['value'] = compute()
+            if should_cache is None or should_cache(value):
+                self.set(key, value, ttl)
+            return value
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            call['done'].set()
+
+    def snapshot(self):
+        data = dict(self.local.stats)
+        data['size'] = len(self.local)
+        data['max_entries'] = self.local.max_entries
+        data['coalesced'] = self.coalesced
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else None
+        if self.shared is not None:
+            data.update({f"shared_{k}": v for k, v in self.shared.stats.items()})
+        return data
+
+
+class Generation:
+    """A token folded into cache keys; bumping it invalidates every entry built
+    under the old value. Shared across hosts through the shared client when one is
+    configured, otherwise across the workers of this host through a file."""
+
+    def __init__(self, name, client=None, directory=GENERATION_DIR):
+        self.name = name
+        self.client = client
+        self.local = 0
+        self.path = os.path.join(directory, f"recipe-cache-{name}.generation") if directory else None
+
+    def current(self):
+        if self.client is not None:
+            try:
+                return int(self.client.get(f"generation:{self.name}") or 0)
+            except Exception as e:
+                print(f"Shared cache error: {e}")
+        elif self.path:
+            try:
+                with open(self.path) as f:
+                    return f.read()
+            except FileNotFoundError:
+                return ''
+            except OSError as e:
+                print(f"Cache generation error: {e}")
+        return self.local
+
+    def bump(self):
+        self.local += 1
+        if self.client is not None:
+            try:
+                self.client.incr(f"generation:{self.name}")
+            except Exception as e:
+                print(f"Shared cache error: {e}")
+        elif self.path:
+            # A fresh token renamed into place: other workers read either the old
+            # token or the new one, never a partial write
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}"
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(f"{os.getpid()}-{time.time_ns()}-{self.local}")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"Cache generation error: {e}")
+
+
+_shared_client = None
+_registry = {}
+
+
+def shared_client():
+    """Client for CACHE_URL, or None when no shared tier is configured."""
+    global _shared_client
+    if _shared_client is None and CACHE_URL:
+        try:
+            import redis
+        except ImportError:
+            print("CACHE_URL is set but the redis package is not installed; using per-process caches only")
+            return None
+        _shared_client = redis.Redis.from_url(CACHE_URL)
+    return _shared_client
+
+
+def make_cache(name, max_entries=1024, ttl=300, shared=True, client=None):
+    client = client if client is not None else (shared_client() if shared else None)
+    tier = SharedCache(client, name, ttl) if client is not None else None
+    _registry[name] = Cache(name, max_entries, ttl, tier)
+    return _registry[name]
+
+
+def cache_stats():
+    return {name: c.snapshot() for name, c in _registry.items()}
+
+
+def make_generation(name):
+    return Generation(name, shared_client())
@@ -0,0 +1,212 @@
+import os
+import time
+import threading
+import trending
+
+# Write-behind view counter. Views are summed in memory per worker and written in
+# one batched UPDATE every few seconds, so a popular recipe costs one row update
+# per flush instead of one per play. At most VIEW_FLUSH_INTERVAL seconds (or
+# VIEW_FLUSH_MAX pending views) can be lost if a worker dies without a clean exit.
+#
+# Comment posts are group-committed instead: nothing is lost, because each post
+# waits until the batch holding it is committed, but posts arriving within
+# COMMENT_BATCH_WINDOW of each other share one INSERT and one commit.
+
+VIEW_COUNT_MODE = os.getenv("VIEW_COUNT_MODE", "batched")  # 'batched' or 'exact'
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", 5))
+VIEW_FLUSH_MAX = int(os.getenv("VIEW_FLUSH_MAX", 1000))
+COMMENT_BATCH_WINDOW = float(os.getenv("COMMENT_BATCH_WINDOW", 0.005))  # seconds a batch stays open
+COMMENT_BATCH_MAX = int(os.getenv("COMMENT_BATCH_MAX", 100))
+COMMENT_BATCH_TIMEOUT = 30  # seconds a post waits for its batch before giving up
+
+
+class ViewCounter:
+    def __init__(self, get_connection, interval=VIEW_FLUSH_INTERVAL, max_pending=VIEW_FLUSH_MAX):
+        self.get_connection = get_connection
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self.stats = {'recorded': 0, 'flushes': 0, 'rows_written': 0, 'errors': 0}
+
+    def _ensure_flusher(self):
+        # One flusher thread per worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending, self._pending_total = {}, 0
+                threading.Thread(target=self._run, name='view-flusher', daemon=True).start()
+
+    def record(self, recipe_id, count=1):
+        self._ensure_flusher()
+        with self._lock:
+            self._pending[recipe_id] = self._pending.get(recipe_id, 0) + count
+            self._pending_total += count
+            self.stats['recorded'] += count
+            full = self._pending_total >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending, self._pending_total = self._pending, {}, 0
+        if not batch:
+            return 0
+
+        from psycopg2.extras import execute_values
+        # Sorted ids keep lock order consistent across workers flushing at once
+        rows = sorted(batch.items())
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    "UPDATE recipes SET views = recipes.views + v.n, trending = "
+                    + trending.add_sql(trending.points_sql('view', count='v.n'), 'recipes.trending')
+                    + " FROM (VALUES %s) AS v(id, n) WHERE recipes.id = v.id",
+                    rows
+                )
+                conn.commit()
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(rows)
+            return len(rows)
+        except Exception as e:
+            # Put the views back so the next flush retries them
+            self.stats['errors'] += 1
+            print(f"View flush error: {e}")
+            with self._lock:
+                for recipe_id, n in batch.items():
+                    self._pending[recipe_id] = self._pending.get(recipe_id, 0) + n
+                    self._pending_total += n
+            return 0
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def shutdown(self):
+        # Only the process that owns the buffer writes it out
+        if self._pid == os.getpid():
+            self.flush()
+
+
+class CommentBatcher:
+    """Group commit for comment posts. `sql` inserts a VALUES list of
+    (recipe_id, user_id, comment) rows and returns the stored comments with
+    those three columns, which is how each row finds the post it belongs to.
+    `on_write` is called after each batch that stored comments, before its posts
+    are answered, including posts whose caller gave up waiting."""
+
+    def __init__(self, get_connection, sql, window=COMMENT_BATCH_WINDOW, max_batch=COMMENT_BATCH_MAX, on_write=None):
+        self.get_connection = get_connection
+        self.sql = sql
+        self.on_write = on_write
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = []
+        self._cond = threading.Condition()
+        self._pid = None
+        self.stats = {'posts': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0, 'fallbacks': 0}
+
+    def _ensure_writer(self):
+        # One writer thread per worker process
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = []
+                threading.Thread(target=self._run, name='comment-writer', daemon=True).start()
+
+    def post(self, recipe_id, user_id, comment):
+        """Store one comment; returns its row, or None when the recipe does not exist.
+        Raises TimeoutError when the batch is still unwritten after
+        COMMENT_BATCH_TIMEOUT seconds; the comment stays queued and is stored later."""
+        self._ensure_writer()
+        entry = {'row': (recipe_id, user_id, comment), 'done': threading.Event(), 'result': None, 'error': None}
+        with self._cond:
+            self._queue.append(entry)
+            self._cond.notify()
+        if not entry['done'].wait(COMMENT_BATCH_TIMEOUT):
+            raise TimeoutError("Comment was not written in time")
+        if entry['error'] is not None:
+            raise entry['error']
+        return entry['result']
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                # Hold the batch open briefly so concurrent posts can join it
+                deadline = time.time() + self.window
+                while len(self._queue) < self.max_batch and time.time() < deadline:
+                    self._cond.wait(deadline - time.time())
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            self._write(batch)
+
+    def _insert(self, entries):
+        from psycopg2.extras import execute_values
+
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                rows = execute_values(cursor, self.sql, [entry['row'] for entry in entries],
+                                      template="(%s::int, %s::int, %s::text)", page_size=len(entries), fetch=True)
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def _write(self, batch):
+        try:
+            rows = self._insert(batch)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Comment batch error: {e}")
+            if len(batch) == 1:
+                batch[0]['error'] = e
+                batch[0]['done'].set()
+                return
+            # One bad row (say, a user deleted mid-batch) fails the whole statement;
+            # write the posts one by one so only that post fails
+            self.stats['fallbacks'] += 1
+            for entry in batch:
+                self._write([entry])
+            return
+
+        # Identical posts in one batch are interchangeable, so any matching row will do
+        waiting = {}
+        for entry in batch:
+            waiting.setdefault(entry['row'], []).append(entry)
+        for row in rows:
+            entries = waiting.get((row['recipe_id'], row['user_id'], row['comment']))
+            if entries:
+                entries.pop(0)['result'] = row
+        if rows and self.on_write is not None:
+            try:
+                self.on_write()
+            except Exception as e:
+                print(f"Comment batch callback error: {e}")
+        for entry in batch:
+            entry['done'].set()
+        self.stats['posts'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
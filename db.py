@@ -0,0 +1,244 @@
+import os
+import time
+import threading
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+# Per-process PostgreSQL connection pool.
+# Connections are opened lazily, so nothing is created in the gunicorn master and
+# every forked worker builds its own pool on first use.
+
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", 10))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))            # seconds to wait for a free connection
+POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", 30))  # ping connections idle longer than this
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 1800))  # recycle connections older than this
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Thin proxy around a psycopg2 connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self._returned:
+            self._returned = True
+            self._pool.putconn(self._raw)
+
+    @property
+    def returned(self):
+        return self._returned
+
+
+class ConnectionPool:
+    def __init__(self, dsn, maxconn=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 healthcheck_after=POOL_HEALTHCHECK_AFTER, max_lifetime=POOL_MAX_LIFETIME):
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._idle = []        # list of (conn, created_at, last_used)
+        self._born = {}        # id(conn) -> created_at, for checked out connections
+        self._size = 0
+
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'healthchecks': 0,
+        }
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+
+    def _discard(self, conn):
+        self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _needs_ping(self, last_used):
+        return time.time() - last_used > self.healthcheck_after
+
+    def _is_healthy(self, conn, created_at, last_used):
+        # Runs outside the lock: the ping is a network round trip
+        if conn.closed:
+            return False
+        if self.max_lifetime and time.time() - created_at > self.max_lifetime:
+            return False
+        if self._needs_ping(last_used):
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _release_slot(self, conn=None):
+        # Give back a slot reserved by getconn, closing its connection outside the lock
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._size -= 1
+            if conn is not None:
+                self.stats['discarded'] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        # Only bookkeeping happens under the lock. A checkout either takes an idle
+        # connection or reserves a slot, then pings or connects with the lock
+        # released, so other threads are never stuck behind a handshake.
+        deadline = None
+        waited_since = None
+        while True:
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        if self._needs_ping(last_used):
+                            self.stats['healthchecks'] += 1
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn = None
+                        break
+
+                    # Pool exhausted, wait for a connection to come back
+                    now = time.time()
+                    if waited_since is None:
+                        waited_since = now
+                        deadline = now + self.timeout
+                        self.stats['waits'] += 1
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        self.stats['wait_time'] += now - waited_since
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    self._cond.wait(remaining)
+
+            fresh = conn is None
+            if not fresh and not self._is_healthy(conn, created_at, last_used):
+                self._release_slot(conn)
+                continue
+            if fresh:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                created_at = time.time()
+
+            with self._cond:
+                if fresh:
+                    self.stats['created'] += 1
+                if waited_since is not None:
+                    self.stats['wait_time'] += time.time() - waited_since
+                self.stats['checkouts'] += 1
+                self._born[id(conn)] = created_at
+            return PooledConnection(self, conn)
+
+    def putconn(self, conn):
+        # Leave no transaction open on a connection that goes back to the pool
+        healthy = not conn.closed
+        if healthy:
+            try:
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+            except Exception:
+                healthy = False
+
+        with self._cond:
+            created_at = self._born.pop(id(conn), time.time())
+            if healthy and os.getpid() == self.pid:
+                self._idle.append((conn, created_at, time.time()))
+            else:
+                self._size -= 1
+                if os.getpid() == self.pid:
+                    self._discard(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+
+    def snapshot(self):
+        with self._cond:
+            data = dict(self.stats)
+            data.update({
+                'pid': self.pid,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.maxconn,
+                'avg_wait_ms': round(self.stats['wait_time'] / self.stats['waits'] * 1000, 2) if self.stats['waits'] else 0.0,
+            })
+        return data
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Connections inherited from a parent process. We keep references so they are never
+# finalized (and terminated) from the child, which would break the parent's sessions.
+_inherited = []
+
+
+def get_pool():
+    global _pool
+    pid = os.getpid()
+    if _pool is None or _pool.pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool.pid != pid:
+                if _pool is not None:
+                    _inherited.append(_pool)
+                _pool = ConnectionPool(os.getenv("DATABASE_URL"))
+    return _pool
+
+
+def _reset_after_fork():
+    global _pool, _pool_lock
+    if _pool is not None:
+        _inherited.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def pool_stats():
+    return get_pool().snapshot()
+
+
+def init_app(app):
+    """Return any connection a request forgot to close when its app context ends."""
+
+    @app.teardown_appcontext
+    def _return_connections(exc):
+        from flask import g
+        for conn in g.pop('_db_connections', []):
+            conn.close()
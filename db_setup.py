@@ -2,6 +2,9 @@ import psycopg2
 import os
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash
+from fulltext import search_vector_sql
+from ingredients import index_recipe_ingredients
+import trending
 
 load_dotenv()
 
@@ -41,10 +44,10 @@ def setup_database():
             video_filename VARCHAR(255),
             thumbnail VARCHAR(255),
             category VARCHAR(50),
-            cooking_time INT DEFAULT 0,
+            cooking_time INT NOT NULL DEFAULT 0,
             views INT DEFAULT 0,
             user_id INT REFERENCES users(id) ON DELETE CASCADE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
         )
         """)
         print("Recipes table checked/created.")
@@ -68,6 +71,74 @@ def setup_database():
         """)
         print("Recipe likes table checked/created.")
 
+        # Media upload state; 'processing' until the background uploads land (see media.py)
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS media_status VARCHAR(20) NOT NULL DEFAULT 'ready'")
+        # Set when the thumbnail is a poster frame taken from the video, so a new video replaces it
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS thumbnail_auto BOOLEAN NOT NULL DEFAULT FALSE")
+        print("Media status columns ensured.")
+
+        # Denormalized like counter kept in step by toggle_like (migration + backfill)
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS like_count INT NOT NULL DEFAULT 0")
+        cursor.execute("""
+        UPDATE recipes SET like_count = COALESCE(counts.count, 0)
+        FROM recipes r
+        LEFT JOIN (SELECT recipe_id, COUNT(*) AS count FROM recipe_likes GROUP BY recipe_id) counts
+            ON counts.recipe_id = r.id
+        WHERE recipes.id = r.id AND recipes.like_count <> COALESCE(counts.count, 0)
+        """)
+        print("Like counts backfilled.")
+
+        # Keyset pagination compares (sort column, id) rows, which skips NULLs, so
+        # every sort column must be NOT NULL. A missing date sorts as the oldest.
+        cursor.execute("UPDATE recipes SET cooking_time = 0 WHERE cooking_time IS NULL")
+        cursor.execute("ALTER TABLE recipes ALTER COLUMN cooking_time SET NOT NULL")
+        cursor.execute("UPDATE recipes SET created_at = 'epoch' WHERE created_at IS NULL")
+        cursor.execute("ALTER TABLE recipes ALTER COLUMN created_at SET NOT NULL")
+
+        # Keyset pagination indexes: one (sort column, id) pair per feed sort mode,
+        # with and without the category filter
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_created_id ON recipes (created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_cooking_id ON recipes (cooking_time, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_category_created_id ON recipes (category, created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_category_cooking_id ON recipes (category, cooking_time, id)")
+        print("Feed pagination indexes ensured.")
+
+        # Full-text search vector over title, description, ingredients and category
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        cursor.execute(
+            "UPDATE recipes SET search_vector = "
+            + search_vector_sql('title', 'description', 'ingredients', 'category')
+            + " WHERE search_vector IS NULL"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_search ON recipes USING GIN (search_vector)")
+        print("Search vectors backfilled and indexed.")
+
+        # Inverted ingredient index: normalized term -> recipe postings. The ingredient
+        # count rides along in the index so pantry matching never touches recipes.
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS ingredient_count INT")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            term VARCHAR(100) NOT NULL,
+            recipe_id INT REFERENCES recipes(id) ON DELETE CASCADE,
+            position INT NOT NULL,
+            ingredient_count INT NOT NULL,
+            PRIMARY KEY (term, recipe_id, position) INCLUDE (ingredient_count)
+        )
+        """)
+        # Pantry search walks each term smallest recipes first, then scores the
+        # candidates index-only by recipe (see ingredients.pantry_matches_sql)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_term_count ON recipe_ingredients (term, ingredient_count, recipe_id DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe_term ON recipe_ingredients (recipe_id, term) INCLUDE (position, ingredient_count)")
+        cursor.execute("DROP INDEX IF EXISTS idx_recipe_ingredients_recipe")
+        pending = conn.cursor(name='ingredient_backfill')
+        pending.execute("SELECT id, ingredients FROM recipes WHERE ingredient_count IS NULL")
+        indexed = 0
+        for recipe_id, text in pending:
+            index_recipe_ingredients(cursor, recipe_id, text)
+            indexed += 1
+        pending.close()
+        print(f"Ingredient index checked/created ({indexed} recipes indexed).")
+
         # Create comments table
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS comments (
@@ -80,6 +151,104 @@ def setup_database():
         """)
         print("Comments table checked/created.")
 
+        # Comment threads are read newest first, one keyset page at a time
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_recipe_created ON comments (recipe_id, created_at, id)")
+
+        # Denormalized comment counter kept in step by post_comment (migration + backfill)
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS comment_count INT NOT NULL DEFAULT 0")
+        cursor.execute("""
+        UPDATE recipes SET comment_count = COALESCE(counts.count, 0)
+        FROM recipes r
+        LEFT JOIN (SELECT recipe_id, COUNT(*) AS count FROM comments GROUP BY recipe_id) counts
+            ON counts.recipe_id = r.id
+        WHERE recipes.id = r.id AND recipes.comment_count <> COALESCE(counts.count, 0)
+        """)
+        print("Comment index and counts checked/backfilled.")
+
+        # Admin dashboard statistics, materialized so a dashboard load never scans
+        # the big tables. Refreshed by stats.py (unique indexes allow CONCURRENTLY).
+        cursor.execute("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_admin_totals AS
+        SELECT 1 AS id,
+               (SELECT COUNT(*) FROM users) AS total_users,
+               (SELECT COUNT(*) FROM recipes) AS total_recipes,
+               NOW() AS refreshed_at
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_admin_totals ON mv_admin_totals (id)")
+        cursor.execute("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_daily_signups AS
+        SELECT DATE(created_at) AS date, COUNT(*) AS count
+        FROM users
+        GROUP BY DATE(created_at)
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_daily_signups ON mv_daily_signups (date)")
+        # Earlier versions also ranked by likes, which the dashboard never read
+        cursor.execute("""
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = to_regclass('mv_top_recipes') AND attname = 'kind'
+        """)
+        if cursor.fetchone():
+            cursor.execute("DROP MATERIALIZED VIEW mv_top_recipes")
+        cursor.execute("DROP INDEX IF EXISTS idx_recipes_like_count")
+        cursor.execute("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_top_recipes AS
+        SELECT ROW_NUMBER() OVER (ORDER BY recipes.views DESC, recipes.id DESC) AS rank,
+               recipes.id, recipes.title, recipes.views, recipes.like_count, users.username
+        FROM recipes JOIN users ON recipes.user_id = users.id
+        ORDER BY recipes.views DESC, recipes.id DESC LIMIT 10
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_top_recipes ON mv_top_recipes (rank)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_views ON recipes (views DESC, id DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_user_created ON recipes (user_id, created_at)")
+        print("Dashboard statistics views checked/created.")
+
+        # Admin user directory: keyset sorts, prefix search and per-user counts
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_id ON users (username, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_lower ON users (lower(username) text_pattern_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email_lower ON users (lower(email) text_pattern_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_admins ON users (id) WHERE role = 'admin'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_user ON comments (user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_likes_user ON recipe_likes (user_id)")
+        print("User directory indexes checked/created.")
+
+        # Bumped to sign out every session of a user (password changes and resets)
+        cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS auth_version INT NOT NULL DEFAULT 0")
+        print("Session version column ensured.")
+
+        # "More like this": each recipe's nearest neighbours, best first, and the
+        # term document frequencies of the last build (see similar.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_similar (
+            recipe_id INT PRIMARY KEY REFERENCES recipes(id) ON DELETE CASCADE,
+            similar_ids INT[] NOT NULL,
+            scores REAL[] NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        # Finds the lists an edited recipe sits on
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_similar_ids ON recipe_similar USING GIN (similar_ids)")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS similar_terms (
+            term VARCHAR(110) PRIMARY KEY,
+            df INT NOT NULL
+        )
+        """)
+        print("Similar recipes tables checked/created.")
+
+        # Time-decayed trending score, kept up to date by views, likes and comments
+        # (see trending.py); indexed per sort mode like the other feed orders
+        cursor.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS trending DOUBLE PRECISION")
+        cursor.execute("SELECT 1 FROM recipes WHERE trending IS NULL LIMIT 1")
+        if cursor.fetchone():
+            trending.recompute(cursor)
+            cursor.execute("UPDATE recipes SET trending = 0 WHERE trending IS NULL")
+        trending.set_default(cursor)
+        cursor.execute("ALTER TABLE recipes ALTER COLUMN trending SET NOT NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_trending_id ON recipes (trending, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_category_trending_id ON recipes (category, trending, id)")
+        print("Trending scores backfilled and indexed.")
+
         # Check if admin exists, if not create one
         cursor.execute("SELECT * FROM users WHERE role='admin'")
         if not cursor.fetchone():
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+import cache
+import metrics
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# External results layer: YouTube lookups go through a shared TTL cache with a strict
+# latency budget, and stale entries are served while a background refresh runs.
+# Entries live in a cache.make_cache() cache for stale_ttl, so they are bounded
+# per worker, shared through CACHE_URL and listed with the other caches' stats;
+# freshness is judged from the fetch time stored with them.
+
+YOUTUBE_TTL = float(os.getenv("YOUTUBE_CACHE_TTL", 600))          # fresh for 10 minutes
+YOUTUBE_STALE_TTL = float(os.getenv("YOUTUBE_STALE_TTL", 86400))  # servable (while refreshing) for a day
+YOUTUBE_BUDGET = float(os.getenv("YOUTUBE_BUDGET", 0.3))          # max seconds a page waits inline
+YOUTUBE_ASYNC_BUDGET = float(os.getenv("YOUTUBE_ASYNC_BUDGET", 5))  # max seconds /api/youtube waits
+YOUTUBE_MODE = os.getenv("YOUTUBE_MODE", "async")                 # 'async' or 'inline'
+YOUTUBE_WORKERS = int(os.getenv("YOUTUBE_WORKERS", 4))
+YOUTUBE_CACHE_SIZE = int(os.getenv("YOUTUBE_CACHE_SIZE", 1000))
+
+
+_NO_DEFAULT = object()
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+class VideosSearchProvider:
+    """Default provider backed by youtube-search-python."""
+
+    def search(self, query, limit):
+        from youtubesearchpython import VideosSearch
+        return VideosSearch(query, limit=limit).result().get('result', [])
+
+
+SUGGEST_URL = os.getenv("SUGGEST_URL", "https://suggestqueries.google.com/complete/search")
+SUGGEST_TIMEOUT = float(os.getenv("SUGGEST_TIMEOUT", 1.5))
+SUGGEST_TTL = float(os.getenv("SUGGEST_CACHE_TTL", 300))
+SUGGEST_WORKERS = int(os.getenv("SUGGEST_WORKERS", 16))
+
+
+class GoogleSuggestProvider:
+    """YouTube query suggestions over a pooled keep-alive httpx client (one per process)."""
+
+    def __init__(self, url=SUGGEST_URL, timeout=SUGGEST_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Shared by every thread in the process; created once per pid
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    import httpx
+                    self._client = httpx.Client(
+                        timeout=self.timeout,
+                        headers={'User-Agent': 'Mozilla/5.0'},
+                        limits=httpx.Limits(max_connections=SUGGEST_WORKERS, max_keepalive_connections=SUGGEST_WORKERS),
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def search(self, query, limit):
+        response = self.client.get(self.url, params={'client': 'firefox', 'ds': 'yt', 'q': query})
+        response.raise_for_status()
+        data = response.json()
+        return data[1][:limit] if len(data) > 1 else []
+
+
+class ExternalResults:
+    def __init__(self, provider, ttl=YOUTUBE_TTL, stale_ttl=YOUTUBE_STALE_TTL, max_entries=YOUTUBE_CACHE_SIZE,
+                 workers=YOUTUBE_WORKERS, name='youtube'):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.workers = workers
+        self.name = name
+
+        self.cache = cache.make_cache(name, max_entries=max_entries, ttl=stale_ttl)
+        self._lock = threading.Lock()
+        self._inflight = {}    # key -> Future
+        self._executor = None
+        self._pid = None
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def _get_executor(self):
+        # One pool per process; threads do not survive a gunicorn fork
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._pid = os.getpid()
+            self._inflight = {}
+        return self._executor
+
+    def _fetch(self, key, query, limit):
+        try:
+            with metrics.timed(self.name):
+                results = self.provider.search(query, limit)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"{self.name} search error: {e}")
+            results = None
+        if results is not None:
+            self.cache.set(key, {'results': results, 'fetched_at': time.time()})
+        with self._lock:
+            self._inflight.pop(key, None)
+        return results or []
+
+    def _refresh(self, key, query, limit):
+        # Caller holds the lock. Coalesces concurrent refreshes of the same key.
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._get_executor().submit(self._fetch, key, query, limit)
+            self._inflight[key] = future
+            return future, True
+        return future, False
+
+    def get(self, query, limit, budget=YOUTUBE_BUDGET, default=_NO_DEFAULT):
+        """Cached or freshly fetched results; `default` (an empty list unless given)
+        if nothing arrived within `budget` seconds."""
+        key = f"{limit}:{normalize_query(query)}"
+        entry = self.cache.get(key)
+        with self._lock:
+            if entry:
+                if time.time() - entry['fetched_at'] < self.ttl:
+                    self.stats['hits'] += 1
+                    return entry['results']
+                # Stale-while-revalidate: answer now, refresh in the background
+                self.stats['stale_hits'] += 1
+                self._refresh(key, query, limit)
+                return entry['results']
+            future, started = self._refresh(key, query, limit)
+            self.stats['misses' if started else 'coalesced'] += 1
+
+        if default is _NO_DEFAULT:
+            default = []
+        if budget <= 0:
+            return default
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeout:
+            # The fetch keeps running and fills the cache for the next request
+            self.stats['timeouts'] += 1
+            return default
+
+    def clear(self):
+        self.cache.clear()
+
+
+youtube = ExternalResults(VideosSearchProvider())
+suggest = ExternalResults(GoogleSuggestProvider(), ttl=SUGGEST_TTL, stale_ttl=SUGGEST_TTL * 12,
+                          workers=SUGGEST_WORKERS, name='suggest')
@@ -0,0 +1,18 @@
+# Full-text search over recipes. recipes.search_vector is a weighted tsvector
+# (title A, description B, ingredients C, category D), written by the upload and
+# edit routes, backfilled by db_setup.py and matched with websearch_to_tsquery
+# in the feed's search branch.
+
+
+def search_vector_sql(title, description, ingredients, category):
+    # Weighted full-text vector for a recipe. Operands are SQL snippets: '%s' for
+    # bound parameters in the app, column names for the db_setup.py backfill.
+    return (
+        f"(setweight(to_tsvector('english', coalesce({title}, '')), 'A') || "
+        f"setweight(to_tsvector('english', coalesce({description}, '')), 'B') || "
+        f"setweight(to_tsvector('english', coalesce({ingredients}, '')), 'C') || "
+        f"setweight(to_tsvector('english', coalesce({category}, '')), 'D'))"
+    )
+
+
+SEARCH_VECTOR_PARAMS_SQL = search_vector_sql('%s', '%s', '%s', '%s')
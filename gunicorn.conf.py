@@ -0,0 +1,50 @@
+import os
+import multiprocessing
+
+# Gunicorn settings (procfile: gunicorn -c gunicorn.conf.py app:app).
+# Requests spend most of their time waiting on Postgres or remote services, so
+# each process serves many requests at once:
+#   gthread (default)  GUNICORN_THREADS requests per process on OS threads
+#   gevent             GUNICORN_WORKER_CONNECTIONS per process on green threads
+#                      (pip install gevent psycogreen)
+#   sync               one request per process, the old behaviour
+# Postgres work is still capped by DB_POOL_MAX connections per process; requests
+# beyond that queue in the pool for up to DB_POOL_TIMEOUT seconds.
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# gunicorn silently turns sync into gthread when threads > 1, so only set it for gthread
+threads = int(os.getenv("GUNICORN_THREADS", 100)) if worker_class == "gthread" else 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+if worker_class == "gthread":
+    # Extra work beyond the thread count waits in the listen backlog
+    backlog = max(2048, workers * threads)
+
+
+def on_starting(server):
+    # Metrics snapshots left by the previous run would be summed into this one
+    import metrics
+    metrics.clear_directory()
+
+
+def post_fork(server, worker):
+    if worker_class != "gevent":
+        return
+    # psycopg2 blocks the whole process under gevent unless it is told to yield
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        print("psycogreen is not installed; Postgres calls will block every request in the worker")
+        return
+    patch_psycopg()
+
+
+def post_worker_init(worker):
+    # Build per-worker indexes before the worker accepts its first request, so no
+    # request pays for the load (the app module is imported by now)
+    import app
+    app.warm_up()
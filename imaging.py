@@ -0,0 +1,154 @@
+import os
+import re
+import shutil
+import subprocess
+from cache import LocalCache
+
+# Poster frames and responsive image variants. Thumbnails and profile photos
+# stored locally get <name>_w<width>.webp/.jpg copies at a few fixed widths,
+# served through srcset; Cloudinary-hosted images are resized by URL instead.
+# Pillow comes with requirements.txt; ffmpeg is optional. Without either one
+# uploads keep working and pages fall back to the original file.
+
+THUMBNAIL_WIDTHS = (320, 640, 960)
+PROFILE_WIDTHS = (64, 128, 256)
+VARIANT_WIDTHS = {'thumbnails': THUMBNAIL_WIDTHS, 'profiles': PROFILE_WIDTHS}
+VARIANT_FORMATS = (('webp', 'WEBP', {'quality': 80, 'method': 4}),
+                   ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}))
+POSTER_AT = float(os.getenv("POSTER_AT", 1.0))   # seconds into the video
+FFMPEG = os.getenv("FFMPEG_BINARY") or shutil.which('ffmpeg')
+
+CLOUDINARY_UPLOAD = re.compile(r'^(https://res\.cloudinary\.com/[^/]+/(?:image|video)/upload/)(.+)$')
+
+_warned = set()
+# filename -> widths that exist on disk; short TTL so a backfill shows up
+_variant_cache = LocalCache(max_entries=20000, ttl=300)
+
+
+def _warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        print(message)
+
+
+def _pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        _warn_once('pillow', "Pillow is not installed; responsive image variants are disabled")
+        return None, None
+    return Image, ImageOps
+
+
+def variant_name(filename, width, ext):
+    return f"{os.path.splitext(filename)[0]}_w{width}.{ext}"
+
+
+def is_variant(filename):
+    return re.search(r'_w\d+\.(webp|jpg)$', filename) is not None
+
+
+def build_variants(path, widths):
+    """Write resized WebP and JPEG copies of the image at `path`, one pair per
+    width up to the image's own width. Returns the widths written."""
+    Image, ImageOps = _pillow()
+    if Image is None:
+        return []
+    written = []
+    try:
+        with Image.open(path) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+        for width in sorted(widths):
+            if written and width > image.width:
+                break
+            w = min(width, image.width)
+            resized = image.resize((w, max(1, round(image.height * w / image.width))), Image.LANCZOS)
+            for ext, fmt, options in VARIANT_FORMATS:
+                resized.save(variant_name(path, width, ext), fmt, **options)
+            written.append(width)
+    except (OSError, ValueError) as e:
+        print(f"Image variant error for {path}: {e}")
+    _variant_cache.delete(path)
+    return written
+
+
+def extract_poster(video_path, out_path, at=POSTER_AT):
+    """Grab one frame from the video as a JPEG. Returns out_path, or None when
+    ffmpeg is missing or the video has no frame at that point."""
+    if not FFMPEG:
+        _warn_once('ffmpeg', "ffmpeg not found; poster frames are disabled")
+        return None
+    for offset in (at, 0):   # very short clips have nothing at `at`
+        try:
+            subprocess.run(
+                [FFMPEG, '-v', 'error', '-y', '-ss', str(offset), '-i', video_path,
+                 '-frames:v', '1', '-q:v', '3', out_path],
+                check=True, timeout=60, stdin=subprocess.DEVNULL, capture_output=True
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Poster extraction error for {video_path}: {e}")
+            return None
+        if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+            return out_path
+    return None
+
+
+def local_variants(path, widths):
+    found = _variant_cache.get(path)
+    if found is None:
+        found = [w for w in widths if os.path.exists(variant_name(path, w, 'jpg'))]
+        _variant_cache.set(path, found)
+    return found
+
+
+def cloudinary_variant(url, width, fmt='auto'):
+    match = CLOUDINARY_UPLOAD.match(url)
+    if not match:
+        return None
+    return f"{match.group(1)}w_{width},c_limit,q_auto,f_{fmt}/{match.group(2)}"
+
+
+def video_poster(url, width=640):
+    """Poster URL for a Cloudinary-hosted video (Cloudinary renders the frame)."""
+    match = CLOUDINARY_UPLOAD.match(url or '')
+    if not match or '/video/' not in match.group(1):
+        return None
+    rest = os.path.splitext(match.group(2))[0] + '.jpg'
+    return f"{match.group(1)}so_{POSTER_AT:g},w_{width},c_limit,q_auto/{rest}"
+
+
+def image_sources(value, folder, static_url, uploads_root='static/uploads'):
+    """src plus srcset for a stored image value. `static_url(name)` builds the URL
+    of a file in the folder. Returns {'src', 'srcset', 'webp_srcset'}."""
+    widths = VARIANT_WIDTHS[folder]
+    if value.startswith('http'):
+        if CLOUDINARY_UPLOAD.match(value):
+            return {
+                'src': cloudinary_variant(value, widths[-1]),
+                'srcset': ', '.join(f"{cloudinary_variant(value, w)} {w}w" for w in widths),
+                'webp_srcset': None,
+            }
+        return {'src': value, 'srcset': None, 'webp_srcset': None}
+
+    found = local_variants(os.path.join(uploads_root, folder, value), widths)
+    if not found:
+        return {'src': static_url(value), 'srcset': None, 'webp_srcset': None}
+    return {
+        'src': static_url(variant_name(value, found[-1], 'jpg')),
+        'srcset': ', '.join(f"{static_url(variant_name(value, w, 'jpg'))} {w}w" for w in found),
+        'webp_srcset': ', '.join(f"{static_url(variant_name(value, w, 'webp'))} {w}w" for w in found),
+    }
+
+
+if __name__ == "__main__":
+    # Backfill variants for images uploaded before this existed
+    for folder, widths in VARIANT_WIDTHS.items():
+        root = os.path.join('static/uploads', folder)
+        if not os.path.isdir(root):
+            continue
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if is_variant(name) or not os.path.isfile(path):
+                continue
+            if len(local_variants(path, widths)) == 0:
+                print(f"{path}: {build_variants(path, widths) or 'skipped'}")
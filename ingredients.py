@@ -0,0 +1,133 @@
+import os
+import re
+
+# Turns the free-text ingredients blob into normalized tokens for the
+# recipe_ingredients inverted index ("2 cups Chopped Onions," -> "onion").
+
+UNITS = {
+    'cup', 'cups', 'tbsp', 'tablespoon', 'tablespoons', 'tsp', 'teaspoon', 'teaspoons',
+    'g', 'gm', 'gms', 'gram', 'grams', 'kg', 'kgs', 'mg', 'ml', 'l', 'litre', 'liter', 'litres', 'liters',
+    'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds', 'pinch', 'pinches', 'dash',
+    'clove', 'cloves', 'piece', 'pieces', 'slice', 'slices', 'can', 'cans', 'pack', 'packet',
+    'bunch', 'handful', 'sprig', 'sprigs', 'stick', 'sticks', 'inch', 'nos', 'no',
+}
+DESCRIPTORS = {
+    'chopped', 'finely', 'roughly', 'diced', 'sliced', 'minced', 'grated', 'crushed', 'fresh',
+    'freshly', 'ground', 'large', 'medium', 'small', 'big', 'boiled', 'cooked', 'raw', 'peeled',
+    'optional', 'to', 'taste', 'as', 'needed', 'required', 'for', 'garnish', 'of', 'and', 'or',
+    'a', 'an', 'the', 'some', 'few', 'about', 'approx', 'whole', 'half', 'quarter', 'cut', 'into',
+    'cubes', 'pieces', 'soaked', 'washed', 'melted', 'softened', 'room', 'temperature', 'warm',
+    'hot', 'cold', 'tbs', 'heaped', 'level', 'more', 'little', 'extra',
+}
+# Words where stripping a trailing "s" would be wrong
+KEEP_S = {'peas', 'oats', 'lentils', 'chickpeas', 'noodles', 'greens', 'molasses', 'asparagus', 'hummus', 'couscous', 'swiss'}
+IRREGULAR = {'leaves': 'leaf', 'loaves': 'loaf', 'halves': 'half'}
+
+# Pantry search ranks at most this many postings' recipes, shared between the
+# pantry terms; rare terms fit and are read whole, common ones are cut short
+PANTRY_CANDIDATES = int(os.getenv("PANTRY_CANDIDATES", 4000))
+PANTRY_MIN_TERM_POSTINGS = 200
+
+SEPARATORS = re.compile(r'[\n,;•]+|\band\b')
+NON_WORD = re.compile(r'[^a-z\s]')
+MAX_TOKEN_LENGTH = 100
+
+
+def singular(word):
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if word in KEEP_S or len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(text):
+    # Drop parentheticals, quantities, units and prep words, keep the ingredient name
+    text = re.sub(r'\(.*?\)', ' ', text.lower())
+    text = NON_WORD.sub(' ', text)
+    words = [w for w in text.split() if w not in UNITS and w not in DESCRIPTORS]
+    if not words:
+        return None
+    return ' '.join(singular(w) for w in words)[:MAX_TOKEN_LENGTH]
+
+
+def parse_ingredients(text):
+    if not text:
+        return []
+    tokens = set()
+    for part in SEPARATORS.split(text):
+        token = normalize_ingredient(part)
+        if token:
+            tokens.add(token)
+    return sorted(tokens)
+
+
+def ingredient_terms(phrase):
+    # A phrase is indexed under itself and each of its words, so "tomato" in a
+    # pantry still finds "cherry tomato"
+    terms = {phrase}
+    terms.update(w for w in phrase.split() if len(w) > 2 and w not in DESCRIPTORS)
+    return terms
+
+
+def index_recipe_ingredients(cursor, recipe_id, text):
+    """Replace a recipe's postings in the inverted index and store its ingredient count."""
+    from psycopg2.extras import execute_values
+
+    phrases = parse_ingredients(text)
+    rows = []
+    for position, phrase in enumerate(phrases):
+        rows.extend((term, recipe_id, position, len(phrases)) for term in ingredient_terms(phrase))
+
+    cursor.execute("DELETE FROM recipe_ingredients WHERE recipe_id = %s", (recipe_id,))
+    if rows:
+        execute_values(
+            cursor,
+            "INSERT INTO recipe_ingredients (term, recipe_id, position, ingredient_count) VALUES %s",
+            rows
+        )
+    cursor.execute("UPDATE recipes SET ingredient_count = %s WHERE id = %s", (len(phrases), recipe_id))
+    return phrases
+
+
+def pantry_matches_sql(table='recipe_ingredients', ready_only=True):
+    """Best pantry matches as (recipe_id, matched, total); see pantry_params.
+    With ready_only, recipes whose video is still uploading are left out."""
+    # Every term's postings are walked in the same order, smallest recipes first,
+    # along idx_recipe_ingredients_term_count, so the capped prefixes overlap on the
+    # recipes that can reach the highest coverage. Only those candidates are then
+    # scored exactly against all pantry terms, index-only on (recipe_id, term).
+    ready = """
+        WHERE EXISTS (SELECT 1 FROM recipes WHERE recipes.id = candidates.recipe_id AND recipes.video_filename IS NOT NULL)""" if ready_only else ""
+    return f"""
+        WITH candidates AS (
+            SELECT DISTINCT picked.recipe_id
+            FROM unnest(%(terms)s::text[]) AS pantry(term)
+            CROSS JOIN LATERAL (
+                SELECT recipe_id FROM {table}
+                WHERE term = pantry.term
+                ORDER BY ingredient_count, recipe_id DESC
+                LIMIT %(per_term)s
+            ) picked
+        )
+        SELECT candidates.recipe_id, scored.matched, scored.total
+        FROM candidates
+        CROSS JOIN LATERAL (
+            SELECT COUNT(DISTINCT position) AS matched, MAX(ingredient_count) AS total
+            FROM {table}
+            WHERE recipe_id = candidates.recipe_id AND term = ANY(%(terms)s)
+        ) scored{ready}
+        ORDER BY scored.matched::float / scored.total DESC, scored.matched DESC, candidates.recipe_id DESC
+        LIMIT %(limit)s
+    """
+
+
+def pantry_params(terms, limit, budget=PANTRY_CANDIDATES):
+    per_term = max(budget // len(terms), PANTRY_MIN_TERM_POSTINGS)
+    return {'terms': terms, 'per_term': per_term, 'limit': limit}
@@ -0,0 +1,428 @@
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+import cache
+import imaging
+import metrics
+
+# Background media pipeline. Request handlers spool uploaded files to local disk
+# and enqueue a job; worker threads (or `python media.py` processes) push the
+# file to storage and write the resulting URL back to Postgres. Jobs live in a
+# SQLite file next to the spool, so they survive restarts, and a crashed
+# worker's job is picked up again once its lease runs out.
+
+MEDIA_UPLOAD_MODE = os.getenv("MEDIA_UPLOAD_MODE", "async")     # 'async' or 'inline'
+MEDIA_UPLOADER = os.getenv("MEDIA_UPLOADER", "cloudinary")      # 'cloudinary' or 'local'
+MEDIA_SPOOL_DIR = os.getenv("MEDIA_SPOOL_DIR", "instance/media_spool")
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", 2))              # threads per web worker; 0 = external workers only
+MEDIA_MAX_ATTEMPTS = int(os.getenv("MEDIA_MAX_ATTEMPTS", 5))
+MEDIA_RETRY_DELAY = float(os.getenv("MEDIA_RETRY_DELAY", 10))   # doubled after every failed attempt
+MEDIA_LEASE = float(os.getenv("MEDIA_LEASE", 900))              # seconds before a running job counts as abandoned
+MEDIA_POLL_INTERVAL = float(os.getenv("MEDIA_POLL_INTERVAL", 2))
+MEDIA_JOB_RETENTION = 7 * 24 * 3600
+
+# (kind, column) pairs a job may write, with the update and the local uploads
+# folder the templates expect for that column; anything else is rejected
+TARGETS = {
+    ('recipe', 'video_filename'): ("UPDATE recipes SET video_filename = %s WHERE id = %s", 'videos'),
+    ('recipe', 'thumbnail'): ("UPDATE recipes SET thumbnail = %s, thumbnail_auto = FALSE WHERE id = %s", 'thumbnails'),
+    ('user', 'profile_photo'): ("UPDATE users SET profile_photo = %s WHERE id = %s", 'profiles'),
+}
+
+UNFINISHED = ('pending', 'running')
+
+# A poster frame fills the thumbnail only when there is none, or the current
+# one is itself an earlier poster
+POSTER_SQL = "UPDATE recipes SET thumbnail = %s, thumbnail_auto = TRUE WHERE id = %s AND (thumbnail IS NULL OR thumbnail_auto)"
+
+
+def spool(file, spool_dir=MEDIA_SPOOL_DIR):
+    """Save an uploaded FileStorage under the spool directory and return its path."""
+    if not file or not file.filename:
+        return None
+    os.makedirs(spool_dir, exist_ok=True)
+    ext = os.path.splitext(file.filename)[1].lower()
+    path = os.path.join(spool_dir, uuid.uuid4().hex + ext)
+    file.save(path)   # streamed to disk in chunks by Werkzeug
+    return path
+
+
+def discard(path):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CloudinaryUploader:
+    def upload(self, path, resource_type, folder=None):
+        import cloudinary.uploader
+        # upload_large sends the file in chunks, which Cloudinary requires for big videos
+        if resource_type == 'video':
+            result = cloudinary.uploader.upload_large(path, resource_type=resource_type)
+        else:
+            result = cloudinary.uploader.upload(path, resource_type=resource_type)
+        return result['secure_url']
+
+
+class LocalUploader:
+    """Copies files into static/uploads/<folder> and returns the bare filename,
+    which the templates resolve like any locally stored upload. Used for
+    development and tests, where no Cloudinary account is configured."""
+
+    def __init__(self, root='static/uploads'):
+        self.root = root
+
+    def upload(self, path, resource_type, folder=None):
+        target = os.path.join(self.root, folder or resource_type)
+        os.makedirs(target, exist_ok=True)
+        name = os.path.basename(path)
+        shutil.copyfile(path, os.path.join(target, name))
+        return name
+
+
+def default_uploader():
+    return LocalUploader() if MEDIA_UPLOADER == 'local' else CloudinaryUploader()
+
+
+class JobQueue:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(MEDIA_SPOOL_DIR, 'jobs.db')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                target_id INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                resource_type TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after REAL NOT NULL DEFAULT 0,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_target ON jobs (kind, target_id, field)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the queue safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind, target_id, field, resource_type, path):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # A newer file for the same column replaces anything still waiting
+            stale = conn.execute(
+                "SELECT path FROM jobs WHERE kind = ? AND target_id = ? AND field = ? AND status IN ('pending', 'failed')",
+                (kind, target_id, field)
+            ).fetchall()
+            conn.execute(
+                "UPDATE jobs SET status = 'superseded', updated_at = ? "
+                "WHERE kind = ? AND target_id = ? AND field = ? AND status IN ('pending', 'failed')",
+                (now, kind, target_id, field)
+            )
+            job_id = conn.execute(
+                "INSERT INTO jobs (kind, target_id, field, resource_type, path, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, target_id, field, resource_type, path, now, now)
+            ).lastrowid
+            conn.execute("COMMIT")
+        for row in stale:
+            discard(row['path'])
+        return job_id
+
+    def claim(self, job_id=None):
+        """Lease the next runnable job (or a specific one). Returns a dict or None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if job_id is not None:
+                row = conn.execute("SELECT * FROM jobs WHERE id = ? AND status = 'pending'", (job_id,)).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE (status = 'pending' AND run_after <= ?) "
+                    "OR (status = 'running' AND lease_until < ?) ORDER BY id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + MEDIA_LEASE, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        job = dict(row)
+        job['attempts'] += 1
+        return job
+
+    def record_result(self, job_id, url):
+        # Kept so a retry after a failed database write does not upload again
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET result = ?, updated_at = ? WHERE id = ?", (url, time.time(), job_id))
+
+    def finish(self, job_id, status, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def retry(self, job_id, delay, error):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', error = ?, run_after = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                (error, time.time() + delay, time.time(), job_id)
+            )
+
+    def is_latest(self, job):
+        # False once a newer job for the same column exists, so an old upload
+        # finishing late never overwrites a newer one
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE kind = ? AND target_id = ? AND field = ? AND id > ? AND status <> 'superseded'",
+                (job['kind'], job['target_id'], job['field'], job['id'])
+            ).fetchone()
+        return row is None
+
+    def target_state(self, kind, target_id):
+        with self._connect() as conn:
+            statuses = {r['status'] for r in conn.execute(
+                "SELECT DISTINCT status FROM jobs WHERE kind = ? AND target_id = ?", (kind, target_id)
+            )}
+        if statuses & set(UNFINISHED):
+            return 'processing'
+        if 'failed' in statuses:
+            return 'failed'
+        return 'ready'
+
+    def jobs_for(self, kind, target_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, field, status, attempts, error, updated_at FROM jobs "
+                "WHERE kind = ? AND target_id = ? AND status <> 'superseded' ORDER BY id",
+                (kind, target_id)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def counts(self):
+        with self._connect() as conn:
+            return {r['status']: r['n'] for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    def prune(self, older_than=MEDIA_JOB_RETENTION):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'superseded') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+
+
+class MediaPipeline:
+    def __init__(self, get_connection, uploader=None, queue=None, workers=MEDIA_WORKERS,
+                 mode=MEDIA_UPLOAD_MODE, on_change=None):
+        self.get_connection = get_connection
+        self.uploader = uploader or default_uploader()
+        self._queue = queue
+        self.workers = workers
+        self.mode = mode
+        self.on_change = on_change
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.stats = {'submitted': 0, 'uploaded': 0, 'retries': 0, 'failed': 0}
+
+    @property
+    def queue(self):
+        # Opened lazily so importing the app never touches the spool directory
+        if self._queue is None:
+            self._queue = JobQueue()
+        return self._queue
+
+    def _ensure_workers(self):
+        # One set of worker threads per process
+        if self._pid == os.getpid() or self.workers <= 0:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                for i in range(self.workers):
+                    threading.Thread(target=self._run, name=f'media-worker-{i}', daemon=True).start()
+
+    def submit(self, kind, target_id, field, path, resource_type):
+        return self.submit_many(kind, target_id, [(field, path, resource_type)])[0]
+
+    def submit_many(self, kind, target_id, uploads):
+        """Queue every (field, path, resource_type) for one row before any worker
+        starts, so the row only turns 'ready' once all of them have landed."""
+        for field, _, _ in uploads:
+            if (kind, field) not in TARGETS:
+                raise ValueError(f"unknown media target {kind}.{field}")
+        job_ids = [self.queue.enqueue(kind, target_id, field, resource_type, path)
+                   for field, path, resource_type in uploads]
+        self.stats['submitted'] += len(job_ids)
+        self._ensure_workers()   # also picks up retries of inline jobs
+        if self.mode == 'inline':
+            for job_id in job_ids:
+                job = self.queue.claim(job_id)
+                if job:
+                    self.process(job)
+        else:
+            self._wake.set()
+        return job_ids
+
+    def _run(self):
+        pid = os.getpid()
+        last_prune = 0
+        while self._pid == pid:
+            job = self.queue.claim()
+            if job is None:
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    self.queue.prune()
+                self._wake.wait(MEDIA_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self.process(job)
+
+    def run_forever(self):
+        """Worker loop for a standalone process (`python media.py`)."""
+        self._pid = os.getpid()
+        self._run()
+
+    def process(self, job):
+        try:
+            url = job['result']
+            if not url:
+                folder = TARGETS[(job['kind'], job['field'])][1]
+                with metrics.timed('media_upload'):
+                    url = self.uploader.upload(job['path'], job['resource_type'], folder)
+                if not url:
+                    raise RuntimeError("uploader returned no URL")
+                self.queue.record_result(job['id'], url)
+            if self.queue.is_latest(job):
+                folder = TARGETS[(job['kind'], job['field'])][1]
+                if folder in imaging.VARIANT_WIDTHS:
+                    self._build_variants(folder, url)
+                self._write_url(job, url)
+                if job['field'] == 'video_filename':
+                    self._make_poster(job)
+            self.queue.finish(job['id'], 'done')
+            self.stats['uploaded'] += 1
+            discard(job['path'])
+            self._update_state(job)
+        except Exception as e:
+            print(f"Media job {job['id']} error (attempt {job['attempts']}): {e}")
+            if job['attempts'] >= MEDIA_MAX_ATTEMPTS:
+                self.queue.finish(job['id'], 'failed', str(e))
+                self.stats['failed'] += 1
+                discard(job['path'])
+                self._update_state(job)
+            else:
+                self.stats['retries'] += 1
+                self.queue.retry(job['id'], MEDIA_RETRY_DELAY * 2 ** (job['attempts'] - 1), str(e))
+
+    @property
+    def media_root(self):
+        return getattr(self.uploader, 'root', 'static/uploads')
+
+    def _build_variants(self, folder, url):
+        # Locally stored images get resized copies; remote ones are resized by URL
+        if not url.startswith('http'):
+            imaging.build_variants(os.path.join(self.media_root, folder, url), imaging.VARIANT_WIDTHS[folder])
+
+    def _make_poster(self, job):
+        # Best effort: a missing ffmpeg or an odd video never fails the upload
+        poster = os.path.splitext(job['path'])[0] + '_poster.jpg'
+        try:
+            if not imaging.extract_poster(job['path'], poster):
+                return
+            with metrics.timed('media_upload'):
+                url = self.uploader.upload(poster, 'image', 'thumbnails')
+            if not url:
+                return
+            self._build_variants('thumbnails', url)
+            conn = self.get_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(POSTER_SQL, (url, job['target_id']))
+                    conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Poster error for media job {job['id']}: {e}")
+        finally:
+            discard(poster)
+
+    def _write_url(self, job, url):
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(TARGETS[(job['kind'], job['field'])][0], (url, job['target_id']))
+                conn.commit()
+        finally:
+            conn.close()
+
+    def _update_state(self, job):
+        if job['kind'] == 'recipe':
+            state = self.queue.target_state('recipe', job['target_id'])
+            if state == 'processing':
+                return
+            conn = self.get_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("UPDATE recipes SET media_status = %s WHERE id = %s", (state, job['target_id']))
+                    conn.commit()
+            finally:
+                conn.close()
+        if self.on_change:
+            self.on_change(job['kind'], job['target_id'])
+
+    def status(self, kind, target_id):
+        return {'state': self.queue.target_state(kind, target_id), 'jobs': self.queue.jobs_for(kind, target_id)}
+
+
+if __name__ == "__main__":
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    import cloudinary
+    cloudinary.config(secure=True)
+
+    def connect():
+        return psycopg2.connect(os.getenv("DATABASE_URL"), cursor_factory=RealDictCursor)
+
+    # The same generations app.media_changed bumps, so the web workers drop
+    # cached feed pages and identities and pick up newly ready titles
+    feed_generation = cache.make_generation('feed')
+    title_generation = cache.make_generation('titles')
+
+    def media_changed(kind, target_id):
+        if kind == 'user':
+            cache.make_generation(f"identity-{target_id}").bump()
+        else:
+            title_generation.bump()
+        feed_generation.bump()
+
+    print(f"Media worker {os.getpid()} polling {os.path.abspath(MEDIA_SPOOL_DIR)}")
+    MediaPipeline(connect, on_change=media_changed).run_forever()
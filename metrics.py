@@ -0,0 +1,393 @@
+import os
+import json
+import time
+import bisect
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Per-process performance instrumentation. Requests get a latency histogram and
+# DB query count/time per route (queries are timed by wrapping the cursors of
+# pooled connections), remote calls get latency histograms per service, and
+# /metrics renders it all in the Prometheus text format together with the
+# cache and pool statistics collected elsewhere. Each gunicorn worker keeps its
+# own numbers and writes them to a file of its own under METRICS_DIR every
+# METRICS_FLUSH_INTERVAL seconds; whichever worker answers a scrape sums every
+# file, so Prometheus sees one steady set of series for the host. Counters of
+# workers that have exited stay in the sum, gauges only count live workers.
+#
+# SLOW_REQUEST_MS turns on a log line for requests slower than that, listing
+# the SQL they ran.
+
+METRICS_ENABLED = os.getenv("METRICS", "on") != "off"
+METRICS_ALLOW = {a.strip() for a in os.getenv("METRICS_ALLOW", "127.0.0.1,::1").split(',') if a.strip()}
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))   # 0 = slow request log off
+SLOW_REQUEST_MAX_STATEMENTS = 50
+# Per-worker snapshot files, summed at scrape time; '' reports this process only
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), 'recipe-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # name -> {labels: Histogram}
+        self._counters = {}     # name -> {labels: value}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def add_collector(self, collect):
+        """`collect()` yields (name, type, help, {labels tuple: value}) read at
+        snapshot time, for numbers kept elsewhere (caches, the pool)."""
+        self._collectors.append(collect)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def snapshot(self):
+        """This process's numbers as plain JSON-ready data, for merge()."""
+        snap = {'help': {}, 'counters': {}, 'gauges': {}, 'histograms': {}}
+        for collect in self._collectors:
+            for name, kind, text, series in collect():
+                snap['help'][name] = (kind, text)
+                target = snap['gauges' if kind == 'gauge' else 'counters'].setdefault(name, [])
+                target.extend((key, value) for key, value in series.items() if value is not None)
+        with self._lock:
+            for name, series in self._counters.items():
+                snap['counters'][name] = list(series.items())
+            for name, series in self._histograms.items():
+                snap['histograms'][name] = [(key, h.buckets, list(h.counts), h.sum) for key, h in series.items()]
+        for name, (kind, text) in self._help.items():
+            snap['help'].setdefault(name, (kind, text))
+        return snap
+
+    def render(self):
+        """Prometheus text format for every worker on this host."""
+        return render_text(merge(collect_snapshots(self)))
+
+
+def merge(snapshots):
+    """Sum snapshots series by series. A snapshot with 'live' false only
+    contributes its counters and histograms."""
+    merged = {'help': {}, 'counters': {}, 'gauges': {}, 'histograms': {}}
+    for snap in snapshots:
+        for name, (kind, text) in snap['help'].items():
+            merged['help'].setdefault(name, (kind, text))
+        kinds = ('counters', 'gauges') if snap.get('live', True) else ('counters',)
+        for kind in kinds:
+            for name, series in snap[kind].items():
+                target = merged[kind].setdefault(name, {})
+                for key, value in series:
+                    key = tuple(tuple(pair) for pair in key)
+                    target[key] = target.get(key, 0) + value
+        for name, series in snap['histograms'].items():
+            target = merged['histograms'].setdefault(name, {})
+            for key, buckets, counts, total in series:
+                key = tuple(tuple(pair) for pair in key)
+                histogram = target.get(key)
+                if histogram is None:
+                    histogram = target[key] = Histogram(tuple(buckets))
+                if tuple(buckets) != histogram.buckets:
+                    continue   # bucket layout changed between deploys
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+    return merged
+
+
+def render_text(merged):
+    lines = []
+
+    def header(name, default_kind):
+        kind, text = merged['help'].get(name, (default_kind, name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for kind in ('counters', 'gauges'):
+        for name, series in sorted(merged[kind].items()):
+            header(name, kind[:-1])
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+    for name, series in sorted(merged['histograms'].items()):
+        header(name, 'histogram')
+        for key, histogram in sorted(series.items()):
+            total = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                total += count
+                lines.append(f"{name}_bucket{_labels(key + (('le', str(bound)),))} {total}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(histogram.sum)}")
+            lines.append(f"{name}_count{_labels(key)} {total}")
+    return '\n'.join(lines) + '\n'
+
+
+# --- sharing between workers -------------------------------------------------
+
+_flusher = {'pid': None, 'path': None, 'thread_pid': None}
+_flusher_lock = threading.Lock()
+
+
+def _snapshot_path():
+    # pid plus start time, so a recycled pid never overwrites an exited worker's totals
+    if _flusher['pid'] != os.getpid():
+        _flusher['pid'] = os.getpid()
+        _flusher['path'] = os.path.join(METRICS_DIR, f"worker-{os.getpid()}-{time.time_ns()}.json")
+    return _flusher['path']
+
+
+def flush(registry_=None):
+    """Write this process's snapshot where the other workers can read it."""
+    if not METRICS_DIR:
+        return None
+    snap = (registry_ or registry).snapshot()
+    path = _snapshot_path()
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump(snap, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Metrics flush error: {e}")
+    return snap
+
+
+def collect_snapshots(registry_=None):
+    """Snapshots of every worker on this host, this process's read fresh."""
+    own = flush(registry_) if METRICS_DIR else None
+    if own is None:
+        return [(registry_ or registry).snapshot()]
+    snapshots = [own]
+    own_path = _snapshot_path()
+    stale_before = time.time() - 3 * METRICS_FLUSH_INTERVAL
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(METRICS_DIR, name)
+        if not name.endswith('.json') or path == own_path:
+            continue
+        try:
+            with open(path) as f:
+                snap = json.load(f)
+            snap['live'] = os.path.getmtime(path) >= stale_before
+        except (OSError, ValueError):
+            continue   # removed or being replaced; the next scrape reads it
+        snapshots.append(snap)
+    return snapshots
+
+
+def clear_directory():
+    """Drop the snapshots of a previous run; call once before workers start."""
+    if not METRICS_DIR:
+        return
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith('worker-'):
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass
+
+
+def _flush_loop(pid):
+    while _flusher['thread_pid'] == pid:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+@atexit.register
+def _final_flush():
+    # A worker's last numbers outlive it; the master and scripts never flushed
+    if _flusher['thread_pid'] == os.getpid():
+        flush()
+
+
+def _ensure_flusher():
+    # One flusher thread per worker process
+    if not METRICS_DIR or _flusher['thread_pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['thread_pid'] != os.getpid():
+            _flusher['thread_pid'] = os.getpid()
+            threading.Thread(target=_flush_loop, args=(os.getpid(),), name='metrics-flusher', daemon=True).start()
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+registry.describe('http_request_duration_seconds', 'histogram', 'Request latency by route')
+registry.describe('http_requests_total', 'counter', 'Requests by route, method and status')
+registry.describe('http_request_db_queries', 'histogram', 'DB queries run by one request')
+registry.describe('db_queries_total', 'counter', 'DB queries by route (background for work outside requests)')
+registry.describe('db_query_seconds_total', 'counter', 'Time spent in DB queries by route')
+registry.describe('external_call_duration_seconds', 'histogram', 'Remote call latency by service')
+registry.describe('external_call_errors_total', 'counter', 'Failed remote calls by service')
+
+# The request being served by this thread, if any
+_local = threading.local()
+
+
+def start_request():
+    _ensure_flusher()
+    _local.trace = {'started': time.perf_counter(), 'queries': 0, 'db_time': 0.0, 'statements': []}
+
+
+def finish_request(route, method, status):
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return
+    _local.trace = None
+    elapsed = time.perf_counter() - trace['started']
+    registry.observe('http_request_duration_seconds', elapsed, route=route, method=method)
+    registry.inc('http_requests_total', route=route, method=method, status=str(status))
+    registry.observe('http_request_db_queries', trace['queries'], buckets=QUERY_COUNT_BUCKETS, route=route)
+    if trace['queries']:
+        registry.inc('db_queries_total', trace['queries'], route=route)
+        registry.inc('db_query_seconds_total', trace['db_time'], route=route)
+
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        lines = [f"Slow request: {method} {route} {status} {elapsed * 1000:.0f}ms, "
+                 f"{trace['queries']} queries in {trace['db_time'] * 1000:.0f}ms"]
+        for sql, seconds in trace['statements']:
+            lines.append(f"  {seconds * 1000:8.1f}ms  {sql}")
+        if trace['queries'] > len(trace['statements']):
+            lines.append(f"  ... {trace['queries'] - len(trace['statements'])} more")
+        print('\n'.join(lines))
+
+
+def record_query(sql, seconds):
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        registry.inc('db_queries_total', route='background')
+        registry.inc('db_query_seconds_total', seconds, route='background')
+        return
+    trace['queries'] += 1
+    trace['db_time'] += seconds
+    if SLOW_REQUEST_MS and len(trace['statements']) < SLOW_REQUEST_MAX_STATEMENTS:
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8', 'replace')
+        trace['statements'].append((' '.join(str(sql).split())[:500], seconds))
+
+
+@contextmanager
+def timed(service):
+    """Time a remote call: `with metrics.timed('youtube'): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc('external_call_errors_total', service=service)
+        raise
+    finally:
+        registry.observe('external_call_duration_seconds', time.perf_counter() - start, service=service)
+
+
+class TimedCursor:
+    """Cursor proxy that reports every execute to the metrics."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, params_seq):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, params_seq)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+
+class TimedConnection:
+    """Connection proxy whose cursors are TimedCursors."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+
+def instrument(conn):
+    return TimedConnection(conn) if METRICS_ENABLED else conn
+
+
+def init_app(app):
+    """Time every request. Register before any other before_request hook so
+    their queries are counted too."""
+    if not METRICS_ENABLED:
+        return
+    from flask import request
+
+    @app.before_request
+    def _start():
+        start_request()
+
+    @app.after_request
+    def _finish(response):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        finish_request(route, request.method, response.status_code)
+        return response
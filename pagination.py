@@ -0,0 +1,29 @@
+import json
+import base64
+from datetime import datetime
+
+# Opaque keyset cursors: the sort mode, the last row's sort value and its id,
+# as URL-safe base64 JSON. A cursor only resumes the sort it was issued for.
+
+
+def encode_cursor(sort_by, value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort_by, value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, sort_by, parse_value):
+    """(value, id) for a cursor issued under `sort_by`, or None for a missing,
+    malformed or mismatched one. `parse_value(sort_by, value)` restores the
+    sort value's type."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort, value, row_id = json.loads(raw)
+        if cursor_sort != sort_by:
+            return None
+        return parse_value(sort_by, value), int(row_id)
+    except (ValueError, TypeError, KeyError):
+        return None
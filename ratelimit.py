@@ -0,0 +1,49 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# In-memory token buckets, one per key (e.g. (user_id, recipe_id)). Each bucket
+# holds up to `capacity` tokens and refills at `rate` tokens per second; a request
+# that finds the bucket empty is absorbed without touching the database.
+
+LIKE_BURST = float(os.getenv("LIKE_BURST", 3))
+LIKE_RATE = float(os.getenv("LIKE_RATE", 1))
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity=LIKE_BURST, rate=LIKE_RATE, max_keys=100000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> [tokens, updated_at, last_result]
+        self._lock = threading.Lock()
+        self.stats = {'allowed': 0, 'limited': 0}
+
+    def allow(self, key):
+        """Take a token for `key`. Returns (allowed, last_result)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.capacity, now, None]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.stats['allowed'] += 1
+                return True, bucket[2]
+            self.stats['limited'] += 1
+            return False, bucket[2]
+
+    def remember(self, key, result):
+        # Last answer for the key, replayed to requests the bucket absorbs
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[2] = result
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+# Chunked, resumable uploads. A client opens an upload, PUTs fixed-size chunks
+# in any order (each verified against its SHA-256 and written straight from the
+# request stream to disk), and can ask which chunks are still missing after a
+# dropped connection. Completing the upload (done by the form that uses it)
+# concatenates the chunks into one file in the media spool, ready for the
+# media pipeline. Memory use is one read buffer per request whatever the
+# file size.
+
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", 8 * 1024 * 1024))
+RESUMABLE_MAX_SIZE = int(os.getenv("RESUMABLE_MAX_SIZE", 2 * 1024 * 1024 * 1024))
+RESUMABLE_TTL = float(os.getenv("RESUMABLE_TTL", 24 * 3600))   # unfinished uploads are removed after this
+READ_BUFFER = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ResumableUploads:
+    def __init__(self, root, spool_dir, chunk_size=RESUMABLE_CHUNK_SIZE, max_size=RESUMABLE_MAX_SIZE, ttl=RESUMABLE_TTL):
+        self.root = root
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._last_purge = 0
+
+    def _dir(self, upload_id):
+        # Ids are hex uuids; anything else never reaches the filesystem
+        try:
+            upload_id = uuid.UUID(hex=upload_id).hex
+        except (ValueError, TypeError):
+            raise UploadError("Unknown upload", 404)
+        return os.path.join(self.root, upload_id)
+
+    def _load(self, upload_id, user_id):
+        path = self._dir(upload_id)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Unknown upload", 404)
+        if meta['user_id'] != user_id:
+            raise UploadError("Unknown upload", 404)
+        return path, meta
+
+    def create(self, user_id, filename, size, sha256=None):
+        self.purge_expired()
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("File size is required")
+        if size > self.max_size:
+            raise UploadError(f"File is larger than {self.max_size // (1024 * 1024)} MB", 413)
+
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.root, upload_id)
+        os.makedirs(path)
+        meta = {
+            'id': upload_id,
+            'user_id': user_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'chunk_size': self.chunk_size,
+            'total_chunks': -(-size // self.chunk_size),
+            'created_at': time.time(),
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        return self.describe(meta, path)
+
+    def describe(self, meta, path):
+        received = self._received(path)
+        return {
+            'upload_id': meta['id'],
+            'chunk_size': meta['chunk_size'],
+            'total_chunks': meta['total_chunks'],
+            'received': sorted(received),
+            'missing': [i for i in range(meta['total_chunks']) if i not in received],
+        }
+
+    def status(self, upload_id, user_id):
+        path, meta = self._load(upload_id, user_id)
+        return self.describe(meta, path)
+
+    def _received(self, path):
+        return {int(name) for name in os.listdir(path) if name.isdigit()}
+
+    def _expected_length(self, meta, index):
+        if index == meta['total_chunks'] - 1:
+            return meta['size'] - index * meta['chunk_size']
+        return meta['chunk_size']
+
+    def write_chunk(self, upload_id, user_id, index, stream, sha256=None):
+        path, meta = self._load(upload_id, user_id)
+        if not 0 <= index < meta['total_chunks']:
+            raise UploadError("Chunk index out of range")
+        expected = self._expected_length(meta, index)
+
+        # Write to a temporary name and rename once verified, so a chunk cut
+        # off mid-transfer is simply missing and gets sent again
+        part = os.path.join(path, f"{index}.{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(part, 'wb') as out:
+                while True:
+                    block = stream.read(min(READ_BUFFER, expected - written + 1))
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > expected:
+                        raise UploadError(f"Chunk {index} is longer than {expected} bytes")
+                    digest.update(block)
+                    out.write(block)
+            if written != expected:
+                raise UploadError(f"Chunk {index} has {written} bytes, expected {expected}")
+            if sha256 and digest.hexdigest() != sha256.lower():
+                raise UploadError(f"Checksum mismatch for chunk {index}", 422)
+            os.replace(part, os.path.join(path, str(index)))
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+        return self.describe(meta, path)
+
+    def complete(self, upload_id, user_id):
+        """Assemble the chunks into one spooled file. Returns (path, filename, sha256)."""
+        path, meta = self._load(upload_id, user_id)
+        missing = self.describe(meta, path)['missing']
+        if missing:
+            raise UploadError(f"{len(missing)} chunks still missing", 409)
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        ext = os.path.splitext(meta['filename'])[1].lower()
+        target = os.path.join(self.spool_dir, upload_id + ext)
+        digest = hashlib.sha256()
+        with open(target, 'wb') as out:
+            for index in range(meta['total_chunks']):
+                with open(os.path.join(path, str(index)), 'rb') as chunk:
+                    while True:
+                        block = chunk.read(READ_BUFFER)
+                        if not block:
+                            break
+                        digest.update(block)
+                        out.write(block)
+        checksum = digest.hexdigest()
+        if meta['sha256'] and checksum != meta['sha256']:
+            os.remove(target)
+            raise UploadError("Checksum mismatch for the assembled file", 422)
+        shutil.rmtree(path, ignore_errors=True)
+        return target, meta['filename'], checksum
+
+    def abort(self, upload_id, user_id):
+        path, _ = self._load(upload_id, user_id)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def purge_expired(self):
+        # Cheap enough to run on create, but not more than once a minute
+        now = time.time()
+        if now - self._last_purge < 60 or not os.path.isdir(self.root):
+            return
+        self._last_purge = now
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,446 @@
+import os
+import re
+import sys
+import math
+import time
+import threading
+from ingredients import parse_ingredients, ingredient_terms, singular
+
+# "More like this". A recipe is a TF-IDF vector over its title words, its
+# ingredient terms (the pantry index's terms), its category and a cooking time
+# bucket. The SIMILAR_TOP_K nearest recipes by cosine similarity are kept in
+# recipe_similar, so serving them is one primary key lookup.
+#
+# `python similar.py` rebuilds every list in one batch with NumPy/SciPy sparse
+# matrices; run it from cron. Saved and edited
+# recipes are rescored right away on a background thread, in plain Python.
+# That pass compares the recipe with candidates that share its rarer terms,
+# using the document frequencies of the last build, and slots it into their
+# lists where it beats the weakest entry.
+
+TOP_K = int(os.getenv("SIMILAR_TOP_K", 10))
+# The build finds a recipe's candidates through its QUERY_TERMS strongest terms,
+# looking only at the MAX_POSTINGS strongest recipes of each term, then ranks
+# them on the full vectors. Raising either trades build time for closer
+# neighbours (see benchmarks/similar_benchmark.py).
+MAX_POSTINGS = int(os.getenv("SIMILAR_MAX_POSTINGS", 2000))
+QUERY_TERMS = int(os.getenv("SIMILAR_QUERY_TERMS", 6))
+RESCORE_FACTOR = 4           # candidates ranked on full vectors per neighbour kept
+BLOCK_ROWS = 512
+BUILD_LOCK_ID = 7_310_002    # pg advisory lock key, one build at a time
+CORPUS_TERM = ''             # similar_terms row holding the number of recipes
+
+TITLE_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+TIME_WEIGHT = 0.5
+TIME_BUCKETS = (10, 20, 30, 45, 60, 90, 120, 180)
+TITLE_STOPWORDS = {'and', 'with', 'the', 'for', 'recipe', 'style', 'easy', 'quick', 'best', 'homemade'}
+
+# Incremental updates: candidates come from this many of the recipe's rarest
+# ingredient and title terms, ignoring terms in more than CANDIDATE_MAX_DF recipes
+CANDIDATE_TERMS = 8
+CANDIDATE_LIMIT = 1000
+CANDIDATE_MAX_DF = 50000
+
+_WORD = re.compile(r'[a-z]+')
+_warned = set()
+
+
+def _warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        print(message)
+
+
+def _scipy():
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError:
+        _warn_once('scipy', "NumPy/SciPy are not installed; similar recipes can only be updated incrementally")
+        return None, None
+    return numpy, sparse
+
+
+def time_bucket(minutes):
+    try:
+        minutes = int(minutes or 0)
+    except (TypeError, ValueError):
+        return None
+    if minutes <= 0:
+        return None
+    for bound in TIME_BUCKETS:
+        if minutes <= bound:
+            return bound
+    return 'long'
+
+
+def features(title, ingredients, category, cooking_time):
+    """Raw term weights of one recipe: {term: tf}."""
+    tf = {}
+    for word in _WORD.findall((title or '').lower()):
+        word = singular(word)
+        if len(word) > 2 and word not in TITLE_STOPWORDS:
+            tf['t:' + word] = tf.get('t:' + word, 0) + TITLE_WEIGHT
+    for phrase in parse_ingredients(ingredients):
+        for term in ingredient_terms(phrase):
+            tf['i:' + term] = tf.get('i:' + term, 0) + 1
+    if category:
+        tf['c:' + category.strip().lower()] = CATEGORY_WEIGHT
+    bucket = time_bucket(cooking_time)
+    if bucket is not None:
+        tf[f'm:{bucket}'] = TIME_WEIGHT
+    return tf
+
+
+def idf(df, n):
+    return math.log((1 + n) / (1 + df)) + 1
+
+
+def weigh(tf, dfs, n):
+    """Unit-length TF-IDF vector from raw weights and document frequencies."""
+    vector = {term: weight * idf(dfs.get(term, 0), n) for term, weight in tf.items()}
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return {}
+    return {term: w / norm for term, w in vector.items()}
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b[t] for t, w in a.items() if t in b)
+
+
+# --- batch build -------------------------------------------------------------
+
+def vectorize(rows):
+    """Sparse TF-IDF matrix of (id, title, ingredients, category, cooking_time) rows.
+    Returns (ids, X, vocabulary, df) with X rows normalized to unit length."""
+    np, sparse = _scipy()
+    from array import array
+
+    vocabulary = {}
+    ids, indptr, indices, data = array('q'), array('q', [0]), array('i'), array('f')
+    for recipe_id, title, ingredients, category, cooking_time in rows:
+        for term, weight in features(title, ingredients, category, cooking_time).items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(weight)
+        indptr.append(len(indices))
+        ids.append(recipe_id)
+
+    n = len(ids)
+    X = sparse.csr_matrix(
+        (np.frombuffer(data, dtype=np.float32), np.frombuffer(indices, dtype=np.int32), np.frombuffer(indptr, dtype=np.int64)),
+        shape=(n, len(vocabulary))
+    )
+    df = np.bincount(X.indices, minlength=len(vocabulary))
+    X.data *= (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)[X.indices]
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    X = sparse.diags((1 / norms).astype(np.float32)) @ X
+    return np.frombuffer(ids, dtype=np.int64), X.tocsr(), vocabulary, df
+
+
+def prune_postings(X, max_postings):
+    """Transpose of X (terms x recipes) keeping each term's max_postings strongest
+    postings. Returns (matrix, whether anything was dropped)."""
+    np, _ = _scipy()
+    postings = X.T.tocsr()
+    counts = np.diff(postings.indptr)
+    common = np.nonzero(counts > max_postings)[0]
+    if not len(common):
+        return postings, False
+    for term in common:
+        start, end = postings.indptr[term], postings.indptr[term + 1]
+        drop = end - start - max_postings
+        weakest = np.argpartition(postings.data[start:end], drop)[:drop]
+        postings.data[start + weakest] = 0
+    postings.eliminate_zeros()
+    return postings, True
+
+
+def strongest_terms(X, count):
+    """X keeping only each row's `count` highest weights. Returns (matrix, whether anything was dropped)."""
+    np, sparse = _scipy()
+    lengths = np.diff(X.indptr)
+    if not len(lengths) or lengths.max() <= count:
+        return X, False
+    owners = np.repeat(np.arange(X.shape[0]), lengths)
+    order = np.lexsort((-X.data, owners))
+    rank = np.empty(X.nnz, dtype=np.int64)
+    rank[order] = np.arange(X.nnz) - np.repeat(X.indptr[:-1], lengths)
+    kept = X.copy()
+    kept.data[rank >= count] = 0
+    kept.eliminate_zeros()
+    return kept, True
+
+
+def neighbours(X, top_k=TOP_K, max_postings=MAX_POSTINGS, query_terms=QUERY_TERMS, block_rows=BLOCK_ROWS):
+    """Yield (first row, neighbour rows, scores) per block of rows; both arrays are
+    block x top_k, best first, padded with -1 and 0."""
+    np, _ = _scipy()
+    postings, pruned = prune_postings(X, max_postings)
+    queries, shortened = strongest_terms(X, query_terms)
+    pruned = pruned or shortened
+    keep = top_k * RESCORE_FACTOR if pruned else top_k
+    n = X.shape[0]
+    for start in range(0, n, block_rows):
+        end = min(start + block_rows, n)
+        block = X[start:end]
+        S = (queries[start:end] @ postings).tocsr()
+        picked = []   # per row: candidate columns and their scores
+        for i in range(end - start):
+            lo, hi = S.indptr[i], S.indptr[i + 1]
+            cols, vals = S.indices[lo:hi], S.data[lo:hi]
+            mask = cols != start + i
+            cols, vals = cols[mask], vals[mask]
+            if len(cols) > keep:
+                best = np.argpartition(-vals, keep)[:keep]
+                cols, vals = cols[best], vals[best]
+            picked.append((cols, vals))
+        if pruned:
+            # Partial scores only chose the candidates; score them on the full vectors
+            owners = np.repeat(np.arange(end - start), [len(c) for c, _ in picked])
+            candidates = np.concatenate([c for c, _ in picked]) if picked else np.zeros(0, dtype=np.int32)
+            exact = np.asarray(X[candidates].multiply(block[owners]).sum(axis=1)).ravel().astype(np.float32)
+            offsets = np.cumsum([0] + [len(c) for c, _ in picked])
+            picked = [(c, exact[offsets[i]:offsets[i + 1]]) for i, (c, _) in enumerate(picked)]
+        rows = np.full((end - start, top_k), -1, dtype=np.int64)
+        scores = np.zeros((end - start, top_k), dtype=np.float32)
+        for i, (cols, vals) in enumerate(picked):
+            order = np.argsort(-vals, kind='stable')[:top_k]
+            rows[i, :len(order)] = cols[order]
+            scores[i, :len(order)] = vals[order]
+        yield start, rows, scores
+
+
+def build(conn, top_k=TOP_K, max_postings=MAX_POSTINGS):
+    """Recompute every recipe's neighbours. Returns the number of recipes, or None
+    when NumPy/SciPy are missing or another build holds the lock."""
+    np, _ = _scipy()
+    if np is None:
+        return None
+    from psycopg2.extras import execute_values
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (BUILD_LOCK_ID,))
+        row = cursor.fetchone()
+        if not (row['locked'] if isinstance(row, dict) else row[0]):
+            conn.rollback()
+            return None
+        try:
+            source = conn.cursor(name='similar_build')
+            source.execute("SELECT id, title, ingredients, category, cooking_time FROM recipes")
+            ids, X, vocabulary, df = vectorize(
+                (r['id'], r['title'], r['ingredients'], r['category'], r['cooking_time']) if isinstance(r, dict) else r
+                for r in source
+            )
+            source.close()
+
+            for start, rows, scores in neighbours(X, top_k, max_postings):
+                values = []
+                for i in range(len(rows)):
+                    found = rows[i] >= 0
+                    values.append((int(ids[start + i]), ids[rows[i][found]].tolist(),
+                                   [round(float(s), 4) for s in scores[i][found]]))
+                # Each block commits on its own, so readers keep seeing a full list
+                execute_values(cursor, """
+                    INSERT INTO recipe_similar (recipe_id, similar_ids, scores, updated_at)
+                    SELECT v.id, v.ids, v.scores, NOW() FROM (VALUES %s) AS v(id, ids, scores)
+                    WHERE EXISTS (SELECT 1 FROM recipes WHERE recipes.id = v.id)
+                    ON CONFLICT (recipe_id) DO UPDATE
+                    SET similar_ids = EXCLUDED.similar_ids, scores = EXCLUDED.scores, updated_at = EXCLUDED.updated_at
+                """, values, template="(%s, %s::int[], %s::real[])", page_size=1000)
+                conn.commit()
+
+            cursor.execute("DELETE FROM similar_terms")
+            execute_values(cursor, "INSERT INTO similar_terms (term, df) VALUES %s",
+                           [(CORPUS_TERM, len(ids))] + [(term, int(df[col])) for term, col in vocabulary.items()],
+                           page_size=5000)
+            conn.commit()
+        finally:
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (BUILD_LOCK_ID,))
+            conn.commit()
+    return len(ids)
+
+
+# --- incremental updates -----------------------------------------------------
+
+def _load_dfs(cursor, terms):
+    cursor.execute("SELECT term, df FROM similar_terms WHERE term = ANY(%s)", (list(terms) + [CORPUS_TERM],))
+    dfs = {r['term']: r['df'] for r in cursor.fetchall()}
+    return dfs, dfs.pop(CORPUS_TERM, 0)
+
+
+def _candidates(cursor, recipe_id, tf, dfs):
+    # Recipes sharing the rarer ingredient terms (inverted index) or title
+    # words (full-text index) of this one
+    rare = sorted((t for t in tf if dfs.get(t, 0) <= CANDIDATE_MAX_DF), key=lambda t: (dfs.get(t, 0), t))
+    ingredients = [t[2:] for t in rare if t.startswith('i:')][:CANDIDATE_TERMS]
+    words = [t[2:] for t in rare if t.startswith('t:')][:CANDIDATE_TERMS]
+    sources, params = [], {'id': recipe_id, 'limit': CANDIDATE_LIMIT}
+    if ingredients:
+        sources.append("""(SELECT recipe_id FROM recipe_ingredients WHERE term = ANY(%(terms)s)
+                           GROUP BY recipe_id ORDER BY COUNT(*) DESC LIMIT %(limit)s)""")
+        params['terms'] = ingredients
+    if words:
+        sources.append("(SELECT id FROM recipes WHERE search_vector @@ to_tsquery('english', %(words)s) LIMIT %(limit)s)")
+        params['words'] = ' | '.join(words)
+    if not sources:
+        return []
+    cursor.execute(f"""
+        SELECT id, title, ingredients, category, cooking_time FROM recipes
+        WHERE id <> %(id)s AND id IN ({' UNION '.join(sources)})
+    """, params)
+    return cursor.fetchall()
+
+
+def refresh_recipe(cursor, recipe_id, top_k=TOP_K):
+    """Rescore one saved or edited recipe and update the lists it belongs in.
+    Returns the ids whose lists changed (empty before the first build)."""
+    from psycopg2.extras import execute_values
+
+    cursor.execute("SELECT id, title, ingredients, category, cooking_time FROM recipes WHERE id=%s", (recipe_id,))
+    recipe = cursor.fetchone()
+    if not recipe:
+        return []
+    tf = features(recipe['title'], recipe['ingredients'], recipe['category'], recipe['cooking_time'])
+    dfs, n = _load_dfs(cursor, tf)
+    if not n:
+        return []
+
+    candidates = {r['id']: features(r['title'], r['ingredients'], r['category'], r['cooking_time'])
+                  for r in _candidates(cursor, recipe_id, tf, dfs)}
+    dfs.update(_load_dfs(cursor, {t for c in candidates.values() for t in c if t not in dfs})[0])
+    vector = weigh(tf, dfs, n)
+    scored = {}
+    for other_id, other_tf in candidates.items():
+        score = cosine(vector, weigh(other_tf, dfs, n))
+        if score > 0:
+            scored[other_id] = round(score, 4)
+    best = sorted(scored.items(), key=lambda s: (-s[1], s[0]))[:top_k]
+
+    # Its own list, then every list it was on or now beats the weakest entry of
+    cursor.execute("""
+        INSERT INTO recipe_similar (recipe_id, similar_ids, scores, updated_at) VALUES (%s, %s::int[], %s::real[], NOW())
+        ON CONFLICT (recipe_id) DO UPDATE
+        SET similar_ids = EXCLUDED.similar_ids, scores = EXCLUDED.scores, updated_at = EXCLUDED.updated_at
+    """, (recipe_id, [i for i, _ in best], [s for _, s in best]))
+    cursor.execute("""
+        SELECT recipe_id, similar_ids, scores FROM recipe_similar
+        WHERE recipe_id = ANY(%s) OR similar_ids @> ARRAY[%s]
+        ORDER BY recipe_id FOR UPDATE
+    """, (list(scored), recipe_id))
+    changed = []
+    for row in cursor.fetchall():
+        entries = [(i, s) for i, s in zip(row['similar_ids'], row['scores']) if i != recipe_id]
+        if row['recipe_id'] in scored:
+            entries.append((recipe_id, scored[row['recipe_id']]))
+        entries = sorted(entries, key=lambda e: (-e[1], e[0]))[:top_k]
+        if [i for i, _ in entries] != list(row['similar_ids']):
+            changed.append((row['recipe_id'], [i for i, _ in entries], [s for _, s in entries]))
+    if changed:
+        execute_values(cursor, """
+            UPDATE recipe_similar SET similar_ids = v.ids, scores = v.scores, updated_at = NOW()
+            FROM (VALUES %s) AS v(id, ids, scores) WHERE recipe_similar.recipe_id = v.id
+        """, changed, template="(%s, %s::int[], %s::real[])")
+    return [recipe_id] + [c[0] for c in changed]
+
+
+class SimilarityUpdater:
+    """Runs refresh_recipe on a background thread, so saving a recipe never waits
+    on it. on_change gets the ids whose lists changed."""
+
+    def __init__(self, get_connection, on_change=None):
+        self.get_connection = get_connection
+        self.on_change = on_change
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self.stats = {'updated': 0, 'errors': 0, 'seconds': 0.0}
+
+    def _ensure_worker(self):
+        # One updater thread per worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = set()
+                threading.Thread(target=self._run, name='similar-updater', daemon=True).start()
+
+    def submit(self, recipe_id):
+        self._ensure_worker()
+        with self._lock:
+            self._pending.add(recipe_id)
+        self._wake.set()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait()
+            self._wake.clear()
+            self.process()
+
+    def process(self):
+        with self._lock:
+            batch, self._pending = sorted(self._pending), set()
+        for recipe_id in batch:
+            started = time.perf_counter()
+            conn = None
+            try:
+                conn = self.get_connection()
+                with conn.cursor() as cursor:
+                    changed = refresh_recipe(cursor, recipe_id)
+                conn.commit()
+                self.stats['updated'] += 1
+                if changed and self.on_change:
+                    self.on_change(changed)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Similar recipes update error for recipe {recipe_id}: {e}")
+                if conn is not None:
+                    conn.rollback()
+            finally:
+                if conn is not None:
+                    conn.close()
+                self.stats['seconds'] += time.perf_counter() - started
+
+
+def load_similar(cursor, recipe_id, limit=TOP_K):
+    """Card details of a recipe's neighbours, best first; only recipes in the feed."""
+    cursor.execute("""
+        SELECT recipes.id, recipes.title, recipes.thumbnail, recipes.category, recipes.cooking_time,
+               recipes.like_count, users.username, round(s.score::numeric, 4)::float8 AS score
+        FROM recipe_similar
+        CROSS JOIN LATERAL unnest(recipe_similar.similar_ids, recipe_similar.scores) WITH ORDINALITY AS s(id, score, rank)
+        JOIN recipes ON recipes.id = s.id
+        JOIN users ON recipes.user_id = users.id
+        WHERE recipe_similar.recipe_id = %s AND recipes.video_filename IS NOT NULL
+        ORDER BY s.rank
+        LIMIT %s
+    """, (recipe_id, limit))
+    return [dict(r) for r in cursor.fetchall()]
+
+
+if __name__ == "__main__":
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if _scipy()[0] is None:
+        sys.exit("The batch build needs NumPy and SciPy: pip install -r requirements.txt")
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"), cursor_factory=RealDictCursor)
+    try:
+        started = time.time()
+        built = build(conn)
+        if built is None:
+            print("Skipped: another build is running.")
+        else:
+            print(f"Similar recipes built for {built} recipes in {time.time() - started:.1f}s.")
+    finally:
+        conn.close()
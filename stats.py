@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+
+# Admin dashboard statistics are read from materialized views (see db_setup.py),
+# so a dashboard load is a handful of tiny lookups whatever the table sizes.
+# The views are refreshed in the background once they are older than
+# ADMIN_STATS_REFRESH seconds, or by running this module from cron.
+
+ADMIN_STATS_REFRESH = float(os.getenv("ADMIN_STATS_REFRESH", 300))
+STATS_VIEWS = ['mv_admin_totals', 'mv_daily_signups', 'mv_top_recipes']
+REFRESH_LOCK_ID = 7_310_001   # pg advisory lock key, one refresh at a time across workers
+
+_refreshing = threading.Lock()
+
+
+def refresh_stats(conn):
+    """Refresh every stats view unless another process is already doing it."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (REFRESH_LOCK_ID,))
+        row = cursor.fetchone()
+        locked = row['locked'] if isinstance(row, dict) else row[0]
+        if not locked:
+            conn.rollback()
+            return False
+        try:
+            for view in STATS_VIEWS:
+                # CONCURRENTLY keeps the views readable while they rebuild
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                conn.commit()
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (REFRESH_LOCK_ID,))
+            conn.commit()
+    return True
+
+
+def refresh_in_background(get_connection):
+    if not _refreshing.acquire(blocking=False):
+        return
+
+    def run():
+        conn = None
+        try:
+            conn = get_connection()
+            refresh_stats(conn)
+        except Exception as e:
+            print(f"Stats refresh error: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+            _refreshing.release()
+
+    threading.Thread(target=run, name='stats-refresh', daemon=True).start()
+
+
+def load_admin_stats(cursor):
+    cursor.execute("SELECT total_users, total_recipes, refreshed_at FROM mv_admin_totals")
+    totals = cursor.fetchone() or {'total_users': 0, 'total_recipes': 0, 'refreshed_at': None}
+
+    cursor.execute("SELECT date, count FROM mv_daily_signups ORDER BY date DESC NULLS LAST LIMIT 7")
+    user_trend = cursor.fetchall()
+
+    cursor.execute("SELECT * FROM mv_top_recipes ORDER BY rank")
+    top_recipes = cursor.fetchall()
+
+    return totals, user_trend, top_recipes
+
+
+def is_stale(refreshed_at):
+    if refreshed_at is None:
+        return True
+    return time.time() - refreshed_at.timestamp() > ADMIN_STATS_REFRESH
+
+
+if __name__ == "__main__":
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"), cursor_factory=RealDictCursor)
+    try:
+        print("Stats refreshed." if refresh_stats(conn) else "Another refresh is running; skipped.")
+    finally:
+        conn.close()
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from cache import Cache, Generation, LocalCache
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1     # 'a' is now the most recent
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats['evictions'] == 1
+
+
+def test_local_cache_expires_entries():
+    cache = LocalCache(max_entries=10, ttl=60)
+    cache.set('short', 'x', ttl=-1)
+    cache.set('long', 'y')
+    assert cache.get('short', 'missing') == 'missing'
+    assert cache.get('long') == 'y'
+    assert cache.stats['expirations'] == 1
+    assert len(cache) == 1
+
+
+def test_get_or_compute_coalesces_concurrent_misses():
+    cache = Cache('test', max_entries=10, ttl=60)
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+    assert results == ['value'] * 6
+    assert len(calls) == 1
+
+
+def test_get_or_compute_skips_results_rejected_by_should_cache():
+    cache = Cache('test', max_entries=10, ttl=60)
+    assert cache.get_or_compute('k', lambda: None, should_cache=lambda v: v is not None) is None
+    assert cache.get_or_compute('k', lambda: 'fresh', should_cache=lambda v: v is not None) == 'fresh'
+    assert cache.get('k') == 'fresh'
+
+
+def test_generation_bump_is_seen_by_other_instances(tmp_path):
+    # Two instances over one directory stand in for two workers on a host
+    mine = Generation('feed', directory=str(tmp_path))
+    theirs = Generation('feed', directory=str(tmp_path))
+    before = theirs.current()
+    mine.bump()
+    assert theirs.current() != before
+    assert theirs.current() == mine.current()
+
+
+def test_generation_without_directory_is_per_process():
+    generation = Generation('feed', directory='')
+    assert generation.current() == 0
+    generation.bump()
+    assert generation.current() == 1
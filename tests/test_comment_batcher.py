@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import counters
+from counters import CommentBatcher
+
+
+class FakeBatcher(CommentBatcher):
+    """Stores rows in memory; recipe 404 does not exist and recipe 500 fails."""
+
+    def __init__(self, **kwargs):
+        super().__init__(None, None, **kwargs)
+        self.release = threading.Event()
+        self.release.set()
+        self.batches = []
+
+    def _insert(self, entries):
+        self.release.wait()
+        rows = [entry['row'] for entry in entries]
+        if any(row[0] == 500 for row in rows):
+            raise ValueError("bad row")
+        self.batches.append(rows)
+        return [{'recipe_id': r, 'user_id': u, 'comment': c} for r, u, c in rows if r != 404]
+
+
+def test_concurrent_posts_share_a_batch_and_one_callback():
+    written = []
+    batcher = FakeBatcher(window=0.2, on_write=lambda: written.append(len(batcher.batches)))
+    results = [None] * 5
+
+    def post(i):
+        results[i] = batcher.post(1, i, 'tasty')
+
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [r['user_id'] for r in results] == [0, 1, 2, 3, 4]
+    assert len(batcher.batches) == 1
+    assert written == [1]
+
+
+def test_missing_recipe_returns_none_and_bad_row_fails_alone():
+    batcher = FakeBatcher(window=0)
+    assert batcher.post(404, 1, 'hello') is None
+    with pytest.raises(ValueError):
+        batcher.post(500, 1, 'hello')
+    assert batcher.post(2, 1, 'hello')['recipe_id'] == 2
+
+
+def test_timed_out_post_is_still_written(monkeypatch):
+    monkeypatch.setattr(counters, 'COMMENT_BATCH_TIMEOUT', 0.05)
+    written = threading.Event()
+    batcher = FakeBatcher(window=0, on_write=written.set)
+    batcher.release.clear()
+    with pytest.raises(TimeoutError):
+        batcher.post(1, 1, 'slow')
+    batcher.release.set()
+    assert written.wait(2)
+    assert batcher.batches == [[(1, 1, 'slow')]]
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from external import ExternalResults
+
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def search(self, query, limit):
+        self.release.wait()
+        self.calls += 1
+        return [f"{query} {self.calls}"][:limit]
+
+
+def test_fresh_entries_are_served_from_the_cache():
+    provider = FakeProvider()
+    results = ExternalResults(provider, ttl=60, stale_ttl=600, workers=2, name='test_fresh')
+    assert results.get('pasta', 5, budget=1) == ['pasta 1']
+    assert results.get('  Pasta ', 5, budget=1) == ['pasta 1']
+    assert provider.calls == 1
+    assert results.stats['hits'] == 1
+    assert results.cache.snapshot()['size'] == 1
+
+
+def test_stale_entries_are_served_while_refreshing():
+    provider = FakeProvider()
+    results = ExternalResults(provider, ttl=0.05, stale_ttl=600, workers=2, name='test_stale')
+    assert results.get('soup', 5, budget=1) == ['soup 1']
+    time.sleep(0.1)
+    assert results.get('soup', 5, budget=1) == ['soup 1']
+    assert results.stats['stale_hits'] == 1
+    deadline = time.monotonic() + 2
+    while results.get('soup', 5, budget=0) != ['soup 2'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert results.get('soup', 5, budget=0) == ['soup 2']
+
+
+def test_slow_misses_return_the_default_and_fill_the_cache_later():
+    provider = FakeProvider()
+    provider.release.clear()
+    results = ExternalResults(provider, ttl=60, stale_ttl=600, workers=2, name='test_slow')
+    assert results.get('curry', 5, budget=0.01, default=None) is None
+    assert results.get('curry', 5, budget=0) == []
+    assert results.stats['timeouts'] == 1
+    assert results.stats['coalesced'] == 1
+    provider.release.set()
+    deadline = time.monotonic() + 2
+    while results.get('curry', 5, budget=0) != ['curry 1'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert results.get('curry', 5, budget=0) == ['curry 1']
+    assert provider.calls == 1
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The like toggle's guarantee (like_count always equals the recipe_likes rows,
+# one like per user however clicks race) lives in SQL, so this needs Postgres:
+# set TEST_DATABASE_URL to a scratch database that db_setup.py has prepared.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+pytest.importorskip("flask")
+pytest.importorskip("psycopg2")
+
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import like_concurrency_check
+
+
+def test_concurrent_toggles_keep_one_like_per_user():
+    assert like_concurrency_check.run(users=20, toggles=5, threads=8)
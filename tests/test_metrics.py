@@ -0,0 +1,41 @@
+import json
+
+import metrics
+from metrics import Registry, merge, render_text
+
+
+def worker(requests, idle_connections):
+    registry = Registry()
+    for _ in range(requests):
+        registry.inc('http_requests_total', route='/', method='GET', status='200')
+        registry.observe('http_request_duration_seconds', 0.02, route='/', method='GET')
+    registry.add_collector(lambda: [('db_pool_connections', 'gauge', 'Pooled DB connections by state',
+                                     {(('state', 'idle'),): idle_connections})])
+    # Snapshots travel between workers as JSON
+    return json.loads(json.dumps(registry.snapshot()))
+
+
+def test_workers_are_summed_without_a_pid_label():
+    text = render_text(merge([worker(2, 3), worker(5, 4)]))
+    assert 'http_requests_total{method="GET",route="/",status="200"} 7' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/"} 7' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="0.025"} 7' in text
+    assert 'db_pool_connections{state="idle"} 7' in text
+    assert 'worker=' not in text
+
+
+def test_exited_workers_keep_counters_but_not_gauges():
+    gone = dict(worker(5, 4), live=False)
+    text = render_text(merge([worker(2, 3), gone]))
+    assert 'http_requests_total{method="GET",route="/",status="200"} 7' in text
+    assert 'db_pool_connections{state="idle"} 3' in text
+
+
+def test_scrape_reads_other_workers_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    (tmp_path / 'worker-1-1.json').write_text(json.dumps(worker(4, 1)))
+    registry = Registry()
+    registry.inc('http_requests_total', route='/', method='GET', status='200')
+    assert 'http_requests_total{method="GET",route="/",status="200"} 5' in registry.render()
+    metrics.clear_directory()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from pagination import encode_cursor, decode_cursor
+
+
+def as_datetime(sort_by, value):
+    return datetime.fromisoformat(value)
+
+
+def as_int(sort_by, value):
+    return int(value)
+
+
+def test_round_trip_keeps_value_type_and_id():
+    created = datetime(2026, 3, 1, 12, 30, 15, 250)
+    token = encode_cursor('newest', created, 42)
+    assert decode_cursor(token, 'newest', as_datetime) == (created, 42)
+
+
+def test_token_is_url_safe_without_padding():
+    token = encode_cursor('shortest', 15, 7)
+    assert '=' not in token and '+' not in token and '/' not in token
+    assert decode_cursor(token, 'shortest', as_int) == (15, 7)
+
+
+def test_cursor_only_resumes_its_own_sort():
+    token = encode_cursor('shortest', 15, 7)
+    assert decode_cursor(token, 'longest', as_int) is None
+
+
+def test_missing_or_malformed_cursor_starts_from_the_top():
+    assert decode_cursor(None, 'newest', as_datetime) is None
+    assert decode_cursor('', 'newest', as_datetime) is None
+    assert decode_cursor('not base64 at all!', 'newest', as_datetime) is None
+    assert decode_cursor(encode_cursor('newest', 'yesterday', 1), 'newest', as_datetime) is None
+    assert decode_cursor(encode_cursor('shortest', 5, 'x'), 'shortest', as_int) is None
@@ -0,0 +1,44 @@
+from ratelimit import TokenBucketLimiter
+
+
+def test_burst_then_limited():
+    limiter = TokenBucketLimiter(capacity=3, rate=0)
+    assert [limiter.allow('k')[0] for _ in range(4)] == [True, True, True, False]
+    assert limiter.stats == {'allowed': 3, 'limited': 1}
+
+
+def test_buckets_are_per_key():
+    limiter = TokenBucketLimiter(capacity=1, rate=0)
+    assert limiter.allow((1, 10))[0]
+    assert not limiter.allow((1, 10))[0]
+    assert limiter.allow((2, 10))[0]
+
+
+def test_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('ratelimit.time.monotonic', lambda: now[0])
+    limiter = TokenBucketLimiter(capacity=2, rate=1)
+    assert limiter.allow('k')[0] and limiter.allow('k')[0]
+    assert not limiter.allow('k')[0]
+    now[0] += 1.0
+    assert limiter.allow('k')[0]
+    now[0] += 10.0
+    # Never more than the burst capacity
+    assert [limiter.allow('k')[0] for _ in range(3)] == [True, True, False]
+
+
+def test_limited_requests_replay_the_last_result():
+    limiter = TokenBucketLimiter(capacity=1, rate=0)
+    allowed, last = limiter.allow('k')
+    assert allowed and last is None
+    limiter.remember('k', {'liked': True, 'count': 4})
+    assert limiter.allow('k') == (False, {'liked': True, 'count': 4})
+
+
+def test_key_count_is_bounded():
+    limiter = TokenBucketLimiter(capacity=1, rate=0, max_keys=2)
+    for key in ('a', 'b', 'c'):
+        limiter.allow(key)
+    # 'a' was dropped, so it starts with a full bucket again
+    assert limiter.allow('a')[0]
+    assert len(limiter._buckets) == 2
@@ -0,0 +1,78 @@
+import time
+
+import title_index
+from cache import Generation
+from title_index import SyncedTitleIndex, TitleIndex, MAX_DEPTH
+
+
+def build(rows):
+    index = TitleIndex()
+    index.load(rows)
+    return index
+
+
+def test_matches_the_start_of_any_word_by_popularity():
+    index = build([
+        (1, 'Chicken Tikka Masala', 100, 0),
+        (2, 'Paneer Tikka', 10, 0),
+        (3, 'Tiramisu', 500, 0),
+    ])
+    assert index.search('tik') == ['Chicken Tikka Masala', 'Paneer Tikka']
+    assert index.search('ti') == ['Tiramisu', 'Chicken Tikka Masala', 'Paneer Tikka']
+    assert index.search('  CHICKEN   tik') == ['Chicken Tikka Masala']
+    assert index.search('ikka') == []
+    assert index.search('') == []
+
+
+def test_likes_outweigh_views():
+    index = build([(1, 'Dal Fry', 40, 0), (2, 'Dal Makhani', 0, 10)])
+    assert index.search('dal') == ['Dal Makhani', 'Dal Fry']
+
+
+def test_duplicate_titles_are_listed_once():
+    index = build([(1, 'Lemon Rice', 5, 0), (2, 'lemon rice', 5, 0), (3, 'Lemonade', 8, 0)])
+    assert index.search('lemon') == ['Lemon Rice', 'Lemonade']
+    # The shared title keeps only the remaining recipe's popularity
+    index.remove(1)
+    assert index.search('lemon') == ['Lemonade', 'Lemon Rice']
+    index.remove(2)
+    assert index.search('lemon') == ['Lemonade']
+
+
+def test_add_update_and_remove():
+    index = build([(1, 'Masala Dosa', 10, 0)])
+    index.add(2, 'Mango Lassi')
+    assert index.search('man') == ['Mango Lassi']
+    index.update(1, 'Mysore Masala Dosa')
+    assert index.search('mys') == ['Mysore Masala Dosa']
+    assert index.search('masala') == ['Mysore Masala Dosa']
+    index.remove(2)
+    assert index.search('man') == []
+    assert len(index) == 1
+
+
+def test_queries_deeper_than_the_trie():
+    title = 'Slow Cooked Beef Bourguignon'
+    index = build([(1, title, 1, 0), (2, 'Slow Cooked Beef Stew', 2, 0)])
+    query = 'slow cooked beef bo'
+    assert len(query) > MAX_DEPTH
+    assert index.search(query) == [title]
+    assert index.search('slow cooked beef') == ['Slow Cooked Beef Stew', title]
+
+
+def test_synced_index_reloads_when_its_generation_is_bumped(tmp_path, monkeypatch):
+    monkeypatch.setattr(title_index, 'GENERATION_POLL', 0.01)
+    rows = [(1, 'Masala Dosa', 10, 0)]
+    generation = Generation('titles', directory=str(tmp_path))
+    index = SyncedTitleIndex(lambda: list(rows), interval=3600, generation=generation)
+    index.start()
+    try:
+        rows.append((2, 'Mango Lassi', 5, 0))
+        # Another process announces the new title
+        Generation('titles', directory=str(tmp_path)).bump()
+        deadline = time.monotonic() + 2
+        while index.search('man') != ['Mango Lassi'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert index.search('man') == ['Mango Lassi']
+    finally:
+        index._pid = None
@@ -0,0 +1,46 @@
+import math
+
+import trending
+
+# The score expressions are plain SQL arithmetic; evaluate them in Python to
+# check the log-space math without a database
+SQL_FUNCTIONS = {'GREATEST': max, 'ln': math.log, 'exp': math.exp, 'abs': abs}
+
+
+def evaluate(sql, **columns):
+    return eval(sql, dict(SQL_FUNCTIONS), columns)
+
+
+def test_add_is_a_log_sum():
+    for a, b in [(0.0, 0.0), (1.5, -3.0), (200.0, 201.0), (900.0, 2.0)]:
+        got = evaluate(trending.add_sql('p', 'trending'), trending=a, p=b)
+        assert math.isclose(got, max(a, b) + math.log(math.exp(a - max(a, b)) + math.exp(b - max(a, b))))
+
+
+def test_add_does_not_overflow_for_late_events():
+    # Far-future events have log scores well beyond exp()'s range
+    got = evaluate(trending.add_sql('p', 'trending'), trending=5000.0, p=5000.0)
+    assert math.isclose(got, 5000.0 + math.log(2))
+
+
+def test_remove_undoes_add():
+    for score, points in [(2.0, 1.0), (10.0, 12.0), (700.0, 699.0)]:
+        added = evaluate(trending.add_sql('p', 'trending'), trending=score, p=points)
+        removed = evaluate(trending.remove_sql('p', 'trending'), trending=added, p=points)
+        assert math.isclose(removed, score, rel_tol=1e-9)
+
+
+def test_remove_everything_stays_finite():
+    got = evaluate(trending.remove_sql('p', 'trending'), trending=3.0, p=3.0)
+    assert math.isclose(got, 3.0 + math.log(trending.REMOVE_FLOOR))
+
+
+def test_points_halve_every_half_life():
+    # Forward decay: an event one half-life later is worth twice as much
+    assert math.isclose(trending.RATE * trending.HALF_LIFE_HOURS * 3600, math.log(2))
+
+
+def test_points_sql_weights_and_counts():
+    sql = trending.points_sql('comment', at='ts', count='n')
+    assert sql.startswith(f"({math.log(trending.WEIGHTS['comment'])!r} + (extract(epoch FROM ts) - {trending.EPOCH})")
+    assert sql.endswith(" + ln(n))")
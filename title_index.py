@@ -0,0 +1,243 @@
+import os
+import re
+import time
+import threading
+
+# In-process prefix index of recipe titles for /suggestions.
+# Every word-start suffix of a title is inserted into a trie ("chicken tikka" is
+# reachable from "chi..." and "tik..."), and each node keeps its top-K titles by
+# popularity so a lookup is a walk of len(query) nodes.
+
+TOP_K = 10
+MAX_DEPTH = 16               # deeper prefixes are resolved by filtering the subtree
+LIKE_WEIGHT = 5              # a like counts as much as this many views
+RESYNC_INTERVAL = float(os.getenv("TITLE_INDEX_RESYNC", 300))
+GENERATION_POLL = 5          # seconds between checks of the change generation
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    return _SPACES.sub(' ', (text or '').lower()).strip()
+
+
+def word_suffixes(key):
+    suffixes = [key]
+    for i, ch in enumerate(key):
+        if ch == ' ' and i + 1 < len(key):
+            suffixes.append(key[i + 1:])
+    return suffixes
+
+
+class _Node:
+    __slots__ = ('children', 'terminal', 'top', 'dirty')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = set()   # keys whose (truncated) suffix ends here
+        self.top = []           # [(-score, key)] best first, at most TOP_K
+        self.dirty = False
+
+
+class TitleIndex:
+    def __init__(self):
+        self._root = _Node()
+        self._lock = threading.RLock()
+        self._recipes = {}      # recipe_id -> (key, score)
+        self._titles = {}       # key -> {'title': display title, 'score': total score, 'ids': set()}
+        self.loaded_at = None
+
+    # --- maintenance -------------------------------------------------------
+
+    def _paths(self, key):
+        for suffix in word_suffixes(key):
+            node = self._root
+            path = [node]
+            for ch in suffix[:MAX_DEPTH]:
+                child = node.children.get(ch)
+                if child is None:
+                    child = node.children[ch] = _Node()
+                node = child
+                path.append(node)
+            yield path
+
+    def _insert_key(self, key, score):
+        for path in self._paths(key):
+            path[-1].terminal.add(key)
+            for node in path:
+                if node.dirty:
+                    continue
+                top = [t for t in node.top if t[1] != key]
+                top.append((-score, key))
+                top.sort()
+                node.top = top[:TOP_K]
+
+    def _remove_key(self, key):
+        for path in self._paths(key):
+            path[-1].terminal.discard(key)
+            for node in path:
+                if any(t[1] == key for t in node.top):
+                    # The next best title may live anywhere in the subtree; rebuild on demand
+                    node.top = [t for t in node.top if t[1] != key]
+                    node.dirty = True
+
+    def _refresh(self, node):
+        if not node.dirty:
+            return node.top
+        candidates = {(-self._titles[key]['score'], key) for key in node.terminal if key in self._titles}
+        for child in node.children.values():
+            candidates.update(self._refresh(child))
+        node.top = sorted(candidates)[:TOP_K]
+        node.dirty = False
+        return node.top
+
+    def add(self, recipe_id, title, score=0):
+        key = normalize(title)
+        if not key:
+            return
+        with self._lock:
+            self.remove(recipe_id)
+            entry = self._titles.get(key)
+            if entry:
+                self._remove_key(key)
+            else:
+                entry = self._titles[key] = {'title': title, 'score': 0, 'ids': set()}
+            entry['ids'].add(recipe_id)
+            entry['score'] += score
+            self._recipes[recipe_id] = (key, score)
+            self._insert_key(key, entry['score'])
+
+    def update(self, recipe_id, title):
+        # Title edits keep the recipe's popularity
+        with self._lock:
+            score = self._recipes.get(recipe_id, (None, 0))[1]
+            self.add(recipe_id, title, score)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            old = self._recipes.pop(recipe_id, None)
+            if not old:
+                return
+            key, score = old
+            entry = self._titles[key]
+            entry['ids'].discard(recipe_id)
+            entry['score'] -= score
+            self._remove_key(key)
+            if entry['ids']:
+                self._insert_key(key, entry['score'])
+            else:
+                del self._titles[key]
+
+    def load(self, rows):
+        """Rebuild from (id, title, views, like_count) rows and swap in atomically."""
+        fresh = TitleIndex()
+        for recipe_id, title, views, likes in rows:
+            key = normalize(title)
+            if not key:
+                continue
+            score = (views or 0) + LIKE_WEIGHT * (likes or 0)
+            entry = fresh._titles.setdefault(key, {'title': title, 'score': 0, 'ids': set()})
+            entry['ids'].add(recipe_id)
+            entry['score'] += score
+            fresh._recipes[recipe_id] = (key, score)
+        # Place every key, then compute all top-K lists in one bottom-up pass
+        for key in fresh._titles:
+            for path in fresh._paths(key):
+                path[-1].terminal.add(key)
+                for node in path:
+                    node.dirty = True
+        fresh._refresh(fresh._root)
+        with self._lock:
+            self._root, self._recipes, self._titles = fresh._root, fresh._recipes, fresh._titles
+            self.loaded_at = time.time()
+
+    # --- lookup ------------------------------------------------------------
+
+    def search(self, query, limit=3):
+        q = normalize(query)
+        if not q:
+            return []
+        with self._lock:
+            node = self._root
+            for ch in q[:MAX_DEPTH]:
+                node = node.children.get(ch)
+                if node is None:
+                    return []
+            if len(q) <= MAX_DEPTH:
+                top = self._refresh(node)
+                return [self._titles[key]['title'] for _, key in top[:limit]]
+
+            # Longer than the trie is deep: filter everything below this node
+            keys, stack = set(), [node]
+            while stack:
+                n = stack.pop()
+                keys.update(n.terminal)
+                stack.extend(n.children.values())
+            matches = [k for k in keys if any(s.startswith(q) for s in word_suffixes(k))]
+            matches.sort(key=lambda k: (-self._titles[k]['score'], k))
+            return [self._titles[k]['title'] for k in matches[:limit]]
+
+    def __len__(self):
+        return len(self._titles)
+
+
+class SyncedTitleIndex(TitleIndex):
+    """TitleIndex that loads when a worker starts and periodically resyncs from the
+    database, so edits made through other workers converge. With a generation
+    (see cache.Generation) it also resyncs within GENERATION_POLL seconds of a
+    bump, which is how processes outside the web workers announce new titles."""
+
+    def __init__(self, fetch_rows, interval=RESYNC_INTERVAL, generation=None):
+        super().__init__()
+        self.fetch_rows = fetch_rows
+        self.interval = interval
+        self.generation = generation
+        self._seen = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self, wait=True):
+        """Load once per process and start the resync thread. With wait=False the
+        first load happens on that thread instead of the caller's."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                if wait:
+                    self.resync()
+                thread = threading.Thread(target=self._resync_loop, args=(not wait,),
+                                          name='title-index-resync', daemon=True)
+                thread.start()
+
+    def ensure_loaded(self):
+        # Fallback for a process nobody warmed: load in the background and let
+        # the caller take its slower path until the index is ready
+        self.start(wait=False)
+        return self.loaded_at is not None
+
+    def resync(self):
+        # Read the generation first so a bump during the load triggers another one
+        seen = self.generation.current() if self.generation is not None else None
+        try:
+            self.load(self.fetch_rows())
+            self._seen = seen
+        except Exception as e:
+            print(f"Title index resync error: {e}")
+
+    def _changed(self):
+        return self.generation is not None and self.generation.current() != self._seen
+
+    def _resync_loop(self, load_first=False):
+        pid = os.getpid()
+        if load_first:
+            self.resync()
+        while self._pid == pid:
+            slept = 0
+            while True:
+                step = min(GENERATION_POLL, self.interval - slept)
+                time.sleep(step)
+                slept += step
+                if slept >= self.interval or self._changed():
+                    break
+            self.resync()
@@ -0,0 +1,111 @@
+import os
+import math
+
+# sort=trending. Posting, views, likes and comments earn a recipe points that
+# lose half their value every TRENDING_HALF_LIFE_HOURS. Rather than decaying
+# every row as time passes, each event's points are scaled up by how long
+# after a fixed epoch it happened ("forward decay"), which ranks recipes the
+# same way. recipes.trending holds the natural log of the sum so it never
+# overflows. A score therefore only changes when something happens to that
+# recipe, as part of the statement that records the event, and the trending
+# feed of a category is a walk along idx_recipes_category_trending_id.
+#
+# `python trending.py` recomputes every score from the event tables; run it
+# after changing the half-life. Views have no timestamps there and count as of
+# the recipe's creation; the incremental updates date them properly.
+
+HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 48))
+RATE = math.log(2) / (HALF_LIFE_HOURS * 3600)   # log points gained per second after EPOCH
+EPOCH = 1704067200                              # 2024-01-01 00:00; any fixed instant works
+WEIGHTS = {'post': 3, 'view': 1, 'like': 5, 'comment': 8}
+# Smallest fraction a removal leaves of a score, so it stays finite
+REMOVE_FLOOR = 1e-9
+
+
+def points_sql(kind, at='LOCALTIMESTAMP', count=None):
+    """Log-space points of one event (or `count` events) of `kind` at SQL time `at`."""
+    sql = f"({math.log(WEIGHTS[kind])!r} + (extract(epoch FROM {at}) - {EPOCH}) * {RATE!r}"
+    if count is not None:
+        sql += f" + ln({count})"
+    return sql + ")"
+
+
+def add_sql(points, column='trending'):
+    """`column` with the points added, in log space."""
+    return f"(GREATEST({column}, {points}) + ln(1 + exp(-abs({column} - {points}))))"
+
+
+def remove_sql(points, column='trending'):
+    """`column` with earlier-added points taken back out, in log space."""
+    return f"({column} + ln(GREATEST(1 - exp({points} - {column}), {REMOVE_FLOOR!r})))"
+
+
+def set_default(cursor):
+    # New recipes start with their posting points, however they are inserted
+    cursor.execute(f"ALTER TABLE recipes ALTER COLUMN trending SET DEFAULT {points_sql('post')}")
+
+
+def _log_sum_sql(events):
+    """CTEs ending in scores(recipe_id, score): per recipe, the log of the sum of
+    exp(x) over `events` rows of (recipe_id, x), without overflowing."""
+    return f"""
+        events AS ({events}),
+        scaled AS (
+            SELECT recipe_id, x, MAX(x) OVER (PARTITION BY recipe_id) AS top FROM events WHERE x IS NOT NULL
+        ), scores AS (
+            SELECT recipe_id, top + ln(SUM(exp(x - top))) AS score FROM scaled GROUP BY recipe_id, top
+        )
+    """
+
+
+def recompute(cursor):
+    """Rebuild every recipe's score from its creation, views, likes and comments."""
+    events = f"""
+        SELECT id AS recipe_id, {points_sql('post', 'created_at')} AS x FROM recipes
+        UNION ALL
+        SELECT id, {points_sql('view', 'created_at', 'views')} FROM recipes WHERE views > 0
+        UNION ALL
+        SELECT recipe_id, {points_sql('like', 'created_at')} FROM recipe_likes WHERE created_at IS NOT NULL
+        UNION ALL
+        SELECT recipe_id, {points_sql('comment', 'created_at')} FROM comments WHERE created_at IS NOT NULL
+    """
+    cursor.execute(f"""
+        WITH {_log_sum_sql(events)}
+        UPDATE recipes SET trending = scores.score
+        FROM scores WHERE recipes.id = scores.recipe_id
+    """)
+    return cursor.rowcount
+
+
+def remove_user(cursor, user_id):
+    """Take a user's likes and comments back out of the scores of the recipes they
+    touched, before the rows are deleted. Undated rows were never counted."""
+    events = f"""
+        SELECT recipe_id, {points_sql('like', 'created_at')} AS x FROM recipe_likes
+        WHERE user_id = %(user_id)s AND created_at IS NOT NULL
+        UNION ALL
+        SELECT recipe_id, {points_sql('comment', 'created_at')} FROM comments
+        WHERE user_id = %(user_id)s AND created_at IS NOT NULL
+    """
+    cursor.execute(f"""
+        WITH {_log_sum_sql(events)}
+        UPDATE recipes SET trending = {remove_sql('scores.score', 'recipes.trending')}
+        FROM scores WHERE recipes.id = scores.recipe_id
+    """, {'user_id': user_id})
+    return cursor.rowcount
+
+
+if __name__ == "__main__":
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    try:
+        with conn.cursor() as cursor:
+            set_default(cursor)
+            updated = recompute(cursor)
+        conn.commit()
+        print(f"Trending scores recomputed for {updated} recipes.")
+    finally:
+        conn.close()